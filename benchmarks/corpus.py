@@ -0,0 +1,98 @@
+# benchmarks/corpus.py
+"""
+Corpus juridique synthétique, déterministe (même graine = mêmes fichiers) :
+articles de codes fictifs en TXT, CSV (colonnes article, titre, texte) et HTML, plus
+des questions qui mélangent références exactes et formulations libres.
+"""
+from __future__ import annotations
+import csv, html, os, random, re
+from typing import List, Sequence
+
+CODES = ["Code du travail", "Code civil", "Code de commerce", "Code de la consommation",
+         "Code de la sécurité sociale", "Code de procédure civile"]
+SUJETS = ["le contrat de travail", "la période d'essai", "le préavis", "la rupture conventionnelle",
+          "le bail commercial", "le dépôt de garantie", "la clause de non-concurrence",
+          "le licenciement pour motif économique", "la prescription de l'action", "le congé parental",
+          "la garantie des vices cachés", "le délai de rétractation", "la médiation préalable",
+          "les heures supplémentaires", "le télétravail", "la faute grave"]
+ACTEURS = ["l'employeur", "le salarié", "le bailleur", "le locataire", "le consommateur",
+           "le professionnel", "le juge", "les parties", "le créancier", "le débiteur"]
+VERBES = ["doit notifier", "peut contester", "est tenu d'informer", "ne peut refuser",
+          "peut demander", "doit justifier", "est réputé accepter", "peut saisir"]
+DUREES = ["un mois", "deux mois", "trois mois", "six mois", "quinze jours", "huit jours",
+          "un an", "deux ans", "cinq ans", "48 heures"]
+LIAISONS = ["Toutefois", "En outre", "Par dérogation", "À défaut d'accord", "Sous réserve des dispositions",
+            "Le cas échéant", "Nonobstant toute clause contraire"]
+FORMATS = ("txt", "csv", "html")
+_REF_RX = re.compile(r"Article ([LRD]\d{4}-\d+)")
+
+def _article_ref(rng: random.Random) -> str:
+    return f"{rng.choice('LRD')}{rng.randint(1000, 9999)}-{rng.randint(1, 99)}"
+
+def _sentence(rng: random.Random) -> str:
+    s = (f"{rng.choice(ACTEURS).capitalize()} {rng.choice(VERBES)} {rng.choice(SUJETS)} "
+         f"dans un délai de {rng.choice(DUREES)}")
+    if rng.random() < 0.4:
+        s = f"{rng.choice(LIAISONS)}, {s[0].lower()}{s[1:]}"
+    return s + "."
+
+def _articles(rng: random.Random, target_chars: int) -> List[tuple]:
+    """(référence, titre, texte) jusqu'à environ `target_chars` caractères."""
+    out, size = [], 0
+    while size < target_chars:
+        ref, sujet = _article_ref(rng), rng.choice(SUJETS)
+        text = " ".join(_sentence(rng) for _ in range(rng.randint(3, 8)))
+        out.append((ref, f"{rng.choice(CODES)} : {sujet}", text))
+        size += len(text) + len(ref) + 40
+    return out
+
+def _write_txt(path: str, articles) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for ref, title, text in articles:
+            f.write(f"Article {ref}\n{title}\n\n{text}\n\n\n")
+
+def _write_csv(path: str, articles) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["article", "titre", "texte"])
+        for ref, title, text in articles:
+            w.writerow([f"Article {ref}", title, text])
+
+def _write_html(path: str, articles) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<html><head><title>Recueil</title><style>p{margin:0}</style></head><body>\n")
+        for ref, title, text in articles:
+            f.write(f"<h2>Article {html.escape(ref)}</h2>\n<h3>{html.escape(title)}</h3>\n"
+                    f"<p>{html.escape(text)}</p>\n")
+        f.write("</body></html>\n")
+
+_WRITERS = {"txt": _write_txt, "csv": _write_csv, "html": _write_html}
+
+def generate_corpus(out_dir: str, n_docs: int = 30, doc_kb: int = 50,
+                    formats: Sequence[str] = FORMATS, seed: int = 0) -> List[str]:
+    """Écrit `n_docs` fichiers d'environ `doc_kb` Ko (formats en alternance) ; renvoie leurs chemins."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n_docs):
+        fmt = formats[i % len(formats)]
+        path = os.path.join(out_dir, f"recueil_{i:04d}.{fmt}")
+        _WRITERS[fmt](path, _articles(rng, doc_kb * 1024))
+        paths.append(path)
+    return paths
+
+def generate_questions(n: int, paths: Sequence[str] = (), seed: int = 0) -> List[str]:
+    """Questions déterministes : ~1/3 citent un article présent dans `paths`, le reste en langage courant."""
+    rng = random.Random(seed + 1)
+    refs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            refs.extend(_REF_RX.findall(f.read()))
+    out = []
+    for i in range(n):
+        if i % 3 == 0:
+            ref = rng.choice(refs) if refs else _article_ref(rng)
+            out.append(f"Que prévoit l'article {ref} ?")
+        else:
+            out.append(f"Dans quel délai {rng.choice(ACTEURS)} {rng.choice(VERBES)} {rng.choice(SUJETS)} ?")
+    return out
@@ -0,0 +1,198 @@
+# benchmarks/run.py
+"""
+Benchmarks par étape du pipeline, entièrement hors ligne (embeddings et LLM
+factices) sur un corpus synthétique déterministe :
+
+    python -m benchmarks.run --docs 30 --doc-kb 50 --queries 200
+    python -m benchmarks.run --save-baseline          # fige la référence de cette machine
+    python -m benchmarks.run                          # échoue (code 1) si une étape régresse
+    python -m benchmarks.run --require-baseline       # CI : échoue aussi (code 2) sans référence comparable
+
+Étapes : read_any, clean_text, chunk, add_path, query, grounded_answer.
+Pour chacune : débit, latences p50/p95/p99 et pic mémoire. Le pic est mesuré
+par une seconde passe sous tracemalloc (qui ralentit les allocations d'un
+facteur ~5) : les latences viennent toujours d'une passe non tracée.
+Résultats en JSON (--out) ; comparaison à benchmarks/baseline.json avec
+une tolérance relative (--tolerance). La référence dépend de la machine :
+elle n'est pas versionnée, chaque machine (ou runner de CI) fige la sienne.
+Sans référence comparable, rien n'est vérifié et la sortie le signale.
+"""
+from __future__ import annotations
+import argparse, json, os, platform, shutil, subprocess, sys, time, tracemalloc
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from benchmarks.corpus import FORMATS, generate_corpus, generate_questions
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+class Stage:
+    """Mesures d'une étape : une latence par opération, volume traité, pic mémoire."""
+
+    def __init__(self, name: str, unit: str):
+        self.name, self.unit = name, unit
+        self.latencies: List[float] = []
+        self.volume = 0.0       # dans `unit` (Mo, chunks, questions...)
+        self.peak_bytes = 0
+
+    def time(self, items: Iterable, fn: Callable, volume: Callable = lambda item, out: 1) -> list:
+        outs = []
+        for item in items:
+            t0 = time.perf_counter()
+            out = fn(item)
+            self.latencies.append(time.perf_counter() - t0)
+            self.volume += volume(item, out)
+            outs.append(out)
+        return outs
+
+    def trace(self, items: Iterable, fn: Callable) -> None:
+        """Pic d'allocations Python (et NumPy) pendant l'étape, sorties conservées comprises."""
+        tracemalloc.start()
+        try:
+            outs = [fn(item) for item in items]
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            del outs
+        finally:
+            tracemalloc.stop()
+
+    def report(self) -> Dict[str, float]:
+        lat = np.asarray(self.latencies) * 1000
+        total = float(lat.sum() / 1000)
+        p50, p95, p99 = (np.percentile(lat, [50, 95, 99]) if len(lat) else (0.0, 0.0, 0.0))
+        return {"ops": len(lat), "unit": self.unit, "total_s": total,
+                "throughput": self.volume / total if total else 0.0,
+                "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+                "peak_mb": self.peak_bytes / 2**20}
+
+def _mb(path: str) -> float:
+    return os.path.getsize(path) / 2**20
+
+def run_benchmarks(workdir: str, n_docs: int, doc_kb: int, n_queries: int, k: int,
+                   seed: int = 0) -> Dict[str, Dict[str, float]]:
+    from src import resources, vectorstore
+    from src.config import settings
+    from src.evaluate import isolated_index
+    from src.preprocessing import chunk, clean_text, read_any
+    from src.rag import grounded_answer
+
+    paths = generate_corpus(os.path.join(workdir, "corpus"), n_docs, doc_kb, FORMATS, seed)
+    questions = generate_questions(n_queries, paths, seed)
+    stages: Dict[str, Stage] = {}
+
+    def measure(name: str, unit: str, items: list, fn: Callable, volume=lambda item, out: 1) -> list:
+        st = stages[name] = Stage(name, unit)
+        outs = st.time(items, fn, volume)
+        st.trace(items, fn)
+        return outs
+
+    # imports paresseux (pandas, bs4) hors mesure
+    for fmt in FORMATS:
+        read_any(next(p for p in paths if p.endswith(fmt)))
+    texts = measure("read_any", "Mo/s", paths, read_any, lambda p, _: _mb(p))
+    raw = [t.replace("\n\n", "\n\n\n\n") + "\xa0" for t in texts]  # à nouveau « sale »
+    cleaned = measure("clean_text", "Mo/s", raw, clean_text, lambda t, _: len(t) / 2**20)
+    measure("chunk", "chunks/s", cleaned, lambda t: list(chunk(t, settings.chunk_size, settings.chunk_overlap)),
+            lambda _, out: len(out))
+
+    # l'ingestion n'est pas rejouable sur le même index (incrémentale) : pic mesuré sur un index à part
+    ingest = stages["add_path"] = Stage("add_path", "chunks/s")
+    with isolated_index(os.path.join(workdir, "index_trace")):
+        ingest.trace(paths, vectorstore.add_path)
+    with isolated_index(os.path.join(workdir, "index")):
+        vectorstore.get_lexical()  # ouverture de l'index et du modèle hors mesure
+        resources.get(resources.EMBEDDER)
+        ingest.time(paths, vectorstore.add_path, lambda _, out: out[0])
+
+        def _query(q):
+            return vectorstore.query(q, k)
+        vectorstore.clear_query_caches()
+        qs = stages["query"] = Stage("query", "questions/s")
+        hits = qs.time(questions, _query)
+        vectorstore.clear_query_caches()
+        qs.trace(questions, _query)
+        measure("grounded_answer", "réponses/s", list(zip(questions, hits)), lambda qh: grounded_answer(*qh))
+    return {name: s.report() for name, s in stages.items()}
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_ms: float = 0.5) -> List[str]:
+    """Régressions au-delà de `tolerance` (relative) : débit, p95, pic mémoire."""
+    out = []
+    for name, cur in results.items():
+        ref = baseline.get(name)
+        if not ref:
+            continue
+        if ref["throughput"] and cur["throughput"] < ref["throughput"] * (1 - tolerance):
+            out.append(f"{name} : débit {cur['throughput']:.1f} < {ref['throughput']:.1f} {cur['unit']}")
+        # les latences sub-milliseconde sont trop bruitées pour un seuil relatif
+        if cur["p95_ms"] > max(ref["p95_ms"] * (1 + tolerance), ref["p95_ms"] + min_ms):
+            out.append(f"{name} : p95 {cur['p95_ms']:.2f} ms > {ref['p95_ms']:.2f} ms")
+        if cur["peak_mb"] > max(ref["peak_mb"] * (1 + tolerance), ref["peak_mb"] + 1):
+            out.append(f"{name} : pic mémoire {cur['peak_mb']:.1f} Mo > {ref['peak_mb']:.1f} Mo")
+    return out
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _unchecked(reason: str, required: bool) -> int:
+    print(f"RÉGRESSIONS NON VÉRIFIÉES : {reason}", file=sys.stderr)
+    return 2 if required else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Benchmarks hors ligne par étape du pipeline RAG.")
+    parser.add_argument("--docs", type=int, default=30, help="nombre de fichiers (TXT/CSV/HTML en alternance)")
+    parser.add_argument("--doc-kb", type=int, default=50, help="taille approximative de chaque fichier")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default="./data/benchmarks")
+    parser.add_argument("--out", default="./data/benchmarks/results.json")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="régression relative tolérée")
+    parser.add_argument("--save-baseline", action="store_true", help="enregistrer ces résultats comme référence")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="échouer (code 2) s'il n'y a pas de référence comparable")
+    args = parser.parse_args(argv)
+
+    # hors ligne quoi qu'il arrive : jamais d'appel réseau pendant un benchmark
+    os.environ["RAG_EMBEDDINGS"] = "dummy"
+    os.environ["LLM_PROVIDER"] = "dummy"
+    params = {"docs": args.docs, "doc_kb": args.doc_kb, "queries": args.queries, "k": args.k, "seed": args.seed}
+    shutil.rmtree(args.workdir, ignore_errors=True)
+    stages = run_benchmarks(args.workdir, args.docs, args.doc_kb, args.queries, args.k, args.seed)
+    results = {"params": params, "git": _git_rev(), "python": platform.python_version(),
+               "machine": platform.machine(), "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": stages}
+
+    print(f"{'étape':<16} {'débit':>21} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'pic Mo':>8}")
+    for name, r in stages.items():
+        print(f"{name:<16} {r['throughput']:>9.1f} {r['unit']:<11} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['peak_mb']:>8.1f}")
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Référence enregistrée : {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        return _unchecked(f"pas de référence {args.baseline} (--save-baseline pour en créer une)",
+                          args.require_baseline)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("params") != params:
+        return _unchecked(f"référence obtenue avec d'autres paramètres ({baseline.get('params')})",
+                          args.require_baseline)
+    regressions = compare(stages, baseline["stages"], args.tolerance)
+    for line in regressions:
+        print(f"RÉGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
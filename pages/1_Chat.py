@@ -1,16 +1,17 @@
 # pages/1_Chat.py
 import streamlit as st
-from datetime import datetime
-import uuid
 
+from src import resources, tracing
 from src.security import gated_access, session_timeout_guard
 from src.config import settings
-from src.vectorstore import query
-from src.rag import grounded_answer
-from src.persist import load_history, save_history
+from src.persist import get_history_store
+from src.llm_client import llm_stats, CircuitBreaker
 
 # --- Config Streamlit (doit être tout en haut) ---
 st.set_page_config(page_title="Chat", page_icon="💬", layout="wide")
+if settings.warmup_on_boot:
+    resources.warm_up()
+tracing.start_metrics_server()  # METRICS_PORT=0 : rien
 
 # --- Accès protégé + timeout de session ---
 gated_access()
@@ -19,41 +20,74 @@ session_timeout_guard()
 st.title("💬 Chat sur les documents")
 st.caption("Réponses strictement basées sur les documents vectorisés. Les sources sont citées.")
 
+# import de la chaîne RAG (qdrant_client…) après le premier rendu ; déjà fait si le warm-up est passé
+from src.vectorstore import query_cache_stats
+from src.rerank import retrieve
+from src.rag import grounded_answer_stream, last_context_stats
+from src.context import also_in, page_label
+
+def _cite(meta: dict, sep: str = " · ") -> str:
+    """« fichier · p. 4 · chunk 12 » (page seulement pour les PDF), puis les autres documents du passage."""
+    pages = page_label(meta.get("page_start"), meta.get("page_end"))
+    others = also_in(meta)
+    return (sep.join([meta.get("filename", "?")] + ([pages] if pages else []) + [f"chunk {meta.get('chunk_index', 0)}"])
+            + (f" (aussi dans : {', '.join(others)})" if others else ""))
+
 # =========================
 # State & Persistance
 # =========================
+store = get_history_store()  # data/chat_history.sqlite (ancien JSON migré au premier lancement)
+
+_PREVIEW_CHARS = 4000  # au-delà, le message est replié (suite dans un expander)
+
 def _init_state():
-    if "conversations" not in st.session_state:
-        st.session_state.conversations = load_history()  # charge depuis data/chat_history.json
     if "current_conv_id" not in st.session_state:
-        st.session_state.current_conv_id = (
-            st.session_state.conversations[-1]["id"] if st.session_state.conversations else None
-        )
+        convs = store.list_conversations(limit=1)
+        st.session_state.current_conv_id = convs[0]["id"] if convs else None
+    if "messages" not in st.session_state:
+        # conv_id -> {"n": nb de messages vus, "items": derniers messages chargés}
+        st.session_state.messages = {}
+    if "msg_window" not in st.session_state:
+        st.session_state.msg_window = {}  # conv_id -> nb de messages à afficher
+    if "rendered" not in st.session_state:
+        st.session_state.rendered = {}    # id de message -> (début, suite repliée)
+    if "conv_page" not in st.session_state:
+        st.session_state.conv_page = 0
     if "last_submitted_q" not in st.session_state:
         st.session_state.last_submitted_q = None
     if "last_answer" not in st.session_state:
         st.session_state.last_answer = None
 
 def _new_conversation(init_title="Nouvelle conversation"):
-    cid = str(uuid.uuid4())[:8]
-    now = datetime.utcnow().isoformat(timespec="seconds")
-    conv = {
-        "id": cid,
-        "title": init_title,
-        "messages": [],
-        "created_at": now,
-        "updated_at": now,
-    }
-    st.session_state.conversations.append(conv)
-    st.session_state.current_conv_id = cid
-    save_history(st.session_state.conversations)
-    return cid
+    conv = store.create_conversation(init_title)
+    st.session_state.current_conv_id = conv["id"]
+    st.session_state.messages[conv["id"]] = {"n": 0, "items": []}
+    st.session_state.conv_page = 0
+    return conv["id"]
 
 def _get_current_conv():
-    for c in st.session_state.conversations:
-        if c["id"] == st.session_state.current_conv_id:
-            return c
-    return None
+    cid = st.session_state.current_conv_id
+    return store.get_conversation(cid) if cid else None
+
+def _window(conv) -> int:
+    return st.session_state.msg_window.get(conv["id"], settings.history_messages_shown)
+
+def _get_messages(conv):
+    """Derniers messages de la conversation (fenêtre), chargés une fois par session."""
+    entry = st.session_state.messages.get(conv["id"])
+    # rechargé si une autre session a écrit dans cette conversation ou si la fenêtre s'agrandit
+    if entry is None or entry["n"] != conv["n_messages"] or len(entry["items"]) < min(_window(conv), conv["n_messages"]):
+        entry = st.session_state.messages[conv["id"]] = {
+            "n": conv["n_messages"], "items": store.get_messages(conv["id"], limit=_window(conv)),
+        }
+    return entry
+
+def _append_message(conv, role, content):
+    entry = _get_messages(conv)
+    mid = store.append_message(conv["id"], role, content)
+    entry["items"].append({"id": mid, "role": role, "content": content})
+    entry["n"] += 1
+    conv["n_messages"] += 1
 
 def _set_current_conv(cid: str):
     st.session_state.current_conv_id = cid
@@ -61,24 +95,36 @@ def _set_current_conv(cid: str):
 def _rename_current_conv(title: str):
     conv = _get_current_conv()
     if conv and title.strip():
-        conv["title"] = title.strip()
-        conv["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
-        save_history(st.session_state.conversations)
+        store.rename(conv["id"], title.strip())
 
 def _delete_current_conv():
     cid = st.session_state.current_conv_id
     if cid is None:
         return
-    st.session_state.conversations = [c for c in st.session_state.conversations if c["id"] != cid]
-    st.session_state.current_conv_id = (
-        st.session_state.conversations[-1]["id"] if st.session_state.conversations else None
-    )
-    save_history(st.session_state.conversations)
+    store.delete(cid)
+    st.session_state.messages.pop(cid, None)
+    convs = store.list_conversations(limit=1)
+    st.session_state.current_conv_id = convs[0]["id"] if convs else None
+
+def _render_message(m):
+    # seul le découpage aperçu / suite est mis en cache par message ; st.markdown
+    # s'exécute à chaque rerun pour chaque message affiché (d'où la pagination)
+    parts = st.session_state.rendered.get(m["id"])
+    if parts is None:
+        text = m["content"]
+        cut = text.rfind("\n\n", 0, _PREVIEW_CHARS) if len(text) > _PREVIEW_CHARS else -1
+        parts = (text[:cut], text[cut:].lstrip()) if cut > 0 else (text, "")
+        st.session_state.rendered[m["id"]] = parts
+    with st.chat_message(m["role"]):
+        st.markdown(parts[0])
+        if parts[1]:
+            with st.expander("Afficher la suite"):
+                st.markdown(parts[1])
 
 _init_state()
 
 # =========================
-# Sidebar : gestion des conversations (tri par dernière activité)
+# Sidebar : gestion des conversations (tri par dernière activité, paginé)
 # =========================
 with st.sidebar:
     st.subheader("💬 Conversations")
@@ -88,19 +134,35 @@ with st.sidebar:
 
     st.divider()
 
-    convs = sorted(
-        st.session_state.conversations,
-        key=lambda c: c.get("updated_at", c.get("created_at", "")),
-        reverse=True,
-    )
+    n_convs = store.count_conversations()
+    page_size = settings.history_page_size
+    n_pages = max((n_convs + page_size - 1) // page_size, 1)
+    page = st.session_state.conv_page = min(st.session_state.conv_page, n_pages - 1)
+    # une page de métadonnées seulement, récentes en premier
+    convs = store.list_conversations(limit=page_size, offset=page * page_size)
     if convs:
-        labels = [
-            f"{c['title']}  ·  {c.get('updated_at', c['created_at']).replace('T',' ')}"
+        titles = {
+            c["id"]: f"{c['title']}  ·  {c.get('updated_at', c['created_at']).replace('T',' ')}"
             for c in convs
-        ]
-        ids = [c["id"] for c in convs]
-        picked = st.radio("Historique (récents en haut)", labels, index=0, key="conv_picker")
-        _set_current_conv(ids[labels.index(picked)])
+        }
+        ids = list(titles)
+        current = st.session_state.current_conv_id
+        picked = st.radio(
+            "Historique (récents en haut)", ids, format_func=titles.get,
+            index=ids.index(current) if current in ids else None, key=f"conv_picker_{page}",
+        )
+        if picked:
+            _set_current_conv(picked)
+
+        if n_pages > 1:
+            prev_col, label_col, next_col = st.columns([1, 2, 1])
+            if prev_col.button("◀", disabled=page == 0, key="conv_prev"):
+                st.session_state.conv_page -= 1
+                st.rerun()
+            label_col.caption(f"Page {page + 1}/{n_pages}")
+            if next_col.button("▶", disabled=page >= n_pages - 1, key="conv_next"):
+                st.session_state.conv_page += 1
+                st.rerun()
 
         conv = _get_current_conv()
         if conv:
@@ -109,27 +171,45 @@ with st.sidebar:
                 _rename_current_conv(new_title)
             if st.button("🗑️ Supprimer cette conversation"):
                 _delete_current_conv()
-                st.experimental_rerun()
+                st.rerun()
     else:
         st.info("Aucune conversation. Crée la première avec le bouton ci-dessus.")
 
+    llm = llm_stats()
+    if llm["circuit"] != CircuitBreaker.CLOSED:
+        st.warning("Fournisseur LLM indisponible : réponses en mode dégradé (passages seuls).")
+    st.caption(f"LLM : {llm['in_flight']} appel(s) en cours · {llm['retried']} retry · "
+               f"{llm['short_circuited']} court-circuité(s)")
+    resources.render_readiness()
+
 # Si aucune conversation, en créer une par défaut
-if not st.session_state.conversations:
+if not n_convs:
     _new_conversation()
 
 conv = _get_current_conv()
 
 # =========================
-# Affichage intégral de la conversation sélectionnée
+# Affichage de la conversation sélectionnée (derniers messages, paginé vers le haut)
 # =========================
-if conv:
-    if conv["messages"]:
-        for m in conv["messages"]:
-            with st.chat_message(m["role"]):
-                st.markdown(m["content"])
+def _load_earlier(conv):
+    st.session_state.msg_window[conv["id"]] = _window(conv) + settings.history_messages_shown
+
+@st.fragment  # "messages précédents" ne relance que ce bloc, pas toute la page
+def _history(conv):
+    entry = _get_messages(conv)
+    earlier = conv["n_messages"] - len(entry["items"])
+    if earlier > 0:
+        st.button(f"⬆️ Charger les messages précédents ({earlier})", key=f"earlier_{conv['id']}",
+                  on_click=_load_earlier, args=(conv,))
+    if entry["items"]:
+        for m in entry["items"]:
+            _render_message(m)
     else:
         st.info("Aucun message dans cette conversation. Pose ta première question ci-dessous.")
 
+if conv:
+    _history(conv)
+
 # =========================
 # Zone de saisie (form pour éviter doubles appels)
 # =========================
@@ -147,52 +227,63 @@ if submit and q:
         with st.chat_message("assistant"):
             st.markdown(st.session_state.last_answer)
     else:
-        # 1) Append message user
-        conv["messages"].append({"role": "user", "content": q})
-        conv["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
-        save_history(st.session_state.conversations)
-
-        # 2) Retrieval
-        hits = query(q, settings.max_ctx_docs)
-        if not hits:
-            st.warning("Aucun passage pertinent trouvé. Ajoute des documents dans 🗂️ Gestion des documents.")
-            st.stop()
-
-        # 3) Passages utilisés (transparence)
-        with st.expander("🧠 Passages utilisés (pour ce tour)"):
-            for h in hits:
-                st.markdown(
-                    f"**{h['meta'].get('filename','?')}** · chunk {h['meta'].get('chunk_index',0)} · score {h['meta'].get('score',0):.3f}"
-                )
-                st.code(h["text"][:800])
+        with tracing.turn() as trace:
+            # 1) Append message user
+            _append_message(conv, "user", q)
 
-        # 4) Appel LLM (réponse ancrée) + spinner
-        with st.spinner("Je réfléchis…"):
+            # 2) Retrieval
             try:
-                ans = grounded_answer(q, hits)
-            except Exception as e:
-                ans = f"Le service est momentanément indisponible : {e}"
+                with st.spinner("Recherche des passages…"):
+                    hits = retrieve(q, settings.max_ctx_docs)
+            except resources.ResourceError as e:
+                st.error(f"Recherche impossible : {e}")
+                st.stop()
+            if not hits:
+                st.warning("Aucun passage pertinent trouvé. Ajoute des documents dans 🗂️ Gestion des documents.")
+                st.stop()
 
-        # 5) Afficher + stocker
-        with st.chat_message("assistant"):
-            st.markdown(ans)
-            # petit rappel des sources en dessous (optionnel)
-            st.code(
-                "\n".join([f"[{h['meta']['filename']} | chunk {h['meta']['chunk_index']}]"
-                           for h in hits]),
-                language=None
-            )
-
-        conv["messages"].append({"role": "assistant", "content": ans})
-        conv["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
-        save_history(st.session_state.conversations)
-
-        # 6) Mémos anti-doubles
-        st.session_state.last_submitted_q = q
-        st.session_state.last_answer = ans
-
-        # 7) Titre auto depuis la 1ʳᵉ question
-        if conv["title"] in ("Nouvelle conversation", "", None):
-            _rename_current_conv(q[:60])
+            # 3) Passages utilisés (transparence)
+            with st.expander("🧠 Passages utilisés (pour ce tour)"):
+                for h in hits:
+                    st.markdown(
+                        f"**{_cite(h['meta'])}** · score {h['meta'].get('score',0):.3f}"
+                        f" · {h['meta'].get('retrieval', 'dense')}"
+                    )
+                    st.code(h["text"][:800])
+                qstats = query_cache_stats()
+                st.caption(f"Cache recherche : {qstats['results']['hit_rate']:.0%} de hits · "
+                           f"cache embeddings de questions : {qstats['embeddings']['hit_rate']:.0%}")
+                trace_box = st.empty()  # détail des étapes, rempli à la fin du tour
+
+            # 4) Appel LLM (réponse ancrée), affichée au fil des tokens
+            with st.chat_message("assistant"):
+                try:
+                    ans = st.write_stream(grounded_answer_stream(q, hits))
+                except Exception as e:
+                    ans = f"Le service est momentanément indisponible : {e}"
+                    st.markdown(ans)
+                ctx_stats = last_context_stats()
+                if ctx_stats:
+                    st.caption(f"Contexte : {ctx_stats['tokens_out']} tokens envoyés "
+                               f"({ctx_stats['tokens_saved']} économisés par fusion/budget)")
+                # 5) petit rappel des sources en dessous (optionnel)
+                st.code(
+                    "\n".join([f"[{_cite(h['meta'], ' | ')}]"
+                               for h in hits]),
+                    language=None
+                )
+
+            _append_message(conv, "assistant", ans)
+
+            # 6) Mémos anti-doubles
+            st.session_state.last_submitted_q = q
+            st.session_state.last_answer = ans
+
+            # 7) Titre auto depuis la 1ʳᵉ question
+            if conv["title"] in ("Nouvelle conversation", "", None):
+                _rename_current_conv(q[:60])
+
+        if trace:
+            trace_box.markdown("⏱️ Temps par étape\n\n" + trace.markdown())
 
 st.caption("Sélectionne une conversation dans la barre latérale pour revoir **tous** ses échanges. L’historique est sauvegardé sur disque.")
\ No newline at end of file
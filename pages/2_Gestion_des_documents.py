@@ -1,22 +1,65 @@
 import streamlit as st, os
+from src import resources
 from src.config import settings
-from src.vectorstore import add_path, delete_by_source
+from src.ingest import get_queue, DONE, FAILED
 
+if settings.warmup_on_boot:
+    resources.warm_up()
 st.title("🗂️ Gestion des documents")
-st.caption("Uploader / supprimer. La vectorisation est automatique.")
+st.caption("Uploader / supprimer. La vectorisation est automatique et tourne en arrière-plan.")
+with st.sidebar:
+    resources.render_readiness()
 
-upl = st.file_uploader("Ajouter des fichiers (.txt, .csv, .html)", type=["txt","csv","html"], accept_multiple_files=True)
+# import de la chaîne d'indexation (qdrant_client…) après le premier rendu
+from src.vectorstore import delete_by_source, last_ingest
+from src.embeddings import cache_stats
+
+upl = st.file_uploader("Ajouter des fichiers (.txt, .csv, .html, .pdf)", type=["txt","csv","html","pdf"], accept_multiple_files=True)
+if "queued_uploads" not in st.session_state:
+    st.session_state.queued_uploads = set()
 if upl:
+    queue = get_queue()
     for f in upl:
+        # le uploader conserve ses fichiers d'un rerun à l'autre : on ne les met en file qu'une fois
+        if f.file_id in st.session_state.queued_uploads:
+            continue
         dest = os.path.join(settings.upload_dir, f.name)
         with open(dest, "wb") as out:
             out.write(f.read())
-        with st.spinner(f"Vectorisation de {f.name}..."):
-            try:
-                n_chunks, n_chars = add_path(dest)
-                st.success(f"{f.name}: {n_chunks} chunks indexés ({n_chars} caractères).")
-            except Exception as e:
-                st.error(f"Echec pour {f.name}: {e}")
+        queue.submit(dest)
+        st.session_state.queued_uploads.add(f.file_id)
+
+# Suivi de la file d'ingestion (rafraîchi seul, sans relancer toute la page)
+@st.fragment(run_every="2s")
+def _ingest_status():
+    queue = get_queue()
+    jobs = queue.jobs()
+    if not jobs:
+        return
+    st.subheader("Vectorisation")
+    for job in jobs:
+        name = os.path.basename(job.path)
+        if job.status == DONE:
+            info = last_ingest(job.path)
+            st.success(f"{name}: {job.chunks} chunks indexés ({job.chars} caractères) · "
+                       f"{info.get('embedded', job.chunks)} ré-embeddés, "
+                       f"{info.get('duplicates', 0)} doublons ({info.get('dedup_ratio', 0):.0%}) non indexés, "
+                       f"{info.get('deleted', 0)} obsolètes supprimés "
+                       f"({info.get('chunks_per_s', 0):.1f} chunks/s) · index : "
+                       f"{info.get('index_points', 0)} points, {info.get('index_dedup_ratio', 0):.0%} de doublons.")
+        elif job.status == FAILED:
+            st.error(f"Echec pour {name}: {job.error}")
+        else:
+            st.progress(job.progress, text=f"{name} · {job.status}")
+    stats = cache_stats()
+    if stats:
+        st.caption(f"Cache embeddings : {stats['hit_rate']:.0%} de hits · "
+                   f"{stats['bytes_saved'] / 1024:.0f} Ko de texte non ré-embeddés.")
+    if not queue.pending() and st.button("Effacer le suivi"):
+        queue.clear_finished()
+        st.rerun()
+
+_ingest_status()
 
 st.subheader("Fichiers existants")
 files = sorted([f for f in os.listdir(settings.upload_dir) if not f.startswith(".")])
@@ -32,7 +75,7 @@ if files:
                         delete_by_source(path)
                         os.remove(path)
                         st.success("Supprimé.")
-                        st.experimental_rerun()
+                        st.rerun()
                     except Exception as e:
                         st.error(f"Erreur: {e}")
 else:
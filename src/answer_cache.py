@@ -0,0 +1,174 @@
+# src/answer_cache.py
+"""
+Cache persistant des réponses LLM (SQLite).
+
+Une réponse est rangée sous (provider, modèle, ensemble des passages
+retrouvés). À question identique (normalisée) : hit exact. Sinon, on
+compare l'embedding de la question aux questions déjà répondues sur les
+mêmes passages ; au-dessus du seuil de similarité, la réponse stockée
+(sources comprises) est réutilisée. Toute ré-indexation ou suppression
+d'un passage cité invalide les réponses qui s'appuyaient dessus.
+"""
+from __future__ import annotations
+import hashlib, os, sqlite3, threading, time
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from src.lexical import to_sql_id
+from src.query_cache import normalize_question
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider  TEXT NOT NULL,
+    model     TEXT NOT NULL,
+    hit_key   TEXT NOT NULL,
+    question  TEXT NOT NULL,
+    qvec      BLOB NOT NULL,
+    answer    TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    UNIQUE (provider, model, hit_key, question)
+);
+CREATE INDEX IF NOT EXISTS answers_lookup ON answers(provider, model, hit_key);
+CREATE INDEX IF NOT EXISTS answers_lru ON answers(last_used);
+CREATE TABLE IF NOT EXISTS answer_points (
+    answer_id INTEGER NOT NULL REFERENCES answers(id) ON DELETE CASCADE,
+    point_id  INTEGER NOT NULL,
+    PRIMARY KEY (point_id, answer_id)
+) WITHOUT ROWID;
+"""
+
+def hit_key(hit_ids: Iterable) -> str:
+    return hashlib.sha256(",".join(sorted(str(i) for i in hit_ids)).encode()).hexdigest()
+
+class AnswerCache:
+    def __init__(self, path: str, max_bytes: int, threshold: float):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes, self.threshold = max_bytes, threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get_exact(self, provider: str, model: str, question: str, hit_ids: Sequence) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, answer FROM answers WHERE provider=? AND model=? AND hit_key=? AND question=?",
+                (provider, model, hit_key(hit_ids), normalize_question(question)),
+            ).fetchone()
+            if row:
+                self._touch(row[0])
+                self.exact_hits += 1
+                return row[1]
+        return None
+
+    def get_similar(self, provider: str, model: str, qvec, hit_ids: Sequence) -> Optional[str]:
+        """Réponse déjà donnée sur les mêmes passages à une question proche (cosinus >= seuil)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, qvec, answer FROM answers WHERE provider=? AND model=? AND hit_key=?",
+                (provider, model, hit_key(hit_ids)),
+            ).fetchall()
+            if rows:
+                q = np.asarray(qvec, dtype=np.float32)
+                mat = np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                sims = mat @ q / (np.linalg.norm(mat, axis=1) * np.linalg.norm(q) + 1e-12)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._touch(rows[best][0])
+                    self.semantic_hits += 1
+                    return rows[best][2]
+            self.misses += 1
+        return None
+
+    def _touch(self, answer_id: int) -> None:
+        self._conn.execute("UPDATE answers SET last_used=? WHERE id=?", (time.time(), answer_id))
+        self._conn.commit()
+
+    def put(self, provider: str, model: str, question: str, hit_ids: Sequence, qvec, answer: str) -> None:
+        if self.max_bytes <= 0:
+            return
+        blob = np.asarray(qvec, dtype=np.float32).tobytes()
+        size = len(blob) + len(answer.encode("utf-8"))
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR REPLACE INTO answers(provider, model, hit_key, question, qvec, answer, size, last_used) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                (provider, model, hit_key(hit_ids), normalize_question(question), blob, answer, size, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO answer_points(answer_id, point_id) VALUES (?,?)",
+                [(cur.lastrowid, to_sql_id(int(pid))) for pid in hit_ids],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute("SELECT id, size FROM answers ORDER BY last_used LIMIT 1").fetchone()
+            if not row:
+                break
+            self._conn.execute("DELETE FROM answers WHERE id=?", (row[0],))
+            total -= row[1]
+
+    def invalidate(self, point_ids: Iterable) -> int:
+        """Supprime les réponses qui citent l'un de ces passages. Renvoie le nombre de réponses supprimées."""
+        ids = [to_sql_id(int(p)) for p in point_ids]
+        removed = 0
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i+500]
+                marks = ",".join("?" * len(part))
+                removed += self._conn.execute(
+                    f"DELETE FROM answers WHERE id IN "
+                    f"(SELECT answer_id FROM answer_points WHERE point_id IN ({marks}))",
+                    part,
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            n, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        return {"exact_hits": self.exact_hits, "semantic_hits": self.semantic_hits,
+                "misses": self.misses, "entries": n, "stored_bytes": size}
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Instance unique du process (None si ANSWER_CACHE_MAX_MB=0)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from src.config import settings
+            if settings.answer_cache_max_mb <= 0:
+                return None
+            _cache = AnswerCache(settings.answer_cache_path,
+                                 settings.answer_cache_max_mb * 1024 * 1024,
+                                 settings.answer_cache_threshold)
+        return _cache
+
+def close_answer_cache() -> None:
+    """Ferme l'instance du process ; rouverte au prochain accès avec les réglages courants."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+            _cache = None
+
+def invalidate_points(point_ids: Iterable) -> None:
+    cache = get_answer_cache()
+    if cache:
+        cache.invalidate(point_ids)
@@ -7,9 +7,80 @@ class Settings(BaseModel):
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY")
     allow_signin_password: str | None = os.getenv("ALLOW_SIGNIN_PASSWORD")
     chroma_dir: str = os.getenv("CHROMA_DIR", "./data/vectorstore")
+    retrieval_url: str | None = os.getenv("RETRIEVAL_URL")  # service python -m src.server ; sinon index dans ce process
+    retrieval_timeout: float = float(os.getenv("RETRIEVAL_TIMEOUT", "120"))
+    server_batch_max: int = int(os.getenv("SERVER_BATCH_MAX", "32"))      # questions embeddées par lot
+    server_batch_wait_ms: float = float(os.getenv("SERVER_BATCH_WAIT_MS", "5"))
+    qdrant_url: str | None = os.getenv("QDRANT_URL")  # serveur Qdrant ; sinon index embarqué dans chroma_dir
+    qdrant_api_key: str | None = os.getenv("QDRANT_API_KEY")
+    qdrant_on_disk: bool = os.getenv("QDRANT_ON_DISK", "1") not in ("0", "false", "False")  # vecteurs et payloads en mmap
+    qdrant_quantization: str = os.getenv("QDRANT_QUANTIZATION", "int8")  # int8 | none
+    qdrant_rescore: bool = True          # re-score des candidats quantifiés avec les vecteurs originaux
+    qdrant_oversampling: float = 2.0
+    qdrant_hnsw_m: int = int(os.getenv("QDRANT_HNSW_M", "16"))
+    qdrant_hnsw_ef_construct: int = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    qdrant_search_ef: int = int(os.getenv("QDRANT_SEARCH_EF", "128"))
+    qdrant_payload_indexes: list[str] = os.getenv("QDRANT_PAYLOAD_INDEXES", "source,filename").split(",")
+    # Backend vectoriel : qdrant (défaut) | numpy (matrice mmap en force brute, cf. src/npstore.py)
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "qdrant")
+    npstore_dir: str = os.getenv("NPSTORE_DIR", "./data/npstore")
+    npstore_dtype: str = os.getenv("NPSTORE_DTYPE", "float16")  # float16 | int8
     upload_dir: str = os.getenv("UPLOAD_DIR", "./data/uploads")
     embeddings_provider: str = os.getenv("EMBEDDINGS_PROVIDER", "openai")
+    warmup_on_boot: bool = os.getenv("WARMUP_ON_BOOT", "1") not in ("0", "false", "False")  # modèle chargé au démarrage
+    embed_dim: int = int(os.getenv("EMBED_DIM", "0"))  # dimension réduite des vecteurs (0 = celle du modèle)
+    embed_pca_path: str = os.getenv("EMBED_PCA_PATH", "./data/embed_pca.npz")  # projection ACP (modèle local)
+    embed_pca_sample: int = int(os.getenv("EMBED_PCA_SAMPLE", "20000"))  # chunks pour ajuster l'ACP
+    embed_cache_path: str = os.getenv("EMBED_CACHE_PATH", "./data/embed_cache.sqlite")
+    embed_cache_max_mb: int = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+    embed_concurrency: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    embed_batch_tokens: int = int(os.getenv("EMBED_BATCH_TOKENS", "32000"))
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+    embed_max_retries: int = 5
+    embed_max_backoff_s: float = float(os.getenv("EMBED_MAX_BACKOFF_S", "30"))  # Retry-After plus long : échec
+    embed_timeout: float = 60.0
+    local_embed_batch_size: int = int(os.getenv("LOCAL_EMBED_BATCH_SIZE", "64"))
+    local_embed_processes: int = int(os.getenv("LOCAL_EMBED_PROCESSES", "0"))  # 0 = mono-process, -1 = tous les cœurs
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "256"))  # chunks embeddés/indexés à la fois
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", "4"))
+    pdf_workers: int = int(os.getenv("PDF_WORKERS", "0"))  # process d'extraction des pages PDF (0 = tous les cœurs)
+    pdf_pages_per_task: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    dedup: bool = os.getenv("DEDUP", "1") not in ("0", "false", "False")  # doublons exacts (texte normalisé identique)
+    dedup_index_path: str = os.getenv("DEDUP_INDEX_PATH", "./data/dedup.sqlite")
+    lexical_index_path: str = os.getenv("LEXICAL_INDEX_PATH", "./data/bm25.sqlite")
+    hybrid_search: bool = os.getenv("HYBRID_SEARCH", "1") not in ("0", "false", "False")
+    hybrid_candidates: int = 20   # candidats par moteur avant fusion
+    rrf_k: int = 60
+    lexical_decisive_ratio: float = 2.0  # référence citée et top BM25 >= ratio x second -> pas d'embedding (0 = jamais)
+    query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))  # 0 = désactivé
+    query_cache_ttl_s: float = float(os.getenv("QUERY_CACHE_TTL_S", "3600"))
+    answer_cache_path: str = os.getenv("ANSWER_CACHE_PATH", "./data/answer_cache.sqlite")
+    answer_cache_max_mb: int = int(os.getenv("ANSWER_CACHE_MAX_MB", "64"))  # 0 = désactivé
+    answer_cache_threshold: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # appels simultanés, tout le process
+    llm_connect_timeout: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    llm_read_timeout: float = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    llm_max_backoff_s: float = float(os.getenv("LLM_MAX_BACKOFF_S", "8"))  # Retry-After plus long : pas de retry
+    llm_queue_timeout: float = 10.0
+    llm_breaker_failures: int = 5
+    llm_breaker_reset_s: float = 30.0
+    rerank_mode: str = os.getenv("RERANK_MODE", "off")  # off | cross | mmr
+    rerank_model: str = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    rerank_candidates: int = int(os.getenv("RERANK_CANDIDATES", "24"))
+    rerank_batch_size: int = 16
+    rerank_budget_ms: float = float(os.getenv("RERANK_BUDGET_MS", "400"))
+    mmr_lambda: float = 0.7
     max_ctx_docs: int = 6
+    history_page_size: int = 20       # conversations par page dans la barre latérale
+    history_messages_shown: int = 20  # derniers messages affichés (puis "messages précédents")
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Traces par étape (src/tracing.py) : détail par tour, histogrammes JSONL, export Prometheus
+    tracing: bool = os.getenv("TRACING", "1") not in ("0", "false", "False")
+    trace_log_path: str = os.getenv("TRACE_LOG_PATH", "./data/traces.jsonl")
+    trace_log_max_mb: float = float(os.getenv("TRACE_LOG_MAX_MB", "20"))  # au-delà : renommé en .1 (une archive)
+    trace_flush_s: float = float(os.getenv("TRACE_FLUSH_S", "60"))  # intervalle d'écriture des histogrammes
+    metrics_port: int = int(os.getenv("METRICS_PORT", "0"))  # 0 = pas d'endpoint /metrics côté Streamlit
     chunk_size: int = 800
     chunk_overlap: int = 100
 
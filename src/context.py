@@ -0,0 +1,143 @@
+# src/context.py
+"""
+Assemblage du contexte envoyé au LLM, sous budget de tokens.
+
+Les chunks se chevauchent (`chunk_overlap` mots) : deux hits consécutifs
+d'un même fichier répètent donc le même texte. On fusionne les hits de
+chunk_index consécutifs en un seul passage (sans la partie dupliquée),
+puis on remplit le budget par score décroissant. La numérotation [n] du
+prompt est celle du bloc Sources.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+def page_label(page_start: Optional[int], page_end: Optional[int] = None) -> str:
+    """« p. 4 » / « p. 4-5 » pour les passages de PDF, chaîne vide sinon."""
+    if page_start is None:
+        return ""
+    return f"p. {page_start}" if page_end in (None, page_start) else f"p. {page_start}-{page_end}"
+
+def also_in(meta: Dict) -> List[str]:
+    """Autres documents où figure un passage dédupliqué (« contrat.pdf p. 4 »), sans répétition."""
+    out = []
+    for src in (meta.get("sources") or [])[1:]:
+        pages = page_label(src.get("page_start"), src.get("page_end"))
+        name = f"{src.get('filename', '?')} {pages}" if pages else src.get("filename", "?")
+        if name not in out:
+            out.append(name)
+    return out
+
+def token_counter(model: str = "gpt-4o-mini") -> Callable[[str], int]:
+    """Compteur de tokens tiktoken (approximation prudente si l'encodage est indisponible)."""
+    try:
+        import tiktoken
+        try:
+            enc = tiktoken.encoding_for_model(model)
+        except KeyError:
+            enc = tiktoken.get_encoding("cl100k_base")
+        return lambda t: len(enc.encode(t, disallowed_special=()))
+    except Exception:
+        return lambda t: len(t) // 3 + 1
+
+@dataclass
+class Passage:
+    num: int
+    text: str
+    filename: str
+    source: str
+    chunk_start: int
+    chunk_end: int
+    score: float
+    hit_ids: List = field(default_factory=list)
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+    also_in: List[str] = field(default_factory=list)   # doublons dans d'autres documents
+
+    @property
+    def label(self) -> str:
+        chunks = (f"chunk {self.chunk_start}" if self.chunk_start == self.chunk_end
+                  else f"chunks {self.chunk_start}-{self.chunk_end}")
+        pages = page_label(self.page_start, self.page_end)
+        label = f"{self.filename} · {pages} · {chunks}" if pages else f"{self.filename} · {chunks}"
+        return label + (f" (aussi dans : {', '.join(self.also_in)})" if self.also_in else "")
+
+@dataclass
+class PackedContext:
+    passages: List[Passage]
+    tokens_in: int      # tokens des hits tels que retrouvés
+    tokens_out: int     # tokens réellement envoyés
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_in - self.tokens_out, 0)
+
+    def prompt(self) -> str:
+        return "\n\n".join(f"[{p.num}] {p.text}" for p in self.passages)
+
+def _overlap(prev: List[str], nxt: List[str], max_overlap: int) -> int:
+    """Plus long suffixe de `prev` qui est aussi préfixe de `nxt` (en mots)."""
+    for m in range(min(len(prev), len(nxt), max_overlap), 0, -1):
+        if prev[-m:] == nxt[:m]:
+            return m
+    return 0
+
+def _merge(hits: List[Dict], max_overlap: int) -> List[Passage]:
+    by_source: Dict[str, List] = {}
+    for rank, h in enumerate(hits):
+        meta = h.get("meta", {})
+        by_source.setdefault(meta.get("source") or meta.get("filename") or "?", []).append((rank, h))
+
+    merged = []  # (meilleur rang, Passage)
+    for source, items in by_source.items():
+        items.sort(key=lambda it: it[1].get("meta", {}).get("chunk_index", 0))
+        run = None
+        for rank, h in items:
+            meta = h.get("meta", {})
+            idx = meta.get("chunk_index", 0)
+            words = h.get("text", "").split()
+            score = meta.get("score") or 0.0
+            if run and idx == run["end"] + 1:
+                m = _overlap(run["words"], words, max_overlap)
+                run["words"].extend(words[m:])
+                run.update(end=idx, rank=min(run["rank"], rank), score=max(run["score"], score),
+                           page_end=meta.get("page_end", run["page_end"]))
+                run["ids"].append(h.get("id"))
+                run["also_in"] += [s for s in also_in(meta) if s not in run["also_in"]]
+                continue
+            if run:
+                merged.append(run)
+            run = {"source": source, "filename": meta.get("filename", "?"), "start": idx, "end": idx,
+                   "words": list(words), "rank": rank, "score": score, "ids": [h.get("id")],
+                   "page_start": meta.get("page_start"), "page_end": meta.get("page_end"),
+                   "also_in": also_in(meta)}
+        if run:
+            merged.append(run)
+    return [
+        (r["rank"], Passage(0, " ".join(r["words"]), r["filename"], r["source"], r["start"], r["end"],
+                            r["score"], r["ids"], r["page_start"], r["page_end"], r["also_in"]))
+        for r in merged
+    ]
+
+def pack_context(hits: List[Dict], budget: int, max_overlap: int,
+                 count: Callable[[str], int] = None) -> PackedContext:
+    """Fusionne, déduplique et tasse les passages sous `budget` tokens (meilleurs scores d'abord)."""
+    count = count or token_counter()
+    tokens_in = sum(count(h.get("text", "")) for h in hits)
+    candidates = sorted(_merge(hits, max_overlap), key=lambda rp: (-rp[1].score, rp[0]))
+
+    packed, used = [], 0
+    for _, p in candidates:
+        n = count(p.text)
+        if used + n > budget:
+            if packed:
+                continue  # trop long : on tente les passages suivants, plus courts
+            # même le meilleur passage dépasse : on le tronque au budget
+            words = p.text.split()
+            while words and count(" ".join(words)) > budget:
+                words = words[: int(len(words) * 0.9)]
+            p.text, n = " ".join(words), count(" ".join(words))
+        p.num = len(packed) + 1
+        packed.append(p)
+        used += n
+    return PackedContext(packed, tokens_in, used)
@@ -0,0 +1,158 @@
+# src/dedup.py
+"""
+Détection des chunks identiques à l'ingestion (clauses types des contrats :
+confidentialité, juridiction, signature...).
+
+Déduplication exacte : deux chunks sont doublons si leur texte normalisé
+(casse, ponctuation et espaces près) est identique, comparé par une clé de
+hachage indexée. Pas de quasi-doublons : un seul mot (ville, montant,
+négation) change le sens d'une clause.
+
+Un doublon n'est ni embeddé ni indexé : il devient un alias du chunk
+canonique (source, chunk_index, pages, chunk_hash, texte). Les alias servent
+à citer toutes les sources d'un passage, à reconnaître un chunk inchangé à
+la ré-ingestion et à remplacer le canonique quand sa source est supprimée.
+"""
+from __future__ import annotations
+import hashlib, os, re, sqlite3, threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.lexical import from_sql_id, to_sql_id
+
+_WORD_RX = re.compile(r"\w+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS canon (
+    id   INTEGER PRIMARY KEY,
+    norm TEXT
+);
+CREATE TABLE IF NOT EXISTS alias (
+    id          INTEGER PRIMARY KEY,
+    canon       INTEGER NOT NULL,
+    source      TEXT NOT NULL,
+    filename    TEXT,
+    chunk_index INTEGER NOT NULL,
+    chunk_hash  TEXT,
+    page_start  INTEGER,
+    page_end    INTEGER,
+    norm        TEXT,
+    text        TEXT
+);
+CREATE INDEX IF NOT EXISTS alias_canon ON alias(canon);
+CREATE INDEX IF NOT EXISTS alias_source ON alias(source);
+"""
+
+_ALIAS_FIELDS = ("id", "canon", "source", "filename", "chunk_index", "chunk_hash",
+                 "page_start", "page_end", "norm", "text")
+# bases créées avant ces changements de schéma : complétées / allégées à l'ouverture
+_ADDED_COLUMNS = {"canon": ("norm",), "alias": ("norm", "text")}
+_DROPPED_COLUMNS = {"canon": ("simhash", "b0", "b1", "b2", "b3"), "alias": ("simhash",)}  # ex-empreintes SimHash
+
+def text_key(text: str) -> str:
+    """Clé du texte normalisé (minuscules, mots seulement) : égalité stricte, mots vides et accents compris."""
+    words = _WORD_RX.findall(text.lower())
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=16).hexdigest()
+
+class DedupIndex:
+    """Clés de texte des chunks canoniques et alias des doublons (SQLite, à côté de l'index vectoriel)."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        for b in range(4):
+            self._conn.execute(f"DROP INDEX IF EXISTS canon_b{b}")
+        for table in ("canon", "alias"):
+            have = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for col in _ADDED_COLUMNS[table]:
+                if col not in have:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} TEXT")
+            for col in _DROPPED_COLUMNS[table]:
+                if col in have:
+                    self._conn.execute(f"ALTER TABLE {table} DROP COLUMN {col}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS canon_norm ON canon(norm)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def find(self, norm: str) -> Optional[int]:
+        """Chunk canonique de même texte normalisé (`norm`, voir text_key), sinon None."""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM canon WHERE norm = ? LIMIT 1", (norm,)).fetchone()
+        return from_sql_id(row[0]) if row else None
+
+    def add_canonical(self, items: Iterable[Tuple[int, str]]) -> None:
+        """Enregistre des chunks indexés : itérable de (id, clé du texte)."""
+        rows = [(to_sql_id(pid), norm) for pid, norm in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO canon VALUES (?, ?)", rows)
+
+    def add_aliases(self, rows: Iterable[dict]) -> None:
+        """Doublons : dicts aux clés id, canon, source, filename, chunk_index, chunk_hash, pages, norm, text."""
+        values = [(to_sql_id(r["id"]), to_sql_id(r["canon"]), r["source"],
+                   r.get("filename"), r["chunk_index"], r.get("chunk_hash"), r.get("page_start"),
+                   r.get("page_end"), r.get("norm"), r.get("text")) for r in rows]
+        marks = ", ".join("?" * len(_ALIAS_FIELDS))
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO alias ({', '.join(_ALIAS_FIELDS)}) VALUES ({marks})",
+                                   values)
+
+    def _row(self, row) -> dict:
+        r = dict(zip(_ALIAS_FIELDS, row))
+        for key in ("id", "canon"):
+            r[key] = from_sql_id(r[key])
+        return r
+
+    def aliases(self, canon_ids: Sequence[int]) -> Dict[int, List[dict]]:
+        """id canonique -> alias (ordre d'ingestion), pour les seuls canoniques qui en ont."""
+        out: Dict[int, List[dict]] = {}
+        sql_ids = [to_sql_id(int(i)) for i in canon_ids]
+        with self._lock:
+            for i in range(0, len(sql_ids), 500):
+                part = sql_ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                for row in self._conn.execute(
+                        f"SELECT {', '.join(_ALIAS_FIELDS)} FROM alias WHERE canon IN ({marks}) ORDER BY rowid", part):
+                    r = self._row(row)
+                    out.setdefault(r["canon"], []).append(r)
+        return out
+
+    def source_aliases(self, source: str) -> Dict[int, tuple]:
+        """id -> (chunk_index, page_start, page_end) des doublons de ce fichier (pour l'ingestion incrémentale)."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, chunk_index, page_start, page_end FROM alias WHERE source = ?",
+                                      (source,)).fetchall()
+        return {from_sql_id(pid): tuple(place) for pid, *place in rows}
+
+    def move(self, places: Iterable[Tuple[int, int, Optional[int], Optional[int]]]) -> None:
+        """Doublons inchangés mais déplacés dans leur fichier : (id, chunk_index, page_start, page_end)."""
+        rows = [(index, start, end, to_sql_id(pid)) for pid, index, start, end in places]
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE alias SET chunk_index = ?, page_start = ?, page_end = ? WHERE id = ?", rows)
+
+    def promote(self, old: int, alias: dict) -> None:
+        """`alias` remplace le canonique `old` (supprimé) ; les autres alias de `old` le suivent."""
+        new = to_sql_id(alias["id"])
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM alias WHERE id = ?", (new,))
+            self._conn.execute("DELETE FROM canon WHERE id = ?", (to_sql_id(old),))
+            self._conn.execute("INSERT OR REPLACE INTO canon VALUES (?, ?)", (new, alias.get("norm")))
+            self._conn.execute("UPDATE alias SET canon = ? WHERE canon = ?", (new, to_sql_id(old)))
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Oublie ces chunks, canoniques ou alias (les alias d'un canonique supprimé restent : à promouvoir)."""
+        sql_ids = [(to_sql_id(int(i)),) for i in ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM canon WHERE id = ?", sql_ids)
+            self._conn.executemany("DELETE FROM alias WHERE id = ?", sql_ids)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            canon = self._conn.execute("SELECT COUNT(*) FROM canon").fetchone()[0]
+            aliases = self._conn.execute("SELECT COUNT(*) FROM alias").fetchone()[0]
+        total = canon + aliases
+        return {"canonical": canon, "duplicates": aliases, "dedup_ratio": aliases / total if total else 0.0}
@@ -0,0 +1,163 @@
+# src/embed_cache.py
+"""
+Cache disque des embeddings, adressé par contenu.
+
+Clé = (provider, modèle, sha256 du texte du chunk). Les vecteurs sont stockés
+en float32 brut dans une base SQLite (mode WAL), avec éviction LRU dès que le
+volume stocké dépasse `max_bytes`.
+"""
+from __future__ import annotations
+import hashlib, os, sqlite3, threading, time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    provider  TEXT NOT NULL,
+    model     TEXT NOT NULL,
+    text_hash BLOB NOT NULL,
+    vec       BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (provider, model, text_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used);
+"""
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """Cache persistant (thread-safe) des vecteurs déjà calculés."""
+
+    def __init__(self, path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings"
+        ).fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # octets de texte qu'on n'a pas eu à ré-embedder
+
+    def get_many(self, provider: str, model: str, hashes: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        if not hashes:
+            return found
+        with self._lock:
+            uniq = list(dict.fromkeys(hashes))
+            # SQLite limite le nombre de paramètres par requête
+            for i in range(0, len(uniq), 500):
+                part = uniq[i:i+500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vec FROM embeddings "
+                    f"WHERE provider=? AND model=? AND text_hash IN ({marks})",
+                    (provider, model, *part),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used=? WHERE provider=? AND model=? AND text_hash=?",
+                    [(now, provider, model, h) for h in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, provider: str, model: str, items: Dict[bytes, np.ndarray]) -> None:
+        if not items or self.max_bytes <= 0:
+            return
+        now = time.time()
+        rows = [
+            (provider, model, h, np.asarray(v, dtype=np.float32).tobytes(), now)
+            for h, v in items.items()
+        ]
+        with self._lock:
+            # une clé déjà présente est remplacée : seul l'écart de taille compte
+            replaced = self._stored_bytes(provider, model, list(items))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(provider, model, text_hash, vec, last_used) "
+                "VALUES (?,?,?,?,?)",
+                rows,
+            )
+            self._size += sum(len(r[3]) for r in rows) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _stored_bytes(self, provider: str, model: str, hashes: Sequence[bytes]) -> int:
+        total = 0
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i+500]
+            marks = ",".join("?" * len(part))
+            total += self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings "
+                f"WHERE provider=? AND model=? AND text_hash IN ({marks})",
+                (provider, model, *part),
+            ).fetchone()[0]
+        return total
+
+    def _evict(self) -> None:
+        # LRU: on redescend à 90 % du plafond pour ne pas évincer à chaque écriture
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings"
+        ).fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT provider, model, text_hash, LENGTH(vec) FROM embeddings "
+                "ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE provider=? AND model=? AND text_hash=?",
+                [r[:3] for r in rows],
+            )
+            self._size -= sum(r[3] for r in rows)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": entries,
+            "stored_bytes": self._size,
+        }
+
+def cached_embedder(fn: Callable, provider: str, model: str, cache: EmbeddingCache) -> Callable:
+    """Enveloppe `fn` (List[str] -> matrice float32) : seuls les textes absents du cache sont embeddés."""
+
+    def _embed(texts: List[str]):
+        hashes = [text_hash(t) for t in texts]
+        found = cache.get_many(provider, model, hashes)
+        missing: Dict[bytes, str] = {}
+        for h, t in zip(hashes, texts):
+            if h in found:
+                cache.hits += 1
+                cache.bytes_saved += len(t.encode("utf-8"))
+            else:
+                cache.misses += 1
+                missing.setdefault(h, t)
+        if missing:
+            vecs = fn(list(missing.values()))
+            fresh = {h: np.asarray(v, dtype=np.float32) for h, v in zip(missing, vecs)}
+            cache.put_many(provider, model, fresh)
+            found.update(fresh)
+        if not hashes:
+            return fn([])
+        return np.stack([found[h] for h in hashes])
+
+    return _embed
@@ -1,20 +1,159 @@
 # src/embeddings.py
 import os
+import threading
 import numpy as np
 
+from src.embed_cache import EmbeddingCache, cached_embedder
+from src.context import token_counter
+from src.projection import normalize
+
 # --- Fallback offline/CI: vecteur constant déterministe ---
 def _dummy_embed(texts, dim=384):
-    return [np.ones(dim, dtype=np.float32).tolist() for _ in texts]
+    return np.ones((len(texts), dim), dtype=np.float32)
+
+def _as_matrix(vectors) -> np.ndarray:
+    """Matrice float32 contiguë (n, dim), format attendu par Qdrant."""
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+# --- Cache disque partagé par tous les embedders du process ---
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_embed_cache():
+    """Instance unique du cache (None si désactivé via EMBED_CACHE_MAX_MB=0)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from src.config import settings
+            if settings.embed_cache_max_mb <= 0:
+                return None
+            _cache = EmbeddingCache(settings.embed_cache_path,
+                                    settings.embed_cache_max_mb * 1024 * 1024)
+        return _cache
+
+def cache_stats() -> dict:
+    cache = get_embed_cache()
+    return cache.stats() if cache else {}
+
+def _with_cache(fn, provider: str, model: str):
+    try:
+        cache = get_embed_cache()
+    except Exception:
+        cache = None
+    return cached_embedder(fn, provider, model, cache) if cache else fn
 
-def get_embedder():
+# --- Dimension réduite (EMBED_DIM) ---
+def _reduced(embed, model: str, settings):
     """
-    Choisit la source d'embeddings.
-    Priorité:
-      1) RAG_EMBEDDINGS (ou EMBEDDINGS_PROVIDER) dans l'environnement
-      2) settings.embeddings_provider si dispo
-      3) 'dummy' en CI, sinon 'local'
-    Renvoie toujours une fonction: List[str] -> List[List[float]]
+    Projection ACP enregistrée (EMBED_PCA_PATH) appliquée après le cache
+    (qui garde la pleine largeur). Tant qu'aucune projection n'a été
+    ajustée pour ce modèle (python -m src.vectorstore reembed), les vecteurs
+    restent pleine largeur.
     """
+    from src.projection import PCAProjection
+    proj = PCAProjection.load(settings.embed_pca_path, model)
+    return proj.wrap(embed) if proj is not None and proj.dim == settings.embed_dim else embed
+
+# --- OpenAI : batches bornés en tokens, session keep-alive, retries ---
+_OPENAI_EMBED_URL = "https://api.openai.com/v1/embeddings"
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def _token_batches(texts, count, max_tokens: int, max_items: int):
+    """Découpe en listes d'indices dont la somme de tokens reste sous `max_tokens`."""
+    batch, used = [], 0
+    for i, t in enumerate(texts):
+        n = count(t)
+        if batch and (used + n > max_tokens or len(batch) >= max_items):
+            yield batch
+            batch, used = [], 0
+        batch.append(i)
+        used += n
+    if batch:
+        yield batch
+
+def _http_session(pool_size: int):
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1)))
+    return session
+
+def _post_with_retry(session, url, headers, payload, retries: int, timeout: float, max_backoff: float = 30.0):
+    """
+    POST JSON avec backoff exponentiel (+ jitter) sur 429/5xx et erreurs réseau.
+    Un Retry-After supérieur à `max_backoff` secondes fait échouer l'appel
+    sans attendre (un worker d'ingestion ne reste pas bloqué une heure).
+    """
+    import random, time
+    import requests
+    for attempt in range(retries + 1):
+        try:
+            r = session.post(url, headers=headers, json=payload, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(min(2 ** attempt, max_backoff) * (0.5 + random.random()))
+            continue
+        if r.status_code in _RETRY_STATUS and attempt < retries:
+            retry_after = r.headers.get("Retry-After")
+            try:
+                delay = max(float(retry_after), 0.0)
+            except (TypeError, ValueError):
+                delay = min(2 ** attempt, max_backoff) * (0.5 + random.random())
+            else:
+                if delay > max_backoff:  # attente demandée trop longue : on échoue tout de suite
+                    r.raise_for_status()
+            time.sleep(delay)
+            continue
+        r.raise_for_status()
+        return r.json()
+
+# --- Local : SentenceTransformers à haut débit (CPU) ---
+def _length_sorted(texts):
+    """Ordre des textes du plus long au plus court (batches homogènes = moins de padding)."""
+    return np.argsort([-len(t) for t in texts], kind="stable")
+
+def _local_embedder(model, settings):
+    """
+    Encode par batches de `local_embed_batch_size`, triés par longueur,
+    en float32 normalisé. Au-delà de quelques batches, si
+    `local_embed_processes` != 0, l'encodage est réparti sur un pool de
+    processus CPU (démarré à la première utilisation).
+    """
+    batch_size = settings.local_embed_batch_size
+    n_proc = settings.local_embed_processes
+    if n_proc < 0:
+        n_proc = os.cpu_count() or 1
+    state = {"pool": None}
+
+    def _pool():
+        if state["pool"] is None:
+            import atexit
+            state["pool"] = model.start_multi_process_pool(target_devices=["cpu"] * n_proc)
+            atexit.register(model.stop_multi_process_pool, state["pool"])
+        return state["pool"]
+
+    def _local_embed(texts):
+        if not texts:
+            return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        order = _length_sorted(texts)
+        sorted_texts = [texts[i] for i in order]
+        if n_proc > 1 and len(texts) >= 4 * batch_size:
+            arr = model.encode_multi_process(
+                sorted_texts, _pool(), batch_size=batch_size,
+                chunk_size=max(batch_size, len(texts) // (n_proc * 4)),
+                normalize_embeddings=True,
+            )
+        else:
+            arr = model.encode(sorted_texts, batch_size=batch_size, convert_to_numpy=True,
+                               normalize_embeddings=True, show_progress_bar=False)
+        out = np.empty_like(arr, dtype=np.float32)
+        out[order] = arr
+        return out
+
+    return _local_embed
+
+def _provider() -> str:
     # 1) Variables d'env (CI, prod, etc.)
     provider = (os.getenv("RAG_EMBEDDINGS")
                 or os.getenv("EMBEDDINGS_PROVIDER"))
@@ -31,50 +170,101 @@ def get_embedder():
     if not provider:
         provider = "dummy" if os.getenv("CI") else "local"
 
-    provider = provider.lower().strip()
+    return provider.lower().strip()
+
+def pca_model():
+    """Modèle dont la réduction EMBED_DIM passe par une projection ACP à ajuster (None sinon)."""
+    from src.config import settings
+    if not settings.embed_dim:
+        return None
+    provider = _provider()
+    if provider == "local":
+        return os.getenv("ST_MODEL", "all-MiniLM-L6-v2")
+    if provider == "openai":
+        model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+        return None if model.startswith("text-embedding-3") else model
+    return None
+
+def get_embedder(reduce: bool = True):
+    """
+    Choisit la source d'embeddings.
+    Priorité:
+      1) RAG_EMBEDDINGS (ou EMBEDDINGS_PROVIDER) dans l'environnement
+      2) settings.embeddings_provider si dispo
+      3) 'dummy' en CI, sinon 'local'
+    Renvoie une fonction: List[str] -> np.ndarray float32 (n, dim)
+    (hors dummy, derrière le cache disque des embeddings). Lève une erreur
+    explicite si le fournisseur demandé est inutilisable : le dummy n'est
+    utilisé que s'il est demandé (RAG_EMBEDDINGS=dummy, CI).
+    Avec EMBED_DIM, vecteurs réduits et renormalisés : paramètre `dimensions`
+    des modèles OpenAI text-embedding-3, projection ACP sinon
+    (`reduce=False` : pleine largeur, pour ajuster cette projection).
+    """
+    provider = _provider()
 
     # --- Dummy forcé (CI / offline) ---
     if provider == "dummy":
+        from src.config import settings
+        if reduce and settings.embed_dim:
+            return lambda texts: _dummy_embed(texts, settings.embed_dim)
         return _dummy_embed
 
+    from src.resources import timed
+
     # --- Local: SentenceTransformers ---
     if provider == "local":
         try:
-            from sentence_transformers import SentenceTransformer
-            model_name = os.getenv("ST_MODEL", "all-MiniLM-L6-v2")
+            with timed("import sentence_transformers"):
+                from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("EMBEDDINGS_PROVIDER=local mais sentence-transformers n'est pas installé "
+                               "(pip install sentence-transformers)") from e
+        from src.config import settings
+        model_name = os.getenv("ST_MODEL", "all-MiniLM-L6-v2")
+        with timed(f"chargement modèle {model_name}"):
             _model = SentenceTransformer(model_name)
-
-            def _local_embed(texts):
-                # IMPORTANT: numpy=True -> toujours .tolist() derrière
-                arr = _model.encode(texts, convert_to_numpy=True)
-                return arr.tolist()
-
-            return _local_embed
-        except Exception:
-            # Pas dispo ? On retombe en dummy
-            return _dummy_embed
+        embed = _with_cache(_local_embedder(_model, settings), provider, model_name)
+        return _reduced(embed, model_name, settings) if reduce and settings.embed_dim else embed
 
     # --- OpenAI embeddings ---
     if provider == "openai":
-        try:
-            import requests
-            api_key = os.getenv("OPENAI_API_KEY", "")
-            model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
-
-            def _openai_embed(texts):
-                r = requests.post(
-                    "https://api.openai.com/v1/embeddings",
-                    headers={"Authorization": f"Bearer {api_key}"},
-                    json={"input": texts, "model": model},
-                    timeout=60,
-                )
-                r.raise_for_status()
-                data = r.json().get("data", [])
-                return [d["embedding"] for d in data]
-
-            return _openai_embed
-        except Exception:
-            return _dummy_embed
+        from concurrent.futures import ThreadPoolExecutor
+        from src.config import settings
+        api_key = os.getenv("OPENAI_API_KEY", "")
+        if not api_key:
+            raise RuntimeError("EMBEDDINGS_PROVIDER=openai mais OPENAI_API_KEY n'est pas défini")
+        model = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
+        session = _http_session(settings.embed_concurrency)
+        pool = ThreadPoolExecutor(max_workers=settings.embed_concurrency,
+                                  thread_name_prefix="openai-embed")
+        count = token_counter(model)
+        headers = {"Authorization": f"Bearer {api_key}"}
+        # seuls les modèles text-embedding-3 acceptent `dimensions` (réduction côté API)
+        dims = settings.embed_dim if reduce and model.startswith("text-embedding-3") else 0
+        body = {"model": model, **({"dimensions": dims} if dims else {})}
+
+        def _embed_batch(batch):
+            data = _post_with_retry(
+                session, _OPENAI_EMBED_URL, headers, {"input": batch, **body},
+                retries=settings.embed_max_retries, timeout=settings.embed_timeout,
+                max_backoff=settings.embed_max_backoff_s,
+            ).get("data", [])
+            # l'API renvoie un champ "index" : on ne suppose pas l'ordre
+            return [d["embedding"] for d in sorted(data, key=lambda d: d.get("index", 0))]
+
+        def _openai_embed(texts):
+            batches = list(_token_batches(texts, count, settings.embed_batch_tokens,
+                                          settings.embed_batch_size))
+            out = [None] * len(texts)
+            # map() conserve l'ordre des batches, quelle que soit la concurrence
+            for idx, vecs in zip(batches, pool.map(lambda b: _embed_batch([texts[i] for i in b]), batches)):
+                for i, v in zip(idx, vecs):
+                    out[i] = v
+            return normalize(out) if dims else _as_matrix(out)
+
+        if dims:  # vecteurs réduits : entrée de cache distincte de la pleine largeur
+            return _with_cache(_openai_embed, provider, f"{model}@{dims}")
+        embed = _with_cache(_openai_embed, provider, model)
+        return _reduced(embed, model, settings) if reduce and settings.embed_dim else embed
 
-    # Provider inconnu -> dummy
-    return _dummy_embed
\ No newline at end of file
+    raise ValueError(f"Fournisseur d'embeddings inconnu : {provider!r} (dummy | local | openai)")
@@ -0,0 +1,212 @@
+# src/evaluate.py
+"""
+Évaluation hors ligne de la recherche sur un jeu de questions annotées :
+
+    python -m src.evaluate data/eval.jsonl -k 4,6,8
+    python -m src.evaluate data/eval.jsonl --corpus data/uploads \\
+        --chunk-size 500,800 --chunk-overlap 50,100 -k 4,6 --json eval.json
+
+Fichier de questions : JSONL {"question": ..., "sources": ["bail.txt", ...]}
+(ou "source"), ou CSV avec les colonnes question;source (sources séparées
+par « | »). Une source attendue est comparée au nom de fichier ou au chemin
+des passages retrouvés.
+
+Sans --corpus, l'index courant est évalué. Avec --corpus, chaque couple
+(chunk_size, chunk_overlap) est indexé dans un index isolé (--workdir),
+jamais dans l'index de l'application ; les embeddings des chunks inchangés
+viennent du cache disque. Pour chaque k (= MAX_CTX_DOCS) : recall@k, MRR,
+et le débit de chaque étape (ingestion, embedding des questions, recherche).
+"""
+from __future__ import annotations
+import argparse, csv, json, os, shutil, sys, time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set
+
+from src.config import settings
+
+@dataclass
+class EvalCase:
+    question: str
+    sources: Set[str]
+
+def load_cases(path: str) -> List[EvalCase]:
+    cases = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            sample = f.read(4096)
+            f.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+            for row in csv.DictReader(f, dialect=dialect):
+                srcs = {s.strip() for s in (row.get("source") or row.get("sources") or "").split("|") if s.strip()}
+                cases.append(EvalCase(row["question"].strip(), srcs))
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                obj = json.loads(line)
+                srcs = obj.get("sources") or [obj.get("source")]
+                cases.append(EvalCase(obj["question"], {s for s in srcs if s}))
+    return [c for c in cases if c.question and c.sources]
+
+def _matches(hit: Dict, sources: Set[str]) -> Set[str]:
+    """Sources attendues citées par le passage (un passage dédupliqué en cite plusieurs : meta["sources"])."""
+    meta = hit.get("meta") or {}
+    found = set()
+    for cited in [meta] + list(meta.get("sources") or []):
+        src = cited.get("source") or ""
+        found.update(c for c in (cited.get("filename"), src, os.path.basename(src)) if c in sources)
+    return found
+
+def score(cases: Sequence[EvalCase], hits: Sequence[List[Dict]], k: int) -> Dict[str, float]:
+    """recall@k (part des sources attendues retrouvées) et MRR (rang du premier passage pertinent)."""
+    recall = rr = 0.0
+    for case, found in zip(cases, hits):
+        seen, first = set(), None
+        for rank, hit in enumerate(found[:k], 1):
+            match = _matches(hit, case.sources)
+            if match:
+                seen |= match
+                first = first or rank
+        recall += len(seen) / len(case.sources)
+        rr += 1.0 / first if first else 0.0
+    n = max(len(cases), 1)
+    return {"recall": recall / n, "mrr": rr / n}
+
+def _rate(n: int, seconds: float) -> float:
+    return n / seconds if seconds > 0 else 0.0
+
+def run_queries(cases: Sequence[EvalCase], ks: Sequence[int]) -> Dict:
+    """Interroge l'index courant (un lot) et calcule les métriques pour chaque k."""
+    from src import vectorstore
+    questions = [c.question for c in cases]
+    vectorstore.clear_query_caches()
+    embed_s = 0.0
+    if not settings.retrieval_url:  # en mode client, l'embedding est compté dans la recherche
+        t0 = time.perf_counter()
+        vectorstore.embed_queries(questions)
+        embed_s = time.perf_counter() - t0
+    # embeddings en cache : le temps mesuré est celui de la recherche (BM25 + vecteurs + payloads)
+    t0 = time.perf_counter()
+    hits = vectorstore.query_many(questions, max(ks))
+    search_s = time.perf_counter() - t0
+    return {
+        "metrics": {k: score(cases, hits, k) for k in ks},
+        "throughput": {"embed_q_per_s": _rate(len(questions), embed_s),
+                       "search_q_per_s": _rate(len(questions), search_s)},
+    }
+
+@contextmanager
+def isolated_index(workdir: str, **overrides):
+    """Réglages temporaires + index propre à `workdir` (l'index de l'application n'est pas touché)."""
+    from src import vectorstore
+    fields = dict(overrides, chroma_dir=os.path.join(workdir, "qdrant"),
+                  npstore_dir=os.path.join(workdir, "npstore"),
+                  lexical_index_path=os.path.join(workdir, "bm25.sqlite"),
+                  dedup_index_path=os.path.join(workdir, "dedup.sqlite"),
+                  embed_pca_path=os.path.join(workdir, "embed_pca.npz"),
+                  answer_cache_path=os.path.join(workdir, "answer_cache.sqlite"),
+                  qdrant_url=None, retrieval_url=None)  # jamais le serveur Qdrant ni le service de prod
+    saved = {name: getattr(settings, name) for name in fields}
+    vectorstore.close()
+    shutil.rmtree(workdir, ignore_errors=True)  # index reconstruit de zéro à chaque évaluation
+    for name, value in fields.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        vectorstore.close()
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+def build_index(files: Sequence[str], workers: int) -> Dict[str, float]:
+    from src.ingest import FAILED, IngestQueue
+    queue = IngestQueue(workers)
+    t0 = time.perf_counter()
+    for path in files:
+        queue.submit(path)
+    queue.wait()
+    elapsed = time.perf_counter() - t0
+    jobs = queue.jobs()
+    failed = [j.path for j in jobs if j.status == FAILED]
+    if failed:
+        raise RuntimeError(f"échec d'indexation : {', '.join(failed)}")
+    chunks = sum(j.chunks for j in jobs)
+    return {"chunks": chunks, "ingest_s": elapsed, "ingest_chunks_per_s": _rate(chunks, elapsed)}
+
+def evaluate(cases: Sequence[EvalCase], ks: Sequence[int], corpus: Optional[str] = None,
+             chunk_sizes: Sequence[int] = (), chunk_overlaps: Sequence[int] = (),
+             workdir: str = "./data/eval", workers: int = 1) -> List[Dict]:
+    """Une entrée par configuration (chunk_size, chunk_overlap, k)."""
+    ks = sorted(set(ks))
+    if corpus is None:
+        out = run_queries(cases, ks)
+        configs = [({"chunk_size": settings.chunk_size, "chunk_overlap": settings.chunk_overlap}, {}, out)]
+    else:
+        from src.ingest import iter_files
+        files = list(iter_files(corpus)) if os.path.isdir(corpus) else [corpus]
+        configs = []
+        for size in chunk_sizes or [settings.chunk_size]:
+            for overlap in chunk_overlaps or [settings.chunk_overlap]:
+                if overlap >= size:
+                    continue
+                with isolated_index(os.path.join(workdir, f"cs{size}_ov{overlap}"),
+                                     chunk_size=size, chunk_overlap=overlap):
+                    ingest = build_index(files, workers)
+                    configs.append(({"chunk_size": size, "chunk_overlap": overlap}, ingest,
+                                     run_queries(cases, ks)))
+    rows = []
+    for params, ingest, out in configs:
+        for k in ks:
+            rows.append({**params, "k": k, "recall_at_k": out["metrics"][k]["recall"],
+                         "mrr": out["metrics"][k]["mrr"], **ingest, **out["throughput"]})
+    return rows
+
+def _provider() -> str:
+    # même ordre de priorité que embeddings.get_embedder
+    return os.getenv("RAG_EMBEDDINGS") or os.getenv("EMBEDDINGS_PROVIDER") or settings.embeddings_provider
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.evaluate",
+                                     description="Recall@k / MRR de la recherche sur des questions annotées.")
+    parser.add_argument("questions", help="fichier JSONL ou CSV (question, sources attendues)")
+    parser.add_argument("-k", "--max-ctx-docs", type=_ints, default=[settings.max_ctx_docs],
+                        help="valeurs de k séparées par des virgules")
+    parser.add_argument("--corpus", help="dossier (ou fichier) à indexer pour chaque configuration")
+    parser.add_argument("--chunk-size", type=_ints, default=[])
+    parser.add_argument("--chunk-overlap", type=_ints, default=[])
+    parser.add_argument("--workdir", default="./data/eval", help="index temporaires (avec --corpus)")
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers)
+    parser.add_argument("--json", dest="json_path", help="écrire le rapport complet en JSON")
+    args = parser.parse_args(argv)
+
+    cases = load_cases(args.questions)
+    if not cases:
+        print(f"Aucune question annotée dans {args.questions}")
+        return 1
+    if (args.chunk_size or args.chunk_overlap) and not args.corpus:
+        parser.error("--chunk-size / --chunk-overlap demandent --corpus (ré-indexation)")
+    rows = evaluate(cases, args.max_ctx_docs, args.corpus, args.chunk_size, args.chunk_overlap,
+                    args.workdir, args.workers)
+
+    print(f"{len(cases)} questions · embeddings {_provider()} · "
+          f"backend {settings.vector_backend}")
+    print(f"{'chunk':>6} {'overlap':>7} {'k':>3} {'recall@k':>9} {'MRR':>6} "
+          f"{'ingest ch/s':>11} {'embed q/s':>10} {'search q/s':>10}")
+    for r in rows:
+        print(f"{r['chunk_size']:>6} {r['chunk_overlap']:>7} {r['k']:>3} {r['recall_at_k']:>9.3f} "
+              f"{r['mrr']:>6.3f} {r.get('ingest_chunks_per_s', 0):>11.1f} "
+              f"{r['embed_q_per_s']:>10.1f} {r['search_q_per_s']:>10.1f}")
+    if args.json_path:
+        report = {"questions": args.questions, "n_questions": len(cases), "corpus": args.corpus,
+                  "embeddings_provider": _provider(),
+                  "vector_backend": settings.vector_backend, "runs": rows}
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
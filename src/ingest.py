@@ -0,0 +1,173 @@
+# src/ingest.py
+"""
+File d'ingestion en arrière-plan (pool de workers hors du cycle Streamlit)
+et mode bulk en ligne de commande :
+
+    python -m src.ingest data/uploads --workers 8
+
+Les deux passent par le même pipeline : add_path (lecture et découpage en flux).
+"""
+from __future__ import annotations
+import argparse, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Set
+
+from src.config import settings
+from src.preprocessing import SUPPORTED_EXTENSIONS
+
+PENDING, RUNNING, DONE, FAILED = "en attente", "en cours", "terminé", "erreur"
+
+@dataclass
+class IngestJob:
+    path: str
+    status: str = PENDING
+    done: int = 0           # chunks traités
+    total: int = 0          # chunks attendus (estimation tant que le fichier n'est pas lu en entier)
+    chunks: int = 0
+    chars: int = 0
+    error: Optional[str] = None
+    submitted_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status in (DONE, FAILED):
+            return 1.0
+        return (self.done / self.total) if self.total else 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.status in (PENDING, RUNNING)
+
+class IngestQueue:
+    """Pool de workers qui indexe des fichiers ; l'état de chaque fichier est consultable à tout moment."""
+
+    def __init__(self, workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._futures = []
+        self._dirty: Set[str] = set()  # fichiers re-soumis pendant leur indexation
+
+    def submit(self, path: str) -> IngestJob:
+        """
+        Met un fichier en file. Déjà en attente : no-op (le worker lira la
+        dernière version). En cours : le fichier a pu changer depuis sa
+        lecture, il est remis en file dès la fin de l'indexation en cours.
+        """
+        with self._lock:
+            job = self._jobs.get(path)
+            if job and job.active:
+                if job.status == RUNNING:
+                    self._dirty.add(path)
+                return replace(job)
+            job = IngestJob(path=path, submitted_at=time.time())
+            self._jobs[path] = job
+            self._futures.append(self._pool.submit(self._run, job))
+            return replace(job)
+
+    def _update(self, job: IngestJob, **fields) -> None:
+        with self._lock:
+            for k, v in fields.items():
+                setattr(job, k, v)
+
+    def _run(self, job: IngestJob) -> None:
+        from src.vectorstore import add_path
+        self._update(job, status=RUNNING)
+        try:
+            n_chunks, n_chars = add_path(
+                job.path, on_progress=lambda done, total: self._update(job, done=done, total=total)
+            )
+            self._update(job, status=DONE, chunks=n_chunks, chars=n_chars, finished_at=time.time())
+        except Exception as e:
+            self._update(job, status=FAILED, error=str(e), finished_at=time.time())
+        with self._lock:
+            again = job.path in self._dirty
+            self._dirty.discard(job.path)
+        if again:
+            self.submit(job.path)
+
+    def jobs(self) -> List[IngestJob]:
+        """Instantané de l'état (copies), du plus récent au plus ancien."""
+        with self._lock:
+            return sorted((replace(j) for j in self._jobs.values()),
+                          key=lambda j: j.submitted_at, reverse=True)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.active)
+
+    def clear_finished(self) -> None:
+        with self._lock:
+            self._jobs = {p: j for p, j in self._jobs.items() if j.active}
+            self._futures = [f for f in self._futures if not f.done()]
+
+    def wait(self) -> None:
+        """Attend la fin de tous les jobs, y compris ceux remis en file entre-temps."""
+        while True:
+            with self._lock:
+                futures = [f for f in self._futures if not f.done()]
+            if not futures:
+                return
+            for f in futures:
+                f.result()
+
+_queue: Optional[IngestQueue] = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> IngestQueue:
+    """File unique par process (partagée par toutes les sessions Streamlit)."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IngestQueue(settings.ingest_workers)
+        return _queue
+
+def iter_files(root: str):
+    for dirpath, _, names in os.walk(root):
+        for name in sorted(names):
+            if not name.startswith(".") and name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.ingest",
+                                     description="Indexation en masse d'un dossier de documents.")
+    parser.add_argument("root", help="dossier à parcourir récursivement")
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers)
+    args = parser.parse_args(argv)
+
+    files = list(iter_files(args.root))
+    if not files:
+        print(f"Aucun fichier supporté dans {args.root}")
+        return 0
+
+    queue = IngestQueue(args.workers)
+    t0 = time.perf_counter()
+    for path in files:
+        queue.submit(path)
+    while queue.pending():
+        done = len(files) - queue.pending()
+        print(f"\r{done}/{len(files)} fichiers", end="", file=sys.stderr, flush=True)
+        time.sleep(0.5)
+    queue.wait()
+    elapsed = time.perf_counter() - t0
+
+    jobs = queue.jobs()
+    failed = [j for j in jobs if j.status == FAILED]
+    n_chunks = sum(j.chunks for j in jobs)
+    print(f"\r{len(files) - len(failed)}/{len(files)} fichiers indexés, {n_chunks} chunks "
+          f"en {elapsed:.1f}s ({n_chunks / elapsed if elapsed else 0:.1f} chunks/s)")
+    from src.vectorstore import last_ingest
+    stats = [last_ingest(j.path) for j in jobs if j.status == DONE]
+    if stats:
+        dups = sum(s.get("duplicates", 0) for s in stats)
+        print(f"{dups} doublons non indexés ({dups / n_chunks if n_chunks else 0:.1%}) · "
+              f"index : {stats[-1].get('index_points', 0)} points, "
+              f"{stats[-1].get('index_dedup_ratio', 0):.1%} de doublons au total")
+    for j in failed:
+        print(f"ECHEC {j.path}: {j.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
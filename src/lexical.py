@@ -0,0 +1,170 @@
+# src/lexical.py
+"""
+Index inversé BM25 persistant (SQLite), pour la recherche plein texte.
+
+Complète la recherche dense : les références exactes ("article L1237-19",
+numéros de pourvoi, dates) sont mal servies par les embeddings. Les termes
+sont normalisés (minuscules, sans accents) et les références composées
+("l1237-19", "2020.12") restent un seul terme.
+"""
+from __future__ import annotations
+import math, os, re, sqlite3, threading, unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+_TOKEN_RX = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+# Termes qui désignent un texte précis : "l1237-19", "r4624-1", "2020.12", "12" après "article"
+_REFERENCE_RX = re.compile(r"[a-z]+\d|\d+[-./]\d")
+_REFERENCE_CUES = frozenset("article art alinea al clause pourvoi n no".split())
+_STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette d dans de des du elle en est et il ils l la le les leur lui
+mais ne ni nous on ou par pas pour qu que qui s sa se ses son sont sur ta te tes ton un une
+vous y quel quelle quels quelles est-ce
+""".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id     INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_source ON docs(source);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc  INTEGER NOT NULL,
+    tf   INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc);
+"""
+
+def tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RX.findall(text) if t not in _STOPWORDS]
+
+# Les ids Qdrant sont des entiers non signés 64 bits, SQLite stocke du signé.
+def to_sql_id(pid: int) -> int:
+    return pid - (1 << 64) if pid >= (1 << 63) else pid
+
+def from_sql_id(v: int) -> int:
+    return v + (1 << 64) if v < 0 else v
+
+class BM25Index:
+    """Index BM25 (k1, b classiques) tenu à jour chunk par chunk."""
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.k1, self.b = k1, b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._refresh_stats()
+
+    def _refresh_stats(self) -> None:
+        n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self._n_docs, self._total_len = n, total
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add(self, items: Iterable[Tuple[int, str, str]]) -> None:
+        """Indexe (ou remplace) des chunks : itérable de (id, source, texte)."""
+        docs, postings = [], []
+        for pid, source, text in items:
+            tf = Counter(tokenize(text))
+            sid = to_sql_id(pid)
+            docs.append((sid, source, sum(tf.values())))
+            postings.extend((term, sid, n) for term, n in tf.items())
+        if not docs:
+            return
+        with self._lock:
+            self._delete([d[0] for d in docs])
+            self._conn.executemany("INSERT INTO docs(id, source, length) VALUES (?,?,?)", docs)
+            self._conn.executemany("INSERT INTO postings(term, doc, tf) VALUES (?,?,?)", postings)
+            self._conn.commit()
+            self._refresh_stats()
+
+    def _delete(self, sql_ids: Sequence[int]) -> None:
+        for i in range(0, len(sql_ids), 500):
+            part = list(sql_ids[i:i+500])
+            marks = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM postings WHERE doc IN ({marks})", part)
+            self._conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", part)
+
+    def remove(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._delete([to_sql_id(i) for i in ids])
+            self._conn.commit()
+            self._refresh_stats()
+
+    def remove_source(self, source: str) -> None:
+        with self._lock:
+            ids = [r[0] for r in self._conn.execute("SELECT id FROM docs WHERE source=?", (source,))]
+            self._delete(ids)
+            self._conn.commit()
+            self._refresh_stats()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+            self._refresh_stats()
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (id, score BM25), scores décroissants."""
+        terms = set(tokenize(query))
+        if not terms or not self._n_docs:
+            return []
+        n, avg_len = self._n_docs, (self._total_len / self._n_docs) or 1.0
+        scores: Dict[int, float] = {}
+        with self._lock:
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc "
+                    "WHERE p.term=?", (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(from_sql_id(doc), score) for doc, score in best]
+
+def rrf(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Reciprocal Rank Fusion : score(d) = somme des 1 / (k + rang)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pid in enumerate(ranking, start=1):
+            fused[pid] = fused.get(pid, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+def has_reference(query: str) -> bool:
+    """La question cite-t-elle une référence (numéro d'article, de clause, de pourvoi...) ?"""
+    text = unicodedata.normalize("NFKD", query.lower())
+    terms = _TOKEN_RX.findall("".join(c for c in text if not unicodedata.combining(c)))
+    return any(_REFERENCE_RX.match(t) or (t[0].isdigit() and prev in _REFERENCE_CUES)
+               for prev, t in zip([""] + terms, terms))
+
+def is_decisive(query: str, results: Sequence[Tuple[int, float]], ratio: float, min_results: int = 2) -> bool:
+    """
+    BM25 suffit-il, sans recherche sémantique ? Seulement si la question cite
+    une référence, que BM25 remplit les `min_results` places demandées et que
+    son meilleur score écrase le suivant (au moins `ratio` fois). Un résultat
+    isolé ne prouve rien : "télétravail" ne trouve pas le chunk qui parle de
+    "travail à distance".
+    """
+    if ratio <= 0 or len(results) < max(min_results, 2) or not has_reference(query):
+        return False
+    return results[0][1] >= ratio * results[1][1]
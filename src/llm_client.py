@@ -0,0 +1,224 @@
+# src/llm_client.py
+"""
+Client HTTP partagé par tous les appels LLM du process (toutes sessions Streamlit).
+
+- connexions keep-alive réutilisées (requests.Session + pool),
+- sémaphore global : au plus `llm_max_concurrency` appels simultanés,
+- timeouts connexion / lecture distincts,
+- retries avec backoff exponentiel et jitter sur 429 / 5xx / erreurs réseau
+  (Retry-After respecté jusqu'à `max_backoff` secondes, sinon échec immédiat ;
+  le créneau de concurrence est rendu pendant l'attente),
+- disjoncteur : après N échecs consécutifs, on échoue immédiatement
+  (CircuitOpenError) pendant `reset_after` secondes, puis un appel d'essai.
+"""
+from __future__ import annotations
+import random, threading, time
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_RETRY_STATUS = {429, 500, 502, 503, 504, 529}
+
+def _backoff(attempt: int, retry_after: Optional[str], max_backoff: float = 8.0) -> Optional[float]:
+    """Attente avant le prochain essai ; None si le serveur demande plus que `max_backoff`."""
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        return min(0.5 * 2 ** attempt, max_backoff) * (0.5 + random.random())
+    return max(delay, 0.0) if delay <= max_backoff else None
+
+class _Slot:
+    """Créneau de concurrence d'un appel, rendu pendant les attentes entre deux essais."""
+
+    def __init__(self, sem: threading.BoundedSemaphore, timeout: float):
+        self._sem, self._timeout, self.held = sem, timeout, False
+        self.reached = False  # réponse 2xx du fournisseur obtenue
+
+    def acquire(self) -> None:
+        if not self._sem.acquire(timeout=self._timeout):
+            raise RuntimeError("trop d'appels LLM simultanés")
+        self.held = True
+
+    def release(self) -> None:
+        if self.held:
+            self.held = False
+            self._sem.release()
+
+    def pause(self, seconds: float) -> None:
+        self.release()
+        time.sleep(seconds)
+        self.acquire()
+
+class CircuitOpenError(RuntimeError):
+    """Le fournisseur LLM est considéré indisponible : appel non tenté."""
+
+class UpstreamError(RuntimeError):
+    """Échec retentable (429/5xx, timeout, connexion) après épuisement des retries."""
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "fermé", "ouvert", "semi-ouvert"
+
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold, self.reset_after = failure_threshold, reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self.state = self.CLOSED
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True   # un seul appel d'essai à la fois
+                return True
+            return False
+
+    def cancel_trial(self) -> None:
+        with self._lock:
+            self._trial = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+class LLMClient:
+    def __init__(self, max_concurrency: int, connect_timeout: float, read_timeout: float,
+                 max_retries: int, queue_timeout: float, breaker: CircuitBreaker,
+                 session: Optional[requests.Session] = None, max_backoff: float = 8.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker
+        self._slots = threading.BoundedSemaphore(max(max_concurrency, 1))
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(max_concurrency, 1))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self.calls = self.in_flight = self.retried = self.short_circuited = self.failures = 0
+
+    def _count(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def _send(self, slot: _Slot, url: str, headers: dict, payload: dict, stream: bool) -> requests.Response:
+        """Envoie avec retries ; renvoie une réponse 2xx ou lève une exception."""
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                r = self.session.post(url, headers=headers, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                err = UpstreamError(f"{type(e).__name__}: {e}")
+            else:
+                if r.status_code < 400:
+                    slot.reached = r.status_code < 300
+                    return r
+                if r.status_code not in _RETRY_STATUS:
+                    r.raise_for_status()   # 4xx "métier" : inutile de réessayer
+                err = UpstreamError(f"HTTP {r.status_code}")
+                retry_after = r.headers.get("Retry-After")
+                r.close()
+            delay = _backoff(attempt, retry_after, self.max_backoff)
+            if attempt == self.max_retries or delay is None:
+                raise err
+            self._count(retried=1)
+            slot.pause(delay)
+        raise AssertionError("unreachable")
+
+    @contextmanager
+    def _slot(self):
+        if not self.breaker.allow():
+            self._count(short_circuited=1)
+            raise CircuitOpenError("fournisseur LLM indisponible (disjoncteur ouvert)")
+        slot = _Slot(self._slots, self.queue_timeout)
+        try:
+            slot.acquire()
+        except RuntimeError:
+            self.breaker.cancel_trial()
+            raise
+        self._count(calls=1, in_flight=1)
+        upstream_failed = False
+        try:
+            yield slot
+        except UpstreamError:
+            upstream_failed = True
+            self._count(failures=1)
+            raise
+        except Exception:
+            self._count(failures=1)
+            raise
+        finally:
+            # seules les pannes amont (429/5xx/réseau) comptent pour le disjoncteur, et
+            # seule une réponse 2xx le referme ; erreurs locales, 4xx et attente d'un
+            # créneau le laissent en l'état (l'essai en semi-ouvert est rendu)
+            if upstream_failed:
+                self.breaker.record_failure()
+            elif slot.reached:
+                self.breaker.record_success()
+            else:
+                self.breaker.cancel_trial()
+            self._count(in_flight=-1)
+            slot.release()
+
+    def post_json(self, url: str, headers: dict, payload: dict) -> dict:
+        with self._slot() as slot:
+            r = self._send(slot, url, headers, payload, stream=False)
+            return r.json()
+
+    @contextmanager
+    def stream(self, url: str, headers: dict, payload: dict):
+        """Réponse en streaming ; le créneau de concurrence est tenu jusqu'à la fin de la lecture."""
+        with self._slot() as slot:
+            r = self._send(slot, url, headers, payload, stream=True)
+            try:
+                yield r
+            except requests.RequestException as e:
+                raise UpstreamError(f"flux interrompu: {e}") from e
+            finally:
+                r.close()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "in_flight": self.in_flight, "retried": self.retried,
+                "short_circuited": self.short_circuited, "failures": self.failures,
+                "circuit": self.breaker.state}
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            from src.config import settings
+            _client = LLMClient(
+                max_concurrency=settings.llm_max_concurrency,
+                connect_timeout=settings.llm_connect_timeout,
+                read_timeout=settings.llm_read_timeout,
+                max_retries=settings.llm_max_retries,
+                queue_timeout=settings.llm_queue_timeout,
+                breaker=CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset_s),
+                max_backoff=settings.llm_max_backoff_s,
+            )
+        return _client
+
+def llm_stats() -> dict:
+    return get_llm_client().stats()
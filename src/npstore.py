@@ -0,0 +1,304 @@
+# src/npstore.py
+"""
+Index vectoriel « force brute » sur matrices NumPy mappées en mémoire.
+
+Alternative à Qdrant embarqué pour les corpus de quelques millions de
+chunks au plus (VECTOR_BACKEND=numpy) :
+
+- vecteurs normalisés dans une matrice float16 (ou int8, échelle 127)
+  ouverte en mmap : l'ouverture est instantanée et les pages sont
+  partagées entre process via le cache du système ;
+- suppressions = bits de tombstone (bitmap), lignes réutilisées au
+  compactage ;
+- payloads dans une table SQLite à part (id -> ligne, source, JSON) ;
+- top-k par produits matriciels par blocs + argpartition, plusieurs
+  questions à la fois.
+
+Un seul process écrit (celui qui possède l'index, cf. src/server.py).
+"""
+from __future__ import annotations
+import json, os, sqlite3, threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.lexical import to_sql_id, from_sql_id
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS points (
+    id      INTEGER PRIMARY KEY,
+    row     INTEGER NOT NULL UNIQUE,
+    source  TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_source ON points(source);
+"""
+
+_BLOCK = 65536          # lignes par produit matriciel (borne la mémoire temporaire)
+_INT8_SCALE = 127.0
+_MIN_CAPACITY = 1024
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.where(norms > 0, norms, 1.0)
+
+def _pick(payload: dict, fields: Optional[Sequence[str]]) -> dict:
+    return payload if fields is None else {f: payload[f] for f in fields if f in payload}
+
+class NumpyStore:
+    def __init__(self, path: str, dtype: str = "float16"):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "payloads.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.dtype = np.dtype(np.int8 if dtype == "int8" else np.float16)
+        self.dim: Optional[int] = None
+        self._rows = 0          # lignes utilisées (vivantes + tombstones)
+        self._open()
+
+    # --- fichiers ---
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        if not os.path.exists(self._file("meta.json")):
+            return
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        # le type stocké fait foi (changer NPSTORE_DTYPE demande une ré-indexation)
+        self.dim, self._rows, self.dtype = meta["dim"], meta["rows"], np.dtype(meta["dtype"])
+        self._vecs = np.load(self._file("vectors.npy"), mmap_mode="r+")
+        self._ids = np.load(self._file("ids.npy"), mmap_mode="r+")
+        self._dead = np.load(self._file("tombstones.npy"), mmap_mode="r+")
+
+    def _write_meta(self) -> None:
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "rows": self._rows, "dtype": self.dtype.name}, f)
+        os.replace(tmp, self._file("meta.json"))
+
+    def _allocate(self, capacity: int) -> None:
+        """(Ré)alloue les fichiers à `capacity` lignes en conservant les lignes utilisées."""
+        old = (self._vecs, self._ids, self._dead) if self.dim and self._rows else None
+        specs = [("vectors.npy", self.dtype, (capacity, self.dim)), ("ids.npy", np.uint64, (capacity,)),
+                 ("tombstones.npy", np.uint8, ((capacity + 7) // 8,))]
+        for (name, dtype, shape), prev in zip(specs, old or (None,) * 3):
+            arr = np.lib.format.open_memmap(self._file(name + ".tmp"), mode="w+", dtype=dtype, shape=shape)
+            if prev is not None:
+                arr[: len(prev)] = prev
+            arr.flush()
+            del arr
+        self._vecs = self._ids = self._dead = None
+        for name, _, _ in specs:
+            os.replace(self._file(name + ".tmp"), self._file(name))
+        self._vecs = np.load(self._file("vectors.npy"), mmap_mode="r+")
+        self._ids = np.load(self._file("ids.npy"), mmap_mode="r+")
+        self._dead = np.load(self._file("tombstones.npy"), mmap_mode="r+")
+        self._write_meta()
+
+    def _reserve(self, n_new: int) -> None:
+        capacity = self._vecs.shape[0]
+        if self._rows + n_new > capacity:
+            self._allocate(max(capacity * 2, self._rows + n_new))
+
+    # --- tombstones ---
+    def _set_dead(self, rows: np.ndarray, dead: bool) -> None:
+        if not len(rows):
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        bits = (1 << (rows & 7)).astype(np.uint8)
+        if dead:
+            np.bitwise_or.at(self._dead, rows >> 3, bits)
+        else:
+            np.bitwise_and.at(self._dead, rows >> 3, ~bits)
+
+    def _live(self, start: int, stop: int) -> np.ndarray:
+        bits = np.unpackbits(self._dead[start // 8: (stop + 7) // 8], bitorder="little")
+        offset = start % 8
+        return bits[offset: offset + stop - start] == 0
+
+    # --- encodage ---
+    def _encode(self, mat: np.ndarray) -> np.ndarray:
+        mat = _normalize(mat)
+        if self.dtype == np.int8:
+            return np.clip(np.rint(mat * _INT8_SCALE), -127, 127).astype(np.int8)
+        return mat.astype(np.float16)
+
+    def _decode(self, block: np.ndarray) -> np.ndarray:
+        out = block.astype(np.float32)
+        return out / _INT8_SCALE if self.dtype == np.int8 else out
+
+    # --- API backend ---
+    def ensure(self, dim: int) -> None:
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(dim)
+                self._allocate(_MIN_CAPACITY)
+            elif self.dim != dim:
+                raise ValueError(f"dimension {dim} incompatible avec l'index ({self.dim})")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def _rows_of(self, ids: Sequence[int]) -> Dict[int, int]:
+        found = {}
+        sql_ids = [to_sql_id(int(i)) for i in ids]
+        for i in range(0, len(sql_ids), 500):
+            part = sql_ids[i:i+500]
+            marks = ",".join("?" * len(part))
+            for pid, row in self._conn.execute(f"SELECT id, row FROM points WHERE id IN ({marks})", part):
+                found[from_sql_id(pid)] = row
+        return found
+
+    def upsert(self, ids: Sequence[int], vectors: np.ndarray, payloads: Sequence[dict]) -> None:
+        """Insère ou remplace (même ligne) des points ; vecteurs renormalisés puis encodés."""
+        if not len(ids):
+            return
+        with self._lock:
+            self.ensure(np.asarray(vectors).shape[1])
+            existing = self._rows_of(ids)
+            n_new = sum(1 for pid in ids if int(pid) not in existing)
+            self._reserve(n_new)
+            rows, nxt = [], self._rows
+            for pid in ids:
+                if int(pid) in existing:
+                    rows.append(existing[int(pid)])
+                else:
+                    rows.append(nxt)
+                    nxt += 1
+            rows = np.asarray(rows, dtype=np.int64)
+            self._vecs[rows] = self._encode(vectors)
+            self._ids[rows] = np.asarray([int(p) for p in ids], dtype=np.uint64)
+            self._set_dead(rows, False)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points(id, row, source, payload) VALUES (?,?,?,?)",
+                [(to_sql_id(int(pid)), int(row), pl.get("source", ""), json.dumps(pl, ensure_ascii=False))
+                 for pid, row, pl in zip(ids, rows, payloads)],
+            )
+            self._conn.commit()
+            self._rows = nxt
+            self._vecs.flush()
+            self._ids.flush()
+            self._dead.flush()
+            self._write_meta()
+
+    def _delete_rows(self, pairs: List[Tuple[int, int]]) -> int:
+        if not pairs:
+            return 0
+        self._set_dead(np.asarray([row for _, row in pairs]), True)
+        self._dead.flush()
+        for i in range(0, len(pairs), 500):
+            part = [pid for pid, _ in pairs[i:i+500]]
+            self._conn.execute(f"DELETE FROM points WHERE id IN ({','.join('?' * len(part))})", part)
+        self._conn.commit()
+        if self._rows > _MIN_CAPACITY and self.count() < self._rows // 2:
+            self.compact()
+        return len(pairs)
+
+    def delete_ids(self, ids: Iterable[int]) -> int:
+        with self._lock:
+            if self.dim is None:
+                return 0
+            return self._delete_rows([(to_sql_id(pid), row) for pid, row in self._rows_of(list(ids)).items()])
+
+    def delete_source(self, source: str) -> int:
+        with self._lock:
+            if self.dim is None:
+                return 0
+            pairs = self._conn.execute("SELECT id, row FROM points WHERE source=?", (source,)).fetchall()
+            return self._delete_rows(pairs)
+
+    def compact(self) -> None:
+        """Réécrit les lignes vivantes en tête de matrice (les tombstones disparaissent)."""
+        with self._lock:
+            rows = [r[0] for r in self._conn.execute("SELECT row FROM points ORDER BY row")]
+            keep = np.asarray(rows, dtype=np.int64)
+            self._vecs[: len(keep)] = self._vecs[keep]
+            self._ids[: len(keep)] = self._ids[keep]
+            self._dead[:] = 0
+            self._conn.execute("UPDATE points SET row = -1 - row")  # évite les conflits UNIQUE
+            self._conn.executemany("UPDATE points SET row=? WHERE row=?",
+                                   [(new, -1 - old) for new, old in enumerate(rows)])
+            self._conn.commit()
+            self._rows = len(keep)
+            self._vecs.flush()
+            self._ids.flush()
+            self._dead.flush()
+            self._write_meta()
+
+    def source_payloads(self, source: str, fields: Optional[Sequence[str]] = None) -> Dict[int, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id, payload FROM points WHERE source=?", (source,)).fetchall()
+        return {from_sql_id(pid): _pick(json.loads(pl), fields) for pid, pl in rows}
+
+    def scan(self, fields: Optional[Sequence[str]] = None) -> Iterator[Tuple[int, dict]]:
+        last, op = -(1 << 63), ">="  # plus petit entier SQLite : inclus au premier paquet
+        while True:
+            with self._lock:
+                rows = self._conn.execute(f"SELECT id, payload FROM points WHERE id {op} ? ORDER BY id LIMIT 1024",
+                                          (last,)).fetchall()
+            if not rows:
+                return
+            for pid, pl in rows:
+                yield from_sql_id(pid), _pick(json.loads(pl), fields)
+            last, op = rows[-1][0], ">"
+
+    def payloads(self, ids: Sequence[int], fields: Optional[Sequence[str]] = None) -> Dict[int, dict]:
+        out = {}
+        sql_ids = [to_sql_id(int(i)) for i in ids]
+        with self._lock:
+            for i in range(0, len(sql_ids), 500):
+                part = sql_ids[i:i+500]
+                marks = ",".join("?" * len(part))
+                for pid, pl in self._conn.execute(f"SELECT id, payload FROM points WHERE id IN ({marks})", part):
+                    out[from_sql_id(pid)] = _pick(json.loads(pl), fields)
+        return out
+
+    def vectors(self, ids: Sequence[int]) -> Dict[int, np.ndarray]:
+        with self._lock:
+            if self.dim is None:
+                return {}
+            found = self._rows_of(ids)
+            return {pid: self._decode(self._vecs[row]) for pid, row in found.items()}
+
+    def search_batch(self, queries: np.ndarray, limit: int) -> List[List[Tuple[int, float]]]:
+        """Top-`limit` (id, cosinus) pour chaque question, scores décroissants."""
+        queries = _normalize(np.atleast_2d(queries))
+        m = queries.shape[0]
+        with self._lock:
+            n = self._rows
+            if self.dim is None or not n or limit <= 0:
+                return [[] for _ in range(m)]
+            best_s = np.empty((m, 0), dtype=np.float32)
+            best_r = np.empty((m, 0), dtype=np.int64)
+            for start in range(0, n, _BLOCK):
+                stop = min(start + _BLOCK, n)
+                scores = queries @ self._decode(self._vecs[start:stop]).T      # (m, bloc)
+                scores[:, ~self._live(start, stop)] = -np.inf
+                kk = min(limit, stop - start)
+                part = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+                best_s = np.concatenate([best_s, np.take_along_axis(scores, part, axis=1)], axis=1)
+                best_r = np.concatenate([best_r, part + start], axis=1)
+                if best_s.shape[1] > limit:
+                    keep = np.argpartition(-best_s, limit - 1, axis=1)[:, :limit]
+                    best_s = np.take_along_axis(best_s, keep, axis=1)
+                    best_r = np.take_along_axis(best_r, keep, axis=1)
+            order = np.argsort(-best_s, axis=1, kind="stable")
+            best_s = np.take_along_axis(best_s, order, axis=1)
+            best_r = np.take_along_axis(best_r, order, axis=1)
+            ids = self._ids[best_r.ravel()].reshape(best_r.shape)
+        return [[(int(pid), float(s)) for pid, s in zip(ids[i], best_s[i]) if np.isfinite(s)]
+                for i in range(m)]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._vecs = self._ids = self._dead = None
+
+    def search(self, query: np.ndarray, limit: int) -> List[Tuple[int, float]]:
+        return self.search_batch(np.asarray(query)[None, :], limit)[0]
@@ -1,23 +1,52 @@
 # src/persist.py
+"""
+Historique des conversations (SQLite, mode WAL).
+
+Un message = une ligne ajoutée (O(1), plus de réécriture du fichier entier).
+La liste des conversations se lit sans les messages ; les messages d'une
+conversation ne sont chargés qu'à son ouverture. L'ancien
+data/chat_history.json est importé une seule fois puis renommé en .migrated.
+"""
 from __future__ import annotations
-import json, os, tempfile
-from typing import Any, List, Dict
+import json, os, sqlite3, threading, uuid
+from typing import Any, List, Dict, Optional
 from datetime import datetime
 
+from src import tracing
+
 # Dossier data/ déjà dans le projet
 HISTORY_DIR = "data"
-HISTORY_PATH = os.path.join(HISTORY_DIR, "chat_history.json")
+HISTORY_PATH = os.path.join(HISTORY_DIR, "chat_history.json")   # ancien format
+HISTORY_DB_PATH = os.path.join(HISTORY_DIR, "chat_history.sqlite")
 
-def _ensure_dir():
-    os.makedirs(HISTORY_DIR, exist_ok=True)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id         TEXT PRIMARY KEY,
+    title      TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    n_messages INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS conversations_recent ON conversations(updated_at);
+CREATE TABLE IF NOT EXISTS messages (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    conv_id    TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    role       TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_conv ON messages(conv_id, id);
+"""
 
-def load_history() -> List[Dict[str, Any]]:
-    """Charge toutes les conversations depuis le disque. Liste vide si rien."""
-    _ensure_dir()
-    if not os.path.exists(HISTORY_PATH):
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+def load_history(path: str = HISTORY_PATH) -> List[Dict[str, Any]]:
+    """Lit l'ancien fichier JSON (liste de conversations). Liste vide si absent ou corrompu."""
+    if not os.path.exists(path):
         return []
     try:
-        with open(HISTORY_PATH, "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
             # format attendu: liste de conversations {id, title, messages, created_at}
             if isinstance(data, list):
@@ -27,18 +56,122 @@ def load_history() -> List[Dict[str, Any]]:
         # En cas de JSON corrompu, on repart à vide (PoC)
         return []
 
-def save_history(conversations: List[Dict[str, Any]]) -> None:
-    """Écrit le JSON de façon atomique (temp file -> os.replace)."""
-    _ensure_dir()
-    tmp_fd, tmp_path = tempfile.mkstemp(prefix="chat_hist_", suffix=".json", dir=HISTORY_DIR)
-    try:
-        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-            json.dump(conversations, f, ensure_ascii=False, indent=2)
-        os.replace(tmp_path, HISTORY_PATH)
-    finally:
-        # si quelque chose a planté avant os.replace, nettoyer le fichier temp
-        if os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
\ No newline at end of file
+class HistoryStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def list_conversations(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Métadonnées seules (sans les messages), dernière activité en premier, paginées."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created_at, updated_at, n_messages FROM conversations "
+                "ORDER BY updated_at DESC, rowid DESC LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return [{"id": r[0], "title": r[1], "created_at": r[2], "updated_at": r[3], "n_messages": r[4]}
+                for r in rows]
+
+    def count_conversations(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+    def get_conversation(self, conv_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            r = self._conn.execute(
+                "SELECT id, title, created_at, updated_at, n_messages FROM conversations WHERE id=?",
+                (conv_id,),
+            ).fetchone()
+        if not r:
+            return None
+        return {"id": r[0], "title": r[1], "created_at": r[2], "updated_at": r[3], "n_messages": r[4]}
+
+    def create_conversation(self, title: str = "Nouvelle conversation") -> Dict[str, Any]:
+        now = _now()
+        conv = {"id": str(uuid.uuid4())[:8], "title": title, "created_at": now,
+                "updated_at": now, "n_messages": 0}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO conversations(id, title, created_at, updated_at) VALUES (?,?,?,?)",
+                (conv["id"], title, now, now),
+            )
+            self._conn.commit()
+        return conv
+
+    def append_message(self, conv_id: str, role: str, content: str) -> int:
+        """Ajoute un message (une insertion + mise à jour du compteur). Renvoie son id."""
+        now = _now()
+        with tracing.span("persist", op="append"), self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO messages(conv_id, role, content, created_at) VALUES (?,?,?,?)",
+                (conv_id, role, content, now),
+            )
+            self._conn.execute(
+                "UPDATE conversations SET updated_at=?, n_messages=n_messages+1 WHERE id=?",
+                (now, conv_id),
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def get_messages(self, conv_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Messages dans l'ordre chronologique ; avec `limit`, seulement les derniers."""
+        with tracing.span("persist", op="read"), self._lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content FROM messages WHERE conv_id=? ORDER BY id DESC LIMIT ?",
+                (conv_id, -1 if limit is None else limit),
+            ).fetchall()
+        return [{"id": r[0], "role": r[1], "content": r[2]} for r in reversed(rows)]
+
+    def rename(self, conv_id: str, title: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE conversations SET title=?, updated_at=? WHERE id=?",
+                               (title, _now(), conv_id))
+            self._conn.commit()
+
+    def delete(self, conv_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM conversations WHERE id=?", (conv_id,))
+            self._conn.commit()
+
+    def migrate_json(self, path: str = HISTORY_PATH) -> int:
+        """Import unique de l'ancien JSON (fichier renommé en .migrated). Renvoie le nb de conversations."""
+        if not os.path.exists(path):
+            return 0
+        convs = load_history(path)
+        with self._lock:
+            for c in convs:
+                cid = str(c.get("id") or uuid.uuid4().hex[:8])
+                created = c.get("created_at") or _now()
+                msgs = [m for m in c.get("messages", []) if isinstance(m, dict)]
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO conversations(id, title, created_at, updated_at, n_messages) "
+                    "VALUES (?,?,?,?,?)",
+                    (cid, c.get("title") or "Nouvelle conversation",
+                     created, c.get("updated_at") or created, len(msgs)),
+                ).rowcount
+                if not inserted:
+                    continue  # déjà importée (import précédent interrompu avant le renommage)
+                self._conn.executemany(
+                    "INSERT INTO messages(conv_id, role, content, created_at) VALUES (?,?,?,?)",
+                    [(cid, m.get("role", "user"), m.get("content", ""), created) for m in msgs],
+                )
+            self._conn.commit()
+        os.replace(path, path + ".migrated")
+        return len(convs)
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    """Instance unique du process ; migre l'ancien JSON au premier appel."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(HISTORY_DB_PATH)
+            _store.migrate_json(HISTORY_PATH)
+        return _store
@@ -1,6 +1,10 @@
-from bs4 import BeautifulSoup
-import pandas as pd
-import re
+from html.parser import HTMLParser
+from collections import deque
+import os, re, threading, zlib
+
+# pandas, bs4 et pypdf sont importés à l'usage : ils pèsent ~0,5 s au démarrage de l'app
+
+SUPPORTED_EXTENSIONS = (".txt", ".csv", ".html", ".pdf")
 
 def clean_text(txt: str) -> str:
     txt = txt.replace("\xa0", " ")
@@ -9,21 +13,230 @@ def clean_text(txt: str) -> str:
     return txt.strip()
 
 def read_any(path: str) -> str:
-    if path.endswith(".txt"):
+    name = path.lower()  # extension sans la casse, comme ingest.iter_files
+    if name.endswith(".txt"):
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
             return clean_text(f.read())
-    if path.endswith(".csv"):
+    if name.endswith(".csv"):
+        import pandas as pd
         df = pd.read_csv(path)
         return clean_text(df.to_csv(index=False))
-    if path.endswith(".html"):
+    if name.endswith(".html"):
+        from bs4 import BeautifulSoup
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
             soup = BeautifulSoup(f.read(), "html.parser")
             return clean_text(soup.get_text(separator="\n"))
-    raise ValueError("Format non supporté (.txt, .csv, .html uniquement)")
+    if name.endswith(".pdf"):
+        return "\n\n".join(text for _, text in iter_pdf_pages(path))
+    raise ValueError("Format non supporté (.txt, .csv, .html, .pdf uniquement)")
+
+# --- Lecture en flux (mémoire bornée, quelle que soit la taille du fichier) ---
+_BLOCK = 1 << 20  # 1 Mo par lecture
+
+def _iter_txt(path: str, block: int):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        tail = ""
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            data = tail + data
+            # on coupe au dernier blanc pour ne jamais scinder un mot entre deux segments
+            cut = max(data.rfind(" "), data.rfind("\n"), data.rfind("\t"))
+            if cut < 0:
+                tail = data
+                continue
+            tail = data[cut + 1:]
+            yield data[:cut + 1]
+        if tail:
+            yield tail
+
+def _iter_csv(path: str, rows: int):
+    import pandas as pd
+    for i, df in enumerate(pd.read_csv(path, chunksize=rows)):
+        yield df.to_csv(index=False, header=(i == 0))
+
+class _HTMLText(HTMLParser):
+    """Extraction incrémentale du texte (équivalent de get_text(separator="\n"))."""
+    _SKIP = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts, self._buf, self._skip = [], [], 0
+
+    def _flush(self):
+        if self._buf:
+            if not self._skip:
+                self.parts.append("".join(self._buf))
+            self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in self._SKIP:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        # feed() peut livrer un même texte en plusieurs morceaux : on recolle jusqu'à la prochaine balise
+        self._buf.append(data)
+
+def _iter_html(path: str, block: int):
+    parser = _HTMLText()
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            parser.feed(data)
+            if parser.parts:
+                yield "\n".join(parser.parts)
+                parser.parts = []
+    parser.close()
+    parser._flush()
+    if parser.parts:
+        yield "\n".join(parser.parts)
+
+# --- PDF : pages extraites en parallèle (pool de process), restituées dans l'ordre ---
+_pdf_pool = None
+_pdf_pool_workers = 0
+_pdf_pool_lock = threading.Lock()
+
+def _pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    with open(path, "rb") as f:  # lecture paresseuse : le fichier n'est pas chargé en entier
+        return len(PdfReader(f).pages)
+
+def _extract_pages(path: str, start: int, stop: int) -> list:
+    """Texte des pages [start, stop) ; exécuté dans un process du pool (ouvre son propre lecteur)."""
+    from pypdf import PdfReader
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _get_pdf_pool(workers: int):
+    global _pdf_pool, _pdf_pool_workers
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_workers != workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            if _pdf_pool is not None:
+                _pdf_pool.shutdown(wait=False)
+            # spawn : jamais de fork d'un process multi-threadé (Streamlit, workers d'ingestion)
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pdf_pool_workers = workers
+        return _pdf_pool
+
+def iter_pdf_pages(path: str, workers: int = 0, pages_per_task: int = 8):
+    """
+    (n° de page à partir de 1, texte nettoyé) dans l'ordre des pages. Les
+    pages sont extraites par paquets de `pages_per_task` dans un pool de
+    `workers` process (0 = tous les cœurs, 1 = dans ce process) ; au plus
+    2 × workers paquets en vol, la mémoire reste bornée quelle que soit la
+    taille du PDF.
+    """
+    n_pages = _pdf_page_count(path)
+    workers = workers or os.cpu_count() or 1
+    per_task = max(pages_per_task, 1)
+    starts = range(0, n_pages, per_task)
+    if workers <= 1 or n_pages <= per_task:  # petit PDF : lancer des process coûterait plus cher
+        batches = (_extract_pages(path, s, min(s + per_task, n_pages)) for s in starts)
+    else:
+        batches = _pooled_batches(path, n_pages, per_task, workers)
+    for start, texts in zip(starts, batches):
+        for i, text in enumerate(texts):
+            text = clean_text(text)
+            if text:
+                yield start + i + 1, text
+
+def _pooled_batches(path: str, n_pages: int, per_task: int, workers: int):
+    pool = _get_pdf_pool(workers)
+    starts = iter(range(0, n_pages, per_task))
+    pending = deque()
+
+    def _submit() -> None:
+        start = next(starts, None)
+        if start is not None:
+            pending.append(pool.submit(_extract_pages, path, start, min(start + per_task, n_pages)))
+
+    for _ in range(2 * workers):
+        _submit()
+    try:
+        while pending:
+            texts = pending.popleft().result()
+            _submit()
+            yield texts
+    finally:
+        for fut in pending:  # lecture abandonnée : on n'extrait pas le reste
+            fut.cancel()
+
+def iter_text(path: str, block: int = _BLOCK, csv_rows: int = 5000):
+    """
+    Variante en flux de `read_any` : produit des segments de texte nettoyés,
+    sans jamais charger le fichier entier (CSV lu par paquets de `csv_rows` lignes).
+    """
+    for _, seg in iter_pages(path, block, csv_rows):
+        yield seg
+
+def iter_pages(path: str, block: int = _BLOCK, csv_rows: int = 5000, pdf_workers: int = 0,
+               pdf_pages_per_task: int = 8):
+    """(n° de page ou None, segment nettoyé) : numéros réels pour les PDF, None pour les autres formats."""
+    name = path.lower()
+    if name.endswith(".pdf"):
+        yield from iter_pdf_pages(path, pdf_workers, pdf_pages_per_task)
+        return
+    if name.endswith(".txt"):
+        segments = _iter_txt(path, block)
+    elif name.endswith(".csv"):
+        segments = _iter_csv(path, csv_rows)
+    elif name.endswith(".html"):
+        segments = _iter_html(path, block)
+    else:
+        raise ValueError("Format non supporté (.txt, .csv, .html, .pdf uniquement)")
+    for seg in segments:
+        seg = clean_text(seg)
+        if seg:
+            yield None, seg
 
 def chunk(text: str, size=800, overlap=100):
-    tokens = text.split()
-    i = 0
-    while i < len(tokens):
-        yield " ".join(tokens[i:i+size])
-        i += max(size - overlap, 1)
\ No newline at end of file
+    return chunk_stream([text], size, overlap)
+
+def chunk_stream(segments, size=800, overlap=100):
+    """Même découpage que `chunk`, mais sur un flux de segments (au plus `size` mots en mémoire)."""
+    for text, _, _ in chunk_stream_pages(((None, seg) for seg in segments), size, overlap):
+        yield text
+
+def _word_hash(prev: str, word: str) -> int:
+    return zlib.crc32(f"{prev} {word}".encode("utf-8"))
+
+def chunk_stream_pages(pages, size=800, overlap=100):
+    """
+    `chunk_stream` sur des (n° de page, segment) : produit (chunk, première
+    page, dernière page) ; pages à None hors PDF.
+
+    Frontières définies par le contenu : un chunk compte entre size/2 et
+    `size` mots et se termine sur le mot dont le hachage (avec le mot
+    précédent) est le plus petit de cet intervalle. Insérer ou supprimer du
+    texte ne déplace que les frontières voisines : les chunks suivants
+    retrouvent le même texte, à un autre rang.
+    """
+    low = min(size, max(size // 2, overlap + 1))
+    buf, where, hashes = [], [], []
+    prev, carried = "", 0  # carried : mots de tête déjà produits (recouvrement)
+    for page, seg in pages:
+        for word in seg.split():
+            hashes.append(_word_hash(prev, word))
+            prev = word
+            buf.append(word)
+            where.append(page)
+        while len(buf) >= size:
+            end = min(range(low - 1, size), key=hashes.__getitem__) + 1
+            yield " ".join(buf[:end]), where[0], where[end - 1]
+            step = max(end - overlap, 1)
+            del buf[:step], where[:step], hashes[:step]
+            carried = end - step
+    if len(buf) > carried:
+        yield " ".join(buf), where[0], where[-1]
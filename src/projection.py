@@ -0,0 +1,69 @@
+# src/projection.py
+"""
+Réduction de dimension des embeddings du modèle local (EMBED_DIM) :
+projection ACP ajustée sur les vecteurs pleine largeur des chunks indexés,
+puis renormalisation (le cosinus reste un produit scalaire).
+
+La projection est enregistrée à côté de l'index (EMBED_PCA_PATH) avec le
+nom du modèle : questions et chunks passent par la même projection tant
+que l'index n'est pas ré-embeddé (python -m src.vectorstore reembed).
+"""
+from __future__ import annotations
+import os
+from typing import Optional
+
+import numpy as np
+
+def normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return np.ascontiguousarray(mat / np.maximum(norms, 1e-12), dtype=np.float32)
+
+class PCAProjection:
+    def __init__(self, mean: np.ndarray, components: np.ndarray, model: str = ""):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)  # (dim, largeur d'origine)
+        self.model = model
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dim: int, model: str = "") -> "PCAProjection":
+        """Axes principaux de `vectors` (n, d) ; il faut au moins `dim` vecteurs et dim <= d."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n, width = vectors.shape
+        if not 0 < dim <= width:
+            raise ValueError(f"dimension {dim} impossible pour des vecteurs de largeur {width}")
+        if n < dim:
+            raise ValueError(f"{n} vecteurs : il en faut au moins {dim} pour ajuster l'ACP")
+        mean = vectors.mean(axis=0)
+        # SVD réduite : les lignes de vt sont les axes, par variance décroissante
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dim], model)
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize((vectors - self.mean) @ self.components.T)
+
+    def wrap(self, embed):
+        """Embedder pleine largeur -> embedder réduit."""
+        return lambda texts: self.apply(embed(texts))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, mean=self.mean, components=self.components, model=np.array(self.model))
+        os.replace(tmp, path)  # jamais de fichier à moitié écrit
+
+    @classmethod
+    def load(cls, path: str, model: str = "") -> Optional["PCAProjection"]:
+        """Projection enregistrée pour ce modèle, None si absente ou ajustée pour un autre modèle."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            proj = cls(data["mean"], data["components"], str(data["model"]))
+        return proj if not model or proj.model == model else None
@@ -1,7 +1,16 @@
 # src/rag.py
+import json
 import os
 import re
-from typing import List, Dict
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from src import tracing
+from src.answer_cache import get_answer_cache
+from src.config import settings
+from src.context import PackedContext, also_in, pack_context, page_label, token_counter
+from src.llm_client import get_llm_client
 
 # --- DUMMY (offline, déterministe) ---
 _DURATION_RX = re.compile(r"(\b\d{1,3}\b)\s*(mois|jour|jours|semaine|semaines|an|ans)", re.IGNORECASE)
@@ -19,7 +28,10 @@ def _dummy_answer(question: str, hits: List[Dict]) -> str:
     sources = []
     for h in hits:
         meta = h.get("meta", {})
-        sources.append(f"- {meta.get('filename','?')} · chunk {meta.get('chunk_index',0)}")
+        pages = page_label(meta.get("page_start"), meta.get("page_end"))
+        others = also_in(meta)
+        sources.append(f"- {meta.get('filename','?')} · {pages + ' · ' if pages else ''}chunk {meta.get('chunk_index',0)}"
+                       + (f" (aussi dans : {', '.join(others)})" if others else ""))
     src_block = "\n".join(sources) if sources else "Aucune source trouvée."
     return f"{base}\n\n**Sources**\n{src_block}"
 
@@ -35,78 +47,249 @@ def _pick_provider() -> str:
     # sinon, laisser "openai" par défaut (ou anthropic si tu veux)
     return (os.getenv("LLM_PROVIDER") or "openai").lower().strip()
 
+_SYS_PROMPT = ("Tu es un assistant juridique interne. Réponds UNIQUEMENT à partir des passages fournis. "
+               "Si l'information n'est pas présente, dis-le. Cite les sources.")
+
+# --- Contexte : fusion des chunks voisins + budget de tokens ---
+_counter = None
+_ctx_lock = threading.Lock()
+_ctx_totals = {"requests": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0}
+_ctx_last = threading.local()
+
+def _pack(hits: List[Dict]) -> PackedContext:
+    global _counter
+    if _counter is None:
+        _counter = token_counter(_model_name(_pick_provider()))
+    ctx = pack_context(hits, settings.context_token_budget, settings.chunk_overlap, _counter)
+    with _ctx_lock:
+        _ctx_totals["requests"] += 1
+        _ctx_totals["tokens_in"] += ctx.tokens_in
+        _ctx_totals["tokens_out"] += ctx.tokens_out
+        _ctx_totals["tokens_saved"] += ctx.tokens_saved
+    _ctx_last.stats = {"tokens_in": ctx.tokens_in, "tokens_out": ctx.tokens_out,
+                       "tokens_saved": ctx.tokens_saved, "passages": len(ctx.passages)}
+    return ctx
+
+def context_stats() -> dict:
+    """Cumul depuis le démarrage (tokens retrouvés / envoyés / économisés)."""
+    with _ctx_lock:
+        return dict(_ctx_totals)
+
+def last_context_stats() -> dict:
+    """Bilan du dernier contexte assemblé dans ce thread (le tour en cours côté Streamlit)."""
+    return getattr(_ctx_last, "stats", {})
+
+def _context(ctx: PackedContext) -> str:
+    return ctx.prompt()
+
+def _sources_block(ctx: PackedContext) -> str:
+    sources = [f"- [{p.num}] {p.label}" for p in ctx.passages]
+    return "\n\n**Sources**\n" + ("\n".join(sources) or "Aucune source trouvée.")
+
+def _with_sources(txt: str, ctx: PackedContext) -> str:
+    return txt + _sources_block(ctx)
+
+def _sse_data(resp) -> Iterator[dict]:
+    """Événements JSON d'une réponse Server-Sent Events (lignes `data: ...`)."""
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        yield json.loads(data)
+
+def _model_name(provider: str) -> str:
+    if provider == "anthropic":
+        return os.getenv("ANTHROPIC_MODEL","claude-3-5-sonnet-latest")
+    return os.getenv("OPENAI_CHAT_MODEL","gpt-4o-mini")
+
 # --- OpenAI (prod locale uniquement) ---
-def _openai_answer(question: str, hits: List[Dict]) -> str:
-    import requests
+def _openai_text(question: str, ctx: PackedContext) -> str:
+    """Texte brut de la complétion ; lève une exception en cas d'échec."""
     api_key = os.getenv("OPENAI_API_KEY", "")
     if not api_key or api_key == "dummy":  # sécurité supplémentaire
-        return _dummy_answer(question, hits)
+        raise RuntimeError("OPENAI_API_KEY absente")
+    data = get_llm_client().post_json(
+        "https://api.openai.com/v1/chat/completions",
+        {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        {"model": _model_name("openai"),
+         "messages":[{"role":"system","content":_SYS_PROMPT},
+                     {"role":"user","content":f"Contexte:\n{_context(ctx)}\n\nQuestion: {question}"}],
+         "temperature":0},
+    )
+    return data["choices"][0]["message"]["content"]
 
-    ctx = "\n\n".join([f"[{i+1}] {h.get('text','')}" for i,h in enumerate(hits)])
-    sys_prompt = ("Tu es un assistant juridique interne. Réponds UNIQUEMENT à partir des passages fournis. "
-                  "Si l'information n'est pas présente, dis-le. Cite les sources.")
-    try:
-        r = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
-            json={"model": os.getenv("OPENAI_CHAT_MODEL","gpt-4o-mini"),
-                  "messages":[{"role":"system","content":sys_prompt},
-                              {"role":"user","content":f"Contexte:\n{ctx}\n\nQuestion: {question}"}],
-                  "temperature":0},
-            timeout=60,
-        )
-        r.raise_for_status()
-        txt = r.json()["choices"][0]["message"]["content"]
-    except Exception:
-        return _dummy_answer(question, hits)
-
-    sources = []
-    for h in hits:
-        meta = h.get("meta", {})
-        sources.append(f"- {meta.get('filename','?')} · chunk {meta.get('chunk_index',0)}")
-    return f"{txt}\n\n**Sources**\n" + ("\n".join(sources) or "Aucune source trouvée.")
+def _openai_stream(question: str, ctx: PackedContext) -> Iterator[str]:
+    """Deltas de texte via l'API chat completions en mode `stream`."""
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    if not api_key or api_key == "dummy":
+        raise RuntimeError("OPENAI_API_KEY absente")
+    with get_llm_client().stream(
+        "https://api.openai.com/v1/chat/completions",
+        {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        {"model": _model_name("openai"),
+         "messages":[{"role":"system","content":_SYS_PROMPT},
+                     {"role":"user","content":f"Contexte:\n{_context(ctx)}\n\nQuestion: {question}"}],
+         "temperature":0,
+         "stream": True},
+    ) as r:
+        for event in _sse_data(r):
+            for choice in event.get("choices", []):
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    yield delta
 
 # --- Anthropic (optionnel, prod locale) ---
-def _anthropic_answer(question: str, hits: List[Dict]) -> str:
-    import requests
+def _anthropic_text(question: str, ctx: PackedContext) -> str:
+    """Texte brut de la complétion ; lève une exception en cas d'échec ou de réponse vide."""
     api_key = os.getenv("ANTHROPIC_API_KEY", "")
     if not api_key or api_key == "dummy":
-        return _dummy_answer(question, hits)
+        raise RuntimeError("ANTHROPIC_API_KEY absente")
+    data = get_llm_client().post_json(
+        "https://api.anthropic.com/v1/messages",
+        {"x-api-key": api_key, "anthropic-version": "2023-06-01", "content-type": "application/json"},
+        {"model": _model_name("anthropic"),
+         "max_tokens": 512,
+         "system": _SYS_PROMPT,
+         "messages": [{"role":"user","content":f"Contexte:\n{_context(ctx)}\n\nQuestion: {question}"}]},
+    )
+    txt = ""
+    if "content" in data and data["content"] and isinstance(data["content"][0], dict):
+        txt = data["content"][0].get("text", "") or ""
+    if not txt:
+        raise ValueError("réponse vide")
+    return txt
 
-    ctx = "\n\n".join([f"[{i+1}] {h.get('text','')}" for i,h in enumerate(hits)])
-    sys_prompt = ("Tu es un assistant juridique interne. Réponds UNIQUEMENT à partir des passages fournis. "
-                  "Si l'information n'est pas présente, dis-le. Cite les sources.")
-    try:
-        r = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={"x-api-key": api_key, "anthropic-version": "2023-06-01", "content-type": "application/json"},
-            json={"model": os.getenv("ANTHROPIC_MODEL","claude-3-5-sonnet-latest"),
-                  "max_tokens": 512,
-                  "system": sys_prompt,
-                  "messages": [{"role":"user","content":f"Contexte:\n{ctx}\n\nQuestion: {question}"}]},
-            timeout=60,
-        )
-        r.raise_for_status()
-        data = r.json()
-        txt = ""
-        if "content" in data and data["content"] and isinstance(data["content"][0], dict):
-            txt = data["content"][0].get("text", "") or ""
-        if not txt:
-            return _dummy_answer(question, hits)
-    except Exception:
-        return _dummy_answer(question, hits)
-
-    sources = []
-    for h in hits:
-        meta = h.get("meta", {})
-        sources.append(f"- {meta.get('filename','?')} · chunk {meta.get('chunk_index',0)}")
-    return f"{txt}\n\n**Sources**\n" + ("\n".join(sources) or "Aucune source trouvée.")
+def _anthropic_stream(question: str, ctx: PackedContext) -> Iterator[str]:
+    """Deltas de texte via l'API messages en mode `stream` (événements content_block_delta)."""
+    api_key = os.getenv("ANTHROPIC_API_KEY", "")
+    if not api_key or api_key == "dummy":
+        raise RuntimeError("ANTHROPIC_API_KEY absente")
+    with get_llm_client().stream(
+        "https://api.anthropic.com/v1/messages",
+        {"x-api-key": api_key, "anthropic-version": "2023-06-01", "content-type": "application/json"},
+        {"model": _model_name("anthropic"),
+         "max_tokens": 512,
+         "system": _SYS_PROMPT,
+         "messages": [{"role":"user","content":f"Contexte:\n{_context(ctx)}\n\nQuestion: {question}"}],
+         "stream": True},
+    ) as r:
+        for event in _sse_data(r):
+            if event.get("type") == "content_block_delta":
+                delta = (event.get("delta") or {}).get("text")
+                if delta:
+                    yield delta
+            elif event.get("type") == "error":
+                raise RuntimeError((event.get("error") or {}).get("message", "erreur de streaming"))
 
 # --- Entrée publique ---
+def _cached_answer(provider: str, question: str, hits: List[Dict]):
+    """(réponse en cache ou None, embedding de la question ou None, cache ou None)."""
+    hit_ids = [h["id"] for h in hits if "id" in h]
+    cache = get_answer_cache() if hit_ids else None
+    if not cache:
+        return None, None, None
+    model = _model_name(provider)
+    ans = cache.get_exact(provider, model, question, hit_ids)
+    if ans is not None:
+        return ans, None, cache
+    # recherche sémantique seulement si la recherche a déjà embeddé la question :
+    # pas d'embedding devant chaque nouvelle question (voie lexicale rapide)
+    qvec = _question_vector(question)
+    if qvec is not None:
+        ans = cache.get_similar(provider, model, qvec, hit_ids)
+    return ans, qvec, cache
+
+def _store_answer(cache, provider: str, question: str, hits: List[Dict], qvec, ans: str) -> None:
+    if not cache:
+        return
+    if qvec is None:  # embedding après la génération, seulement pour une réponse à cacher
+        qvec = _question_vector(question, embed=True)
+    if qvec is not None:
+        cache.put(provider, _model_name(provider), question, [h["id"] for h in hits if "id" in h], qvec, ans)
+
+def _answer_tokens(text: str) -> int:
+    return _counter(text) if _counter is not None else len(text) // 4
+
 def grounded_answer(question: str, hits: List[Dict]) -> str:
+    """
+    Réponse ancrée sur `hits`. Hors mode dummy, passe par le cache de
+    réponses : hit exact, puis question sémantiquement proche sur les
+    mêmes passages. Les réponses de repli (erreur LLM) ne sont jamais cachées.
+    """
+    provider = _pick_provider()
+    with tracing.span("llm", provider=provider) as sp:
+        if provider == "dummy":
+            return _dummy_answer(question, hits)
+        ans, qvec, cache = _cached_answer(provider, question, hits)
+        sp.set(cached=ans is not None)
+        if ans is not None:
+            return ans
+
+        complete = _anthropic_text if provider == "anthropic" else _openai_text
+        try:
+            ctx = _pack(hits)
+            ans = _with_sources(complete(question, ctx), ctx)
+        except Exception:
+            sp.set(fallback=True)
+            return _dummy_answer(question, hits)
+        sp.set(tokens_context=ctx.tokens_out, tokens_answer=_answer_tokens(ans))
+        _store_answer(cache, provider, question, hits, qvec, ans)
+        return ans
+
+def grounded_answer_stream(question: str, hits: List[Dict]) -> Iterator[str]:
+    """
+    Variante en flux de `grounded_answer` : produit les deltas de texte au
+    fil de la génération, puis le bloc **Sources**. La concaténation des
+    deltas est identique à la réponse complète (et c'est elle qui est cachée).
+    """
     provider = _pick_provider()
+    yield from tracing.span_stream("llm", lambda sp: _answer_stream(sp, provider, question, hits),
+                                   provider=provider, stream=True)
+
+def _answer_stream(sp, provider: str, question: str, hits: List[Dict]) -> Iterator[str]:
     if provider == "dummy":
-        return _dummy_answer(question, hits)
-    if provider == "anthropic":
-        return _anthropic_answer(question, hits)
-    return _openai_answer(question, hits)
\ No newline at end of file
+        yield _dummy_answer(question, hits)
+        return
+    ans, qvec, cache = _cached_answer(provider, question, hits)
+    sp.set(cached=ans is not None)
+    if ans is not None:
+        yield ans
+        return
+
+    stream = _anthropic_stream if provider == "anthropic" else _openai_stream
+    t0 = time.perf_counter()
+    parts = []
+    try:
+        ctx = _pack(hits)
+        sp.set(tokens_context=ctx.tokens_out)
+        for delta in stream(question, ctx):
+            if not parts:
+                sp.set(first_token_ms=round((time.perf_counter() - t0) * 1000, 1))
+            parts.append(delta)
+            yield delta
+    except Exception:
+        sp.set(fallback=True)
+        if not parts:
+            yield _dummy_answer(question, hits)
+            return
+        # coupure en cours de génération : on garde le début, sans le cacher
+        yield "\n\n_(réponse interrompue)_" + _sources_block(ctx)
+        return
+    if not parts:
+        yield _dummy_answer(question, hits)
+        return
+    sp.set(tokens_answer=_answer_tokens("".join(parts)))
+    tail = _sources_block(ctx)
+    yield tail
+    _store_answer(cache, provider, question, hits, qvec, "".join(parts) + tail)
+
+def _question_vector(question: str, embed: bool = False):
+    """Embedding de la question déjà calculé par la recherche ; embed=True le calcule s'il manque."""
+    try:
+        # import lazy : évite de charger l'index pour rien
+        from src.vectorstore import cached_query_vector, embed_query
+        return embed_query(question) if embed else cached_query_vector(question)
+    except Exception:
+        return None
@@ -0,0 +1,144 @@
+# src/rerank.py
+"""
+Reranking optionnel entre la recherche et le LLM.
+
+On sur-échantillonne `rerank_candidates` passages, puis :
+- mode "cross" : score (question, passage) par un CrossEncoder local, par
+  batches, scores mis en cache par (question, chunk) ;
+- mode "mmr"   : Maximal Marginal Relevance (pertinence vs redondance),
+  vectorisé en NumPy sur les vecteurs déjà indexés.
+Si le budget de latence par question est dépassé, on garde l'ordre de la
+recherche vectorielle.
+"""
+from __future__ import annotations
+import hashlib, threading, time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.config import settings
+from src.query_cache import TTLCache, normalize_question
+from src import tracing, vectorstore
+
+_scores = TTLCache(maxsize=20000, ttl=24 * 3600)
+_stats_lock = threading.Lock()
+_stats = {"reranked": 0, "fallbacks": 0}
+_model = None
+_model_lock = threading.Lock()
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+def rerank_stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "score_cache": _scores.stats()}
+
+def _cross_encoder():
+    """CrossEncoder chargé une fois par process (None si sentence-transformers indisponible)."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                from sentence_transformers import CrossEncoder
+                _model = CrossEncoder(settings.rerank_model)
+            except Exception:
+                _model = False
+        return _model or None
+
+def _score_key(q: str, hit: Dict) -> tuple:
+    digest = hashlib.sha1(hit.get("text", "").encode("utf-8")).hexdigest()
+    return normalize_question(q), hit.get("id"), digest
+
+def cross_scores(q: str, hits: List[Dict], deadline: float, model=None) -> Optional[np.ndarray]:
+    """Scores CrossEncoder, ou None si le modèle manque ou si `deadline` est dépassée."""
+    model = model or _cross_encoder()
+    if model is None:
+        return None
+    scores = np.empty(len(hits), dtype=np.float32)
+    todo = []
+    for i, h in enumerate(hits):
+        cached = _scores.get(_score_key(q, h))
+        if cached is None:
+            todo.append(i)
+        else:
+            scores[i] = cached
+    bs = max(settings.rerank_batch_size, 1)
+    for start in range(0, len(todo), bs):
+        if time.perf_counter() > deadline:
+            return None
+        idx = todo[start:start + bs]
+        batch = model.predict([(q, hits[i].get("text", "")) for i in idx], batch_size=bs,
+                              show_progress_bar=False)
+        for i, s in zip(idx, np.asarray(batch, dtype=np.float32)):
+            scores[i] = s
+            _scores.put(_score_key(q, hits[i]), float(s))
+    if time.perf_counter() > deadline:
+        return None
+    return scores
+
+def mmr(qvec: np.ndarray, doc_vecs: np.ndarray, k: int, lam: float) -> tuple:
+    """Sélection MMR : (indices choisis, score MMR au moment du choix)."""
+    d = doc_vecs / (np.linalg.norm(doc_vecs, axis=1, keepdims=True) + 1e-12)
+    q = qvec / (np.linalg.norm(qvec) + 1e-12)
+    rel = d @ q
+    sim = d @ d.T
+    n = len(d)
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    chosen, gains = [], []
+    for step in range(min(k, n)):
+        obj = lam * rel - (1 - lam) * redundancy
+        obj[~available] = -np.inf
+        i = int(np.argmax(obj))
+        chosen.append(i)
+        gains.append(float(obj[i]))
+        available[i] = False
+        redundancy = np.maximum(redundancy, sim[i])
+    return chosen, gains
+
+def _reorder(hits: List[Dict], order, scores) -> List[Dict]:
+    # le score de rerank remplace celui de la recherche (gardé à part) : c'est lui qui guide le packing
+    scores = np.minimum.accumulate(np.asarray(scores, dtype=np.float64)) if len(scores) else scores
+    out = []
+    for i, s in zip(order, scores):
+        h = hits[i]
+        h["meta"]["retrieval_score"] = h["meta"].get("score")
+        h["meta"]["score"] = float(s)
+        out.append(h)
+    return out
+
+def retrieve(q: str, k: int, mode: Optional[str] = None) -> List[Dict]:
+    """`query` + reranking éventuel (RERANK_MODE=off|cross|mmr)."""
+    mode = (mode or settings.rerank_mode).lower()
+    if mode not in ("cross", "mmr"):
+        return vectorstore.query(q, k)
+    t0 = time.perf_counter()
+    cands = vectorstore.query(q, max(k, settings.rerank_candidates))
+    if len(cands) <= 1:
+        return cands[:k]
+    deadline = t0 + settings.rerank_budget_ms / 1000
+
+    if mode == "cross":
+        with tracing.span("rerank", mode="cross", n=len(cands)):
+            scores = cross_scores(q, cands, deadline)
+        if scores is None:
+            _count("fallbacks")
+            return cands[:k]
+        order = np.argsort(-scores, kind="stable")[:k]
+        _count("reranked")
+        return _reorder(cands, order, scores[order])
+
+    with tracing.span("rerank", mode="mmr", n=len(cands)):
+        vecs = vectorstore.get_vectors([h["id"] for h in cands])
+        keep = [i for i, h in enumerate(cands) if h["id"] in vecs]
+        if len(keep) < 2 or time.perf_counter() > deadline:
+            _count("fallbacks")
+            return cands[:k]
+        qvec = vectorstore.embed_query(q)
+        chosen, gains = mmr(qvec, np.stack([vecs[cands[i]["id"]] for i in keep]), k, settings.mmr_lambda)
+    if time.perf_counter() > deadline:
+        _count("fallbacks")
+        return cands[:k]
+    _count("reranked")
+    return _reorder(cands, [keep[i] for i in chosen], gains)
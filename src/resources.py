@@ -0,0 +1,177 @@
+# src/resources.py
+"""
+Registre des ressources lourdes du process : modèle d'embeddings et index
+vectoriel (client Qdrant ou matrice NumPy mappée, selon VECTOR_BACKEND).
+
+Rien n'est chargé à l'import : chaque ressource est construite au premier
+`get()` (une seule fois, même sous accès concurrents) puis partagée par
+toutes les sessions Streamlit. `warm_up()` les construit en tâche de fond
+dès le démarrage de l'app, pour que la première question ne paie pas le
+chargement du modèle. Une ressource en échec lève ResourceError (plus de
+repli silencieux sur des embeddings factices).
+"""
+from __future__ import annotations
+import threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+NOT_LOADED, LOADING, READY, FAILED = "non chargé", "chargement", "prêt", "erreur"
+
+class ResourceError(RuntimeError):
+    """Une ressource n'a pas pu être initialisée (message destiné à l'utilisateur)."""
+
+# --- Rapport de démarrage : import / chargement modèle / ouverture client ---
+_timings: Dict[str, float] = {}
+_timings_lock = threading.Lock()
+
+@contextmanager
+def timed(label: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            _timings[label] = _timings.get(label, 0.0) + time.perf_counter() - t0
+
+def startup_report() -> Dict[str, float]:
+    """Durées (s) par étape d'initialisation, dans l'ordre où elles ont eu lieu."""
+    with _timings_lock:
+        return dict(_timings)
+
+class Resource:
+    def __init__(self, name: str, factory: Callable[[], object]):
+        self.name, self.factory = name, factory
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = NOT_LOADED
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+
+    def get(self):
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state != READY:
+                self.state, self.error = LOADING, None
+                t0 = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.state, self.error = FAILED, f"{type(e).__name__}: {e}"
+                    raise ResourceError(f"{self.name} indisponible : {self.error}") from e
+                finally:
+                    self.seconds = time.perf_counter() - t0
+                self.state = READY
+        return self._value
+
+    def reset(self) -> None:
+        """Libère la ressource (close() si elle en a un) ; reconstruite au prochain get()."""
+        with self._lock:
+            if self.state == READY and hasattr(self._value, "close"):
+                self._value.close()
+            self._value, self.state, self.error = None, NOT_LOADED, None
+
+_registry: Dict[str, Resource] = {}
+_registry_lock = threading.Lock()
+
+def register(name: str, factory: Callable[[], object]) -> Resource:
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Resource(name, factory)
+        return _registry[name]
+
+def get(name: str):
+    return _registry[name].get()
+
+def reset(name: str) -> None:
+    _registry[name].reset()
+
+def status() -> Dict[str, dict]:
+    return {name: {"state": r.state, "seconds": r.seconds, "error": r.error}
+            for name, r in _registry.items()}
+
+def _default_names() -> List[str]:
+    from src.config import settings
+    # en mode client (RETRIEVAL_URL), index et modèle vivent dans le service de recherche
+    if settings.retrieval_url:
+        return [MODULES]
+    unused = QDRANT if settings.vector_backend == "numpy" else NPSTORE
+    return [n for n in _registry if n != unused]
+
+def ready(names: Optional[List[str]] = None) -> bool:
+    return all(_registry[n].state == READY for n in (names or _default_names()))
+
+_warmup: Optional[threading.Thread] = None
+
+def warm_up(names: Optional[List[str]] = None) -> threading.Thread:
+    """Construit les ressources dans un thread de fond (une seule fois par process)."""
+    global _warmup
+    with _registry_lock:
+        if _warmup is None:
+            def _run():
+                with timed("warm-up (total)"):
+                    for name in names or _default_names():
+                        try:
+                            _registry[name].get()
+                        except ResourceError:
+                            pass  # erreur conservée dans status(), relevée au prochain get()
+            _warmup = threading.Thread(target=_run, name="warm-up", daemon=True)
+            _warmup.start()
+        return _warmup
+
+# --- Ressources de l'application ---
+def _import_pipeline():
+    # qdrant_client (~1 s) et la chaîne RAG : importés ici, hors du premier rendu de l'app
+    with timed("import modules (qdrant_client, pipeline)"):
+        import src.vectorstore, src.rag, src.rerank  # noqa: F401
+    return True
+
+def _load_embedder():
+    from src import tracing
+    from src.embeddings import get_embedder
+    return tracing.traced("embed", get_embedder())
+
+def _open_qdrant():
+    from qdrant_client import QdrantClient
+    from src.config import settings
+    with timed("ouverture client Qdrant"):
+        if settings.qdrant_url:
+            return QdrantClient(url=settings.qdrant_url, api_key=settings.qdrant_api_key)
+        return QdrantClient(path=settings.chroma_dir)
+
+def _open_npstore():
+    from src.config import settings
+    from src.npstore import NumpyStore
+    with timed("ouverture index NumPy (mmap)"):
+        return NumpyStore(settings.npstore_dir, settings.npstore_dtype)
+
+MODULES, QDRANT, NPSTORE, EMBEDDER = "modules", "qdrant", "npstore", "embeddings"
+register(MODULES, _import_pipeline)
+register(QDRANT, _open_qdrant)
+register(NPSTORE, _open_npstore)
+register(EMBEDDER, _load_embedder)
+
+def render_readiness() -> None:
+    """Indicateur de disponibilité (barre latérale) ; se rafraîchit seul tant que le chargement dure."""
+    import streamlit as st
+
+    def _show():
+        failed = {n: s["error"] for n, s in status().items() if s["state"] == FAILED}
+        for name, error in failed.items():
+            st.error(f"{name} : {error}")
+        if failed:
+            return
+        if not ready():
+            if _warmup is None:
+                st.caption("Modèles chargés à la première requête.")
+                return
+            loading = [n for n in _default_names() if _registry[n].state != READY]
+            st.info(f"⏳ Chargement en arrière-plan : {', '.join(loading)}…")
+            return
+        report = startup_report()
+        st.caption("✅ Prêt · " + " · ".join(f"{k} {v:.1f}s" for k, v in report.items()))
+
+    if ready() or _warmup is None:
+        _show()
+    else:
+        st.fragment(run_every="2s")(_show)()
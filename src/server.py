@@ -0,0 +1,194 @@
+# src/server.py
+"""
+Service de recherche local : un seul process possède l'index Qdrant et le
+modèle d'embeddings, les workers Streamlit (et l'ingestion) l'interrogent
+en HTTP (RETRIEVAL_URL=http://127.0.0.1:8765).
+
+    python -m src.server --port 8765
+
+Endpoints (JSON, POST sauf mention) :
+    /add          {"path"}             -> {"chunks", "chars", "stats"}
+    /delete       {"source"}           -> {"ok"}
+    /query        {"q", "k"}           -> {"hits"}
+    /batch_query  {"questions", "k"}   -> {"hits": [[...], ...]}
+    /embed_query  {"q"}                -> {"vector"}
+    /vectors      {"ids"}              -> {"vectors": {id: [...]}}
+    /last_ingest  {"path"}             -> {"stats"}
+    GET /stats, GET /health, GET /metrics (texte Prometheus, cf. src/tracing.py)
+
+Les embeddings de questions arrivant en même temps sont regroupés
+(micro-batching) : un seul appel au modèle pour tout le lot.
+"""
+from __future__ import annotations
+import argparse, json, queue, threading, time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List
+
+class MicroBatcher:
+    """Regroupe les appels concurrents à `fn(items) -> résultats` (lot <= max_batch, attente <= max_wait_ms)."""
+
+    def __init__(self, fn: Callable[[List], List], max_batch: int, max_wait_ms: float):
+        self.fn, self.max_batch, self.max_wait = fn, max(max_batch, 1), max_wait_ms / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = self.items = 0
+        threading.Thread(target=self._loop, name="micro-batch", daemon=True).start()
+
+    def submit(self, item):
+        fut: Future = Future()
+        self._queue.put((item, fut))
+        return fut.result()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            try:
+                results = self.fn([item for item, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"batches": self.batches, "items": self.items,
+                    "avg_batch": (self.items / self.batches) if self.batches else 0.0}
+
+def _vec(v) -> list:
+    return [float(x) for x in v]
+
+class _Service:
+    def __init__(self, batcher: MicroBatcher):
+        from src import vectorstore
+        self.vs, self.batcher = vectorstore, batcher
+
+    def add(self, body):
+        chunks, chars = self.vs.add_path(body["path"])
+        return {"chunks": chunks, "chars": chars, "stats": self.vs.last_ingest(body["path"])}
+
+    def delete(self, body):
+        return {"ok": self.vs.delete_by_source(body["source"])}
+
+    def query(self, body):
+        return {"hits": self.vs.query(body["q"], int(body.get("k", 6)))}
+
+    def batch_query(self, body):
+        # un seul embedding par lot et une recherche vectorielle groupée
+        return {"hits": self.vs.query_many(body["questions"], int(body.get("k", 6)))}
+
+    def embed_query(self, body):
+        return {"vector": _vec(self.vs.embed_query(body["q"]))}
+
+    def vectors(self, body):
+        return {"vectors": {str(pid): _vec(v) for pid, v in self.vs.get_vectors(body["ids"]).items()}}
+
+    def last_ingest(self, body):
+        return {"stats": self.vs.last_ingest(body["path"])}
+
+    def stats(self):
+        return {"query_cache": self.vs.query_cache_stats(), "micro_batching": self.batcher.stats()}
+
+def make_server(host: str, port: int, max_batch: int, max_wait_ms: float) -> ThreadingHTTPServer:
+    from src import resources, tracing, vectorstore
+
+    batcher = MicroBatcher(lambda qs: list(vectorstore._embed(qs)), max_batch, max_wait_ms)
+    vectorstore.set_query_embedder(batcher.submit)
+    service = _Service(batcher)
+    routes = {"/add": service.add, "/delete": service.delete, "/query": service.query,
+              "/batch_query": service.batch_query, "/embed_query": service.embed_query,
+              "/vectors": service.vectors, "/last_ingest": service.last_ingest}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive avec le client
+
+        def _reply(self, status: int, payload: dict) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"ok": True, "resources": resources.status()})
+            elif self.path == "/stats":
+                self._reply(200, service.stats())
+            elif self.path == "/metrics":
+                data = tracing.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._reply(404, {"error": f"inconnu : {self.path}"})
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._reply(404, {"error": f"inconnu : {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError as e:
+                self._reply(400, {"error": f"JSON invalide : {e}"})
+                return
+            try:
+                self._reply(200, route(body))
+            except (KeyError, TypeError, ValueError, FileNotFoundError) as e:
+                self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, *args):
+            pass  # pas de journal des requêtes : les questions peuvent être sensibles
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv=None) -> int:
+    from src.config import settings
+    parser = argparse.ArgumentParser(prog="python -m src.server",
+                                     description="Service de recherche partagé (index + embeddings).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=settings.server_batch_max)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.server_batch_wait_ms)
+    args = parser.parse_args(argv)
+
+    settings.retrieval_url = None  # ce process possède l'index : jamais en mode client
+    from src import resources
+    resources.warm_up().join()
+    for name, st in resources.status().items():
+        if st["error"]:
+            print(f"{name} : {st['error']}")
+            return 1
+    server = make_server(args.host, args.port, args.max_batch, args.max_wait_ms)
+    print(f"Service de recherche sur http://{args.host}:{args.port} "
+          f"(prêt en {resources.startup_report().get('warm-up (total)', 0):.1f}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
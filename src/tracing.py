@@ -0,0 +1,248 @@
+# src/tracing.py
+"""
+Instrumentation légère du pipeline : spans (durée + attributs, ex. tokens)
+autour de l'embedding, de la recherche, de l'ingestion, du LLM et de
+l'historique.
+
+- par tour de chat : `with tracing.turn() as t:` collecte les spans du tour
+  (détail affiché dans l'expander « Passages utilisés ») ;
+- agrégé : un histogramme de durées par étape, écrit périodiquement dans un
+  journal JSON-lines (TRACE_LOG_PATH, rotation à TRACE_LOG_MAX_MB) et exposé au format texte Prometheus
+  (GET /metrics du service de recherche, ou METRICS_PORT côté Streamlit).
+
+TRACING=0 : span() renvoie un contexte vide partagé, sans horloge ni verrou.
+"""
+from __future__ import annotations
+import json, os, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.config import settings
+
+# bornes des histogrammes, en secondes (convention Prometheus)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class _NullSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+_NOOP = nullcontext(_NullSpan())
+
+class Span:
+    __slots__ = ("name", "attrs", "depth", "t0", "seconds")
+
+    def __init__(self, name: str, attrs: dict, depth: int):
+        self.name, self.attrs, self.depth = name, attrs, depth
+        self.t0 = time.perf_counter()
+        self.seconds = 0.0
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "ms": round(self.seconds * 1000, 2), "depth": self.depth, **self.attrs}
+
+class Turn:
+    """Spans d'un tour de chat, dans leur ordre de début."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Span] = []
+        self.depth = 0
+        self.t0 = time.perf_counter()
+        self.seconds = 0.0
+
+    def breakdown(self) -> List[dict]:
+        return [s.as_dict() for s in self.spans]
+
+    def markdown(self) -> str:
+        """Liste imbriquée des étapes (durée, tokens), puis le total du tour."""
+        lines = []
+        for s in self.spans:
+            tokens = ", ".join(f"{k[7:]} {v}" for k, v in s.attrs.items() if k.startswith("tokens_"))
+            extra = f" · tokens {tokens}" if tokens else ""
+            if s.attrs.get("cached"):
+                extra += " · cache"
+            lines.append(f"{'  ' * s.depth}- {s.name} : {s.seconds * 1000:.1f} ms{extra}")
+        return "\n".join(lines + [f"- **total : {self.seconds * 1000:.0f} ms**"])
+
+_current: ContextVar[Optional[Turn]] = ContextVar("rag_turn", default=None)
+
+# --- Agrégats (tous threads confondus) ---
+_lock = threading.Lock()
+_hist: Dict[str, List[int]] = {}        # étape -> compte par bucket (+Inf en dernier)
+_sums: Dict[str, float] = {}
+_tokens: Dict[tuple, int] = {}          # (étape, type) -> total
+_last_flush = time.monotonic()
+
+def _record(span: Span) -> None:
+    global _last_flush
+    with _lock:
+        counts = _hist.setdefault(span.name, [0] * (len(BUCKETS) + 1))
+        counts[bisect_left(BUCKETS, span.seconds)] += 1
+        _sums[span.name] = _sums.get(span.name, 0.0) + span.seconds
+        for key, value in span.attrs.items():
+            if key.startswith("tokens_") and isinstance(value, int):
+                _tokens[(span.name, key[7:])] = _tokens.get((span.name, key[7:]), 0) + value
+        flush = time.monotonic() - _last_flush >= settings.trace_flush_s
+        if flush:
+            _last_flush = time.monotonic()
+    if flush:
+        _write({"type": "histograms", **snapshot()})
+
+def _write(record: dict) -> None:
+    if not settings.trace_log_path:
+        return
+    record = {"ts": time.time(), **record}
+    path = settings.trace_log_path
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _lock:
+            # rotation par taille : au plus ~2 x TRACE_LOG_MAX_MB sur disque
+            if os.path.exists(path) and os.path.getsize(path) >= settings.trace_log_max_mb * 2**20:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass  # l'instrumentation ne doit jamais casser une requête
+
+@contextmanager
+def _span(name: str, attrs: dict):
+    turn = _current.get()
+    sp = Span(name, attrs, turn.depth if turn else 0)
+    if turn:
+        turn.spans.append(sp)
+        turn.depth += 1
+    try:
+        yield sp
+    finally:
+        sp.seconds = time.perf_counter() - sp.t0
+        if turn:
+            turn.depth -= 1
+        _record(sp)
+
+def span(name: str, **attrs):
+    """`with span("query", k=6) as sp: ... sp.set(tokens_out=...)` ; no-op si TRACING=0."""
+    if not settings.tracing:
+        return _NOOP
+    return _span(name, attrs)
+
+def span_stream(name: str, make: Callable[[object], Iterator], **attrs) -> Iterator:
+    """
+    Span d'un générateur `make(sp)` : seul le temps passé à produire les
+    éléments compte, pas celui de l'appelant entre deux éléments (affichage
+    des tokens d'une réponse en flux).
+    """
+    if not settings.tracing:
+        yield from make(_NullSpan())
+        return
+    turn = _current.get()
+    sp = Span(name, attrs, turn.depth if turn else 0)
+    if turn:
+        turn.spans.append(sp)
+    it = make(sp)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            if turn:
+                turn.depth += 1
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                sp.seconds += time.perf_counter() - t0
+                if turn:
+                    turn.depth -= 1
+            yield item
+    finally:
+        it.close()
+        _record(sp)
+
+def traced(name: str, fn):
+    """Enveloppe `fn(items)` (ex. embedder) : un span par appel, avec la taille du lot."""
+    def _call(items, *args, **kwargs):
+        with span(name, n=len(items)):
+            return fn(items, *args, **kwargs)
+    return _call
+
+@contextmanager
+def turn(name: str = "chat"):
+    """Collecte les spans d'un tour (même thread) ; journalisé en une ligne JSON à la fin."""
+    if not settings.tracing:
+        yield None
+        return
+    t = Turn(name)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        t.seconds = time.perf_counter() - t.t0
+        _current.reset(token)
+        _write({"type": "turn", "name": name, "ms": round(t.seconds * 1000, 2), "spans": t.breakdown()})
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "buckets": list(BUCKETS),
+            "stages": {name: {"counts": list(counts), "count": sum(counts), "sum_s": _sums[name]}
+                       for name, counts in _hist.items()},
+            "tokens": {f"{stage}.{kind}": n for (stage, kind), n in _tokens.items()},
+        }
+
+def reset() -> None:
+    with _lock:
+        _hist.clear()
+        _sums.clear()
+        _tokens.clear()
+
+def prometheus_text() -> str:
+    snap = snapshot()
+    lines = ["# HELP rag_stage_seconds Durée des étapes du pipeline RAG.",
+             "# TYPE rag_stage_seconds histogram"]
+    for name, h in sorted(snap["stages"].items()):
+        cumul = 0
+        for bound, n in zip(list(BUCKETS) + ["+Inf"], h["counts"]):
+            cumul += n
+            lines.append(f'rag_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumul}')
+        lines.append(f'rag_stage_seconds_sum{{stage="{name}"}} {h["sum_s"]:.6f}')
+        lines.append(f'rag_stage_seconds_count{{stage="{name}"}} {h["count"]}')
+    lines += ["# HELP rag_tokens_total Tokens comptés par étape.", "# TYPE rag_tokens_total counter"]
+    for key, n in sorted(snap["tokens"].items()):
+        stage, kind = key.split(".", 1)
+        lines.append(f'rag_tokens_total{{stage="{stage}",kind="{kind}"}} {n}')
+    return "\n".join(lines) + "\n"
+
+_metrics_server = None
+
+def start_metrics_server(port: Optional[int] = None):
+    """Expose GET /metrics sur `port` (METRICS_PORT) ; une seule fois par process, None si désactivé."""
+    global _metrics_server
+    port = settings.metrics_port if port is None else port
+    if not port:
+        return None
+    with _lock:
+        if _metrics_server is None:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = prometheus_text().encode("utf-8") if self.path == "/metrics" else b""
+                    self.send_response(200 if body else 404)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                _metrics_server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            except OSError:
+                return None  # port déjà pris (autre worker Streamlit) : un seul exportateur suffit
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+        return _metrics_server
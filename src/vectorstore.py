@@ -1,92 +1,828 @@
-import os, hashlib
-import streamlit as st
+import copy, itertools, os, hashlib, shutil, threading, time
+from collections import Counter
+import numpy as np
 from qdrant_client import QdrantClient, models
+from src import resources, tracing
 from src.config import settings
-from src.embeddings import get_embedder
-from src.preprocessing import read_any, chunk
+from src.preprocessing import iter_pages, chunk_stream_pages
+from src.lexical import BM25Index, rrf, is_decisive
+from src.dedup import DedupIndex, text_key
+from src.query_cache import TTLCache, normalize_question
+from src.answer_cache import close_answer_cache, invalidate_points
 
 # On réutilise ce dossier pour l'index local Qdrant
 os.makedirs(settings.chroma_dir, exist_ok=True)
 
-@st.cache_resource(show_spinner=False)
 def get_qdrant() -> QdrantClient:
-    # Une seule instance par process Streamlit
-    return QdrantClient(path=settings.chroma_dir)
+    # Une seule instance par process, ouverte au premier usage (ou par le warm-up)
+    return resources.get(resources.QDRANT)
+
+def _embed(texts):
+    return resources.get(resources.EMBEDDER)(texts)
+
+# --- Mode client (RETRIEVAL_URL) ---
+# L'index et le modèle vivent dans le service `python -m src.server` : plusieurs
+# workers Streamlit (et l'ingestion) partagent ainsi un seul index embarqué.
+_remote_local = threading.local()  # une session keep-alive par thread
+
+def _remote(endpoint: str, payload: dict) -> dict:
+    import requests
+    session = getattr(_remote_local, "session", None)
+    if session is None:
+        session = _remote_local.session = requests.Session()
+    url = f"{settings.retrieval_url.rstrip('/')}/{endpoint}"
+    try:
+        r = session.post(url, json=payload, timeout=settings.retrieval_timeout)
+    except requests.RequestException as e:
+        raise resources.ResourceError(f"service de recherche indisponible ({settings.retrieval_url}) : {e}") from e
+    if r.ok:
+        return r.json()
+    # erreur : le corps n'est du JSON que si elle vient du service lui-même (pas d'un proxy)
+    try:
+        detail = r.json().get("error", r.status_code)
+    except ValueError:
+        detail = f"{r.status_code} {r.text[:200]}".strip()
+    if r.status_code >= 500:
+        raise resources.ResourceError(f"service de recherche en erreur ({settings.retrieval_url}) : {detail}")
+    raise RuntimeError(f"service de recherche : {detail}")
 
-_embed = get_embedder()
 _COLLECTION = "legal_docs"
+# Qdrant embarqué n'est pas thread-safe : les accès à l'index sont sérialisés,
+# l'embedding (le plus coûteux) reste parallèle entre workers d'ingestion.
+_index_lock = threading.RLock()
+
+_MIGRATION = _COLLECTION + "_migration"
+# Champs renvoyés avec un hit (pas chunk_hash, inutile à la recherche)
+_HIT_FIELDS = ["source", "filename", "chunk_index", "text", "page_start", "page_end"]
+
+# --- Profil de collection ---
+# Quantification int8 (vecteurs originaux sur disque, version quantifiée en RAM),
+# HNSW paramétrable, index keyword sur les champs filtrés (suppression par
+# source). Qdrant embarqué ne garde que on_disk (recherche exacte en mémoire) :
+# le profil prend tout son effet avec un serveur (QDRANT_URL).
+
+def _quantization():
+    if settings.qdrant_quantization != "int8":
+        return None
+    return models.ScalarQuantization(
+        scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+    )
+
+def _search_params() -> models.SearchParams:
+    quant = None
+    if settings.qdrant_quantization == "int8":
+        quant = models.QuantizationSearchParams(rescore=settings.qdrant_rescore,
+                                                oversampling=settings.qdrant_oversampling)
+    return models.SearchParams(hnsw_ef=settings.qdrant_search_ef, quantization=quant)
+
+def _create_collection(name: str, dim: int) -> None:
+    client = get_qdrant()
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE,
+                                           on_disk=settings.qdrant_on_disk),
+        hnsw_config=models.HnswConfigDiff(m=settings.qdrant_hnsw_m,
+                                          ef_construct=settings.qdrant_hnsw_ef_construct),
+        quantization_config=_quantization(),
+        on_disk_payload=settings.qdrant_on_disk,
+    )
+    if settings.qdrant_url:  # sans effet (et signalé par un warning) en mode embarqué
+        for field in filter(None, settings.qdrant_payload_indexes):
+            client.create_payload_index(name, field.strip(), field_schema=models.PayloadSchemaType.KEYWORD)
 
 def _ensure_collection(dim: int):
+    if not get_qdrant().collection_exists(_COLLECTION):
+        _create_collection(_COLLECTION, dim)
+
+def profile_drift(info=None) -> list:
+    """Écarts entre la collection existante et le profil configuré (liste vide = à jour)."""
+    if settings.vector_backend == "numpy":
+        return []  # pas de profil : le type de stockage est fixé à la création (NPSTORE_DTYPE)
     client = get_qdrant()
-    try:
-        client.get_collection(_COLLECTION)
-    except Exception:
-        client.create_collection(
-            collection_name=_COLLECTION,
-            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
-        )
-
-def _doc_id(path:str, chunk_index:int)->int:
-    h = hashlib.sha256(f"{path}-{chunk_index}".encode()).hexdigest()
-    return int(h[:16], 16)
+    if info is None:
+        if not client.collection_exists(_COLLECTION):
+            return []
+        info = client.get_collection(_COLLECTION)
+    cfg, vec = info.config, info.config.params.vectors
+    checks = [("on_disk", bool(vec.on_disk), settings.qdrant_on_disk)]
+    if settings.qdrant_url:
+        # le mode embarqué (recherche exacte) ne conserve ni HNSW, ni quantification, ni index de payload
+        quant = cfg.quantization_config or vec.quantization_config
+        checks += [
+            ("hnsw_m", cfg.hnsw_config.m, settings.qdrant_hnsw_m),
+            ("hnsw_ef_construct", cfg.hnsw_config.ef_construct, settings.qdrant_hnsw_ef_construct),
+            ("quantization", "int8" if quant else "none", settings.qdrant_quantization),
+            ("payload_indexes", sorted(info.payload_schema or {}),
+             sorted(f.strip() for f in settings.qdrant_payload_indexes if f.strip())),
+        ]
+    return [f"{name}: {have} -> {want}" for name, have, want in checks if have != want]
 
-def add_path(path: str):
-    text = read_any(path)
-    chunks = list(chunk(text, settings.chunk_size, settings.chunk_overlap))
-    if not chunks:
-        return 0, 0
-    # calc dim
-    dim = len(_embed([chunks[0]])[0])
-    _ensure_collection(dim)
-    vectors = _embed(chunks)
-    fname = os.path.basename(path)
-    points = [
-        models.PointStruct(
-            id=_doc_id(path, i),
-            vector=v,
-            payload={"source": path, "filename": fname, "chunk_index": i, "text": t},
-        )
-        for i, (v,t) in enumerate(zip(vectors, chunks))
-    ]
+def _copy_points(src: str, dst: str) -> int:
+    client, offset, n = get_qdrant(), None, 0
+    while True:
+        pts, offset = client.scroll(collection_name=src, limit=512, offset=offset,
+                                    with_payload=True, with_vectors=True)
+        if pts:
+            client.upsert(collection_name=dst, wait=True, points=[
+                models.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in pts
+            ])
+            n += len(pts)
+        if offset is None:
+            return n
+
+def migrate_collection(force: bool = False) -> dict:
+    """
+    Reconstruit la collection sous le profil courant (copie vers une
+    collection temporaire, recréation, recopie). Les ids sont conservés :
+    index BM25 et cache de réponses restent valides. Une migration
+    interrompue reprend là où elle s'était arrêtée. Sans objet pour le backend numpy.
+    """
+    if settings.vector_backend == "numpy":
+        return {"points": 0, "changes": []}
     client = get_qdrant()
-    client.upsert(collection_name=_COLLECTION, points=points)
-    return len(chunks), len(text)
+    with _index_lock:
+        has_main = client.collection_exists(_COLLECTION)
+        if client.collection_exists(_MIGRATION):
+            n_tmp = client.count(_MIGRATION, exact=True).count
+            if not has_main or client.count(_COLLECTION, exact=True).count < n_tmp:
+                # interrompue pendant la recopie : la copie temporaire fait foi
+                dim = client.get_collection(_MIGRATION).config.params.vectors.size
+                if has_main:
+                    client.delete_collection(_COLLECTION)
+                _create_collection(_COLLECTION, dim)
+                n = _copy_points(_MIGRATION, _COLLECTION)
+                client.delete_collection(_MIGRATION)
+                _bump_version()
+                return {"points": n, "changes": ["reprise d'une migration interrompue"]}
+            client.delete_collection(_MIGRATION)  # copie partielle d'une tentative précédente
+        if not has_main:
+            return {"points": 0, "changes": []}
+        info = client.get_collection(_COLLECTION)
+        changes = profile_drift(info)
+        if not changes and not force:
+            return {"points": 0, "changes": []}
+        dim = info.config.params.vectors.size
+        _create_collection(_MIGRATION, dim)
+        _copy_points(_COLLECTION, _MIGRATION)
+        client.delete_collection(_COLLECTION)
+        _create_collection(_COLLECTION, dim)
+        n = _copy_points(_MIGRATION, _COLLECTION)
+        client.delete_collection(_MIGRATION)
+    _bump_version()
+    return {"points": n, "changes": changes}
 
-def delete_by_source(source_path: str):
+# --- Ré-embedding (EMBED_DIM, changement de modèle) ---
+
+def _pages(batch_size: int):
+    """(ids, payloads complets) de tout l'index, par paquets."""
+    it = iter(_store().scan())
+    while True:
+        page = list(itertools.islice(it, batch_size))
+        if not page:
+            return
+        yield [pid for pid, _ in page], [pl for _, pl in page]
+
+def _fit_projection(model: str):
+    """ACP ajustée sur les vecteurs pleine largeur d'un échantillon des chunks indexés (cache disque)."""
+    from src.embeddings import get_embedder
+    from src.projection import PCAProjection
+    full = get_embedder(reduce=False)
+    texts = [pl.get("text", "") for _, pl in itertools.islice(_store().scan(["text"]), settings.embed_pca_sample)]
+    vectors = np.concatenate([full(texts[i:i + 256]) for i in range(0, len(texts), 256)])
+    return PCAProjection.fit(vectors, settings.embed_dim, model), full
+
+def reembed(batch_size: int = 256, on_progress=None) -> dict:
+    """
+    Ré-embedde tout l'index avec l'embedder configuré (EMBED_DIM, modèle)
+    dans un index temporaire, substitué à la fin. Modèle local (ou OpenAI
+    sans `dimensions`) : la projection ACP est d'abord ajustée sur les
+    chunks indexés, puis enregistrée une fois l'index remplacé. Ids et
+    payloads sont conservés (BM25, doublons et cache de réponses restent
+    valides). Une copie Qdrant interrompue reprend avec `migrate`.
+    """
+    if settings.retrieval_url:
+        raise RuntimeError("ré-embedding à lancer sur la machine du service de recherche")
+    from src.embeddings import get_embedder, pca_model
+    with _index_lock:
+        total = _store().count()
+        if not total:
+            return {"points": 0, "dim": None}
+        proj, model = None, pca_model()
+        if model:
+            proj, full = _fit_projection(model)
+            embed = proj.wrap(full)
+        else:
+            embed = get_embedder()
+        done = 0
+
+        def _batches():
+            nonlocal done
+            for ids, payloads in _pages(batch_size):
+                vectors = embed([pl.get("text", "") for pl in payloads])
+                yield ids, vectors, payloads
+                done += len(ids)
+                if on_progress:
+                    on_progress(done, total)
+
+        dim = _reembed_numpy(_batches()) if settings.vector_backend == "numpy" else _reembed_qdrant(_batches())
+        if proj is not None:
+            proj.save(settings.embed_pca_path)
+        resources.reset(resources.EMBEDDER)  # questions embeddées comme les chunks
+        clear_query_caches()
+    _bump_version()
+    return {"points": done, "dim": dim}
+
+def _reembed_numpy(batches) -> int:
+    from src.npstore import NumpyStore
+    path = os.path.abspath(settings.npstore_dir)
+    tmp_path = path + ".reembed"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp = NumpyStore(tmp_path, settings.npstore_dtype)
+    for ids, vectors, payloads in batches:
+        tmp.upsert(ids, vectors, payloads)
+    dim = tmp.dim
+    tmp.close()
+    resources.reset(resources.NPSTORE)
+    os.replace(path, path + ".old")
+    os.replace(tmp_path, path)
+    shutil.rmtree(path + ".old", ignore_errors=True)
+    return dim
+
+def _reembed_qdrant(batches) -> int:
     client = get_qdrant()
-    client.delete(
-        collection_name=_COLLECTION,
-        points_selector=models.FilterSelector(
-            filter=models.Filter(
-                must=[models.FieldCondition(
-                    key="source", match=models.MatchValue(value=source_path)
-                )]
-            )
-        ),
+    if client.collection_exists(_MIGRATION):
+        raise RuntimeError("migration interrompue : lancer d'abord `python -m src.vectorstore migrate`")
+    dim = None
+    for ids, vectors, payloads in batches:
+        if dim is None:
+            dim = vectors.shape[1]
+            _create_collection(_MIGRATION, dim)
+        client.upload_collection(collection_name=_MIGRATION, vectors=vectors, ids=ids, payload=payloads, wait=True)
+    client.delete_collection(_COLLECTION)
+    _create_collection(_COLLECTION, dim)
+    _copy_points(_MIGRATION, _COLLECTION)
+    client.delete_collection(_MIGRATION)
+    return dim
+
+# --- Backends ---
+# Même interface pour Qdrant et pour la matrice NumPy mappée (src/npstore.py) :
+# ensure / count / upsert / delete_ids / delete_source / source_payloads /
+# scan / payloads / vectors / search_batch. Les appels passent sous _index_lock.
+
+class _QdrantBackend:
+    def ensure(self, dim: int) -> None:
+        _ensure_collection(dim)
+
+    def count(self) -> int:
+        client = get_qdrant()
+        if not client.collection_exists(_COLLECTION):
+            return 0
+        return client.count(_COLLECTION, exact=True).count
+
+    def upsert(self, ids, vectors, payloads) -> None:
+        self.ensure(vectors.shape[1])
+        # matrice float32 transmise telle quelle (pas d'aller-retour en listes Python)
+        get_qdrant().upload_collection(collection_name=_COLLECTION, vectors=vectors,
+                                       ids=list(ids), payload=list(payloads), wait=True)
+
+    def delete_ids(self, ids) -> None:
+        get_qdrant().delete(collection_name=_COLLECTION,
+                            points_selector=models.PointIdsList(points=list(ids)))
+
+    def delete_source(self, source: str) -> None:
+        if get_qdrant().collection_exists(_COLLECTION):
+            get_qdrant().delete(collection_name=_COLLECTION,
+                                points_selector=models.FilterSelector(filter=_source_filter(source)))
+
+    def _scroll(self, fields, flt=None):
+        client, offset = get_qdrant(), None
+        if not client.collection_exists(_COLLECTION):
+            return
+        while True:
+            pts, offset = client.scroll(collection_name=_COLLECTION, scroll_filter=flt, limit=1024,
+                                        offset=offset, with_payload=fields, with_vectors=False)
+            for p in pts:
+                yield p.id, p.payload or {}
+            if offset is None:
+                return
+
+    def source_payloads(self, source: str, fields=None) -> dict:
+        return dict(self._scroll(fields or True, _source_filter(source)))
+
+    def scan(self, fields=None):
+        return self._scroll(fields or True)
+
+    def payloads(self, ids, fields=None) -> dict:
+        pts = get_qdrant().retrieve(collection_name=_COLLECTION, ids=list(ids),
+                                    with_payload=fields or True, with_vectors=False)
+        return {p.id: p.payload or {} for p in pts}
+
+    def vectors(self, ids) -> dict:
+        pts = get_qdrant().retrieve(collection_name=_COLLECTION, ids=list(ids),
+                                    with_payload=False, with_vectors=True)
+        return {p.id: np.asarray(p.vector, dtype=np.float32) for p in pts if p.vector is not None}
+
+    def search_batch(self, queries, limit: int) -> list:
+        client = get_qdrant()
+        if not client.collection_exists(_COLLECTION):
+            return [[] for _ in queries]
+        res = client.search_batch(collection_name=_COLLECTION, requests=[
+            models.SearchRequest(vector=np.asarray(q, dtype=np.float32).tolist(), limit=limit, with_payload=False,
+                                 params=_search_params())
+            for q in queries
+        ])
+        return [[(r.id, r.score) for r in hits] for hits in res]
+
+    def search(self, query, limit: int) -> list:
+        return self.search_batch([query], limit)[0]
+
+_qdrant_backend = _QdrantBackend()
+
+def _store():
+    """Backend vectoriel configuré (VECTOR_BACKEND)."""
+    if settings.vector_backend == "numpy":
+        return resources.get(resources.NPSTORE)
+    return _qdrant_backend
+
+_lexical = None
+_dedup = None
+
+# --- Caches de requêtes ---
+# Les résultats sont indexés par la version de l'index : toute écriture
+# (add_path, delete_by_source) l'incrémente, donc aucun résultat périmé.
+_index_version = 0
+_qvec_cache = TTLCache(settings.query_cache_size, settings.query_cache_ttl_s)
+_results_cache = TTLCache(settings.query_cache_size, settings.query_cache_ttl_s)
+
+def _bump_version() -> None:
+    global _index_version
+    with _index_lock:
+        _index_version += 1
+
+def index_version() -> int:
+    return _index_version
+
+def clear_query_caches() -> None:
+    _qvec_cache.clear()
+    _results_cache.clear()
+
+def query_cache_stats() -> dict:
+    if settings.retrieval_url:
+        import requests
+        try:
+            return requests.get(f"{settings.retrieval_url.rstrip('/')}/stats", timeout=5).json()["query_cache"]
+        except (requests.RequestException, ValueError, KeyError):
+            return {"embeddings": {"hit_rate": 0.0}, "results": {"hit_rate": 0.0}, "index_version": None}
+    return {"embeddings": _qvec_cache.stats(), "results": _results_cache.stats(),
+            "index_version": _index_version}
+
+_query_embedder = None
+
+def set_query_embedder(fn) -> None:
+    """Remplace l'embedding unitaire des questions (le service y branche son micro-batching)."""
+    global _query_embedder
+    _query_embedder = fn
+
+def embed_query(q: str):
+    """Embedding d'une question (mis en cache : le modèle ne change pas avec l'index)."""
+    key = normalize_question(q)
+    vec = _qvec_cache.get(key)
+    if vec is None:
+        if settings.retrieval_url:
+            vec = np.asarray(_remote("embed_query", {"q": q})["vector"], dtype=np.float32)
+        elif _query_embedder is not None:
+            vec = _query_embedder(q)
+        else:
+            vec = _embed([q])[0]
+        _qvec_cache.put(key, vec)
+    return vec
+
+def cached_query_vector(q: str):
+    """Embedding de la question s'il a déjà été calculé (par la recherche), sinon None : jamais d'appel au modèle."""
+    return _qvec_cache.get(normalize_question(q))
+
+def embed_queries(questions) -> np.ndarray:
+    """Embeddings de plusieurs questions : un seul appel au modèle pour celles absentes du cache."""
+    keys = [normalize_question(q) for q in questions]
+    vecs = [_qvec_cache.get(key) for key in keys]
+    todo = [i for i, v in enumerate(vecs) if v is None]
+    if todo:
+        for i, vec in zip(todo, _embed([questions[i] for i in todo])):
+            vecs[i] = vec
+            _qvec_cache.put(keys[i], vec)
+    return np.stack(vecs) if vecs else np.empty((0, 0), dtype=np.float32)
+
+def get_lexical() -> BM25Index:
+    """Index BM25 du process ; reconstruit depuis l'index vectoriel s'il est vide alors que celui-ci ne l'est pas."""
+    global _lexical
+    with _index_lock:
+        if _lexical is None:
+            index = BM25Index(settings.lexical_index_path)
+            if not len(index) and _store().count():
+                _rebuild_lexical(index)
+            _lexical = index
+        return _lexical
+
+def get_dedup() -> DedupIndex:
+    """Clés de texte des chunks indexés et alias des doublons (src/dedup.py)."""
+    global _dedup
+    with _index_lock:
+        if _dedup is None:
+            _dedup = DedupIndex(settings.dedup_index_path)
+        return _dedup
+
+def _forget(pids) -> None:
+    """
+    Avant de supprimer ou de réécrire des chunks : ils sortent de l'index des
+    doublons, et un canonique qui avait des alias est remplacé par le premier
+    d'entre eux, avec son propre texte ré-embeddé ; les autres alias le
+    suivent. Sous _index_lock.
+    """
+    dedup = get_dedup()
+    dedup.remove(pids)
+    groups = dedup.aliases(pids)
+    if not groups:
+        return
+    texts = _store().payloads(list(groups), ["text"])
+    ids, payloads = [], []
+    for old, rows in groups.items():
+        if old not in texts:
+            continue
+        head = rows[0]
+        dedup.promote(old, head)
+        # alias enregistré sans son texte (base antérieure) : texte du canonique,
+        # sans chunk_hash pour que la prochaine ingestion de sa source le refasse
+        text, chunk_hash = ((head["text"], head["chunk_hash"]) if head["text"] is not None
+                            else (texts[old].get("text", ""), None))
+        ids.append(head["id"])
+        payloads.append(_chunk_payload(head["source"], head["filename"], head["chunk_index"], chunk_hash,
+                                       text, head["page_start"], head["page_end"]))
+    if ids:
+        _store().upsert(ids, _embed([pl["text"] for pl in payloads]), payloads)
+        get_lexical().add((pid, pl["source"], pl["text"]) for pid, pl in zip(ids, payloads))
+
+def _rebuild_lexical(index: BM25Index) -> None:
+    index.clear()
+    index.add((pid, pl.get("source", ""), pl.get("text", "")) for pid, pl in _store().scan(["source", "text"]))
+
+def _doc_id(path: str, chunk_hash: str, occurrence: int = 0) -> int:
+    """
+    Id d'un chunk d'après son texte (n-ième occurrence de ce texte dans le
+    fichier) et non son rang : un chunk décalé par une insertion garde son point.
+    """
+    h = hashlib.sha256(f"{path}-{chunk_hash}-{occurrence}".encode()).hexdigest()
+    return int(h[:16], 16)
+
+def _chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+def _source_filter(source_path: str) -> models.Filter:
+    return models.Filter(
+        must=[models.FieldCondition(key="source", match=models.MatchValue(value=source_path))]
     )
+
+def _indexed_chunks(source_path: str) -> dict:
+    """
+    id -> (chunk_index, page_start, page_end) des chunks déjà indexés pour ce
+    fichier (sans les vecteurs), doublons compris.
+    """
+    fields = ["chunk_index", "page_start", "page_end"]
+    out = {pid: tuple(pl.get(f) for f in fields) for pid, pl in _store().source_payloads(source_path, fields).items()}
+    out.update(get_dedup().source_aliases(source_path))
+    return out
+
+# Bilan de la dernière ingestion par fichier (affiché dans la page de gestion)
+_ingest_stats: dict = {}
+
+def last_ingest(path: str) -> dict:
+    if settings.retrieval_url:
+        return _remote("last_ingest", {"path": path})["stats"]
+    return _ingest_stats.get(path, {})
+
+def _chunk_payload(path: str, fname: str, index: int, chunk_hash: str, text: str,
+                   page_start, page_end) -> dict:
+    payload = {"source": path, "filename": fname, "chunk_index": index, "chunk_hash": chunk_hash, "text": text}
+    if page_start is not None:  # PDF : pages citables
+        payload.update(page_start=page_start, page_end=page_end)
+    return payload
+
+def _move(ids: list, payloads: list) -> None:
+    """
+    Chunks au texte inchangé mais déplacés dans leur fichier (rang, pages) :
+    payload réécrit avec le vecteur déjà indexé, sans ré-embedding ; pour
+    les doublons, seul l'alias est mis à jour.
+    """
+    with _index_lock:
+        vectors = _store().vectors(ids)
+        kept = [(pid, pl) for pid, pl in zip(ids, payloads) if pid in vectors]
+        if kept:
+            _store().upsert([pid for pid, _ in kept], np.stack([vectors[pid] for pid, _ in kept]),
+                            [pl for _, pl in kept])
+        get_dedup().move((pid, pl["chunk_index"], pl.get("page_start"), pl.get("page_end"))
+                         for pid, pl in zip(ids, payloads) if pid not in vectors)
+    # les réponses en cache citent le rang et les pages
+    invalidate_points(ids)
+
+def _upsert_batch(path: str, fname: str, start: int, batch: list, existing: dict, seen: Counter) -> tuple:
+    """
+    Embedde et indexe les chunks nouveaux d'un batch de (texte, première
+    page, dernière page) ; un chunk dont le texte est déjà indexé garde son
+    point (voir _doc_id), même s'il a changé de rang. Un doublon d'un chunk
+    déjà indexé (DEDUP, même texte normalisé) n'est pas embeddé : il devient
+    un alias de ce chunk. `seen` compte les textes déjà vus dans le fichier.
+    Renvoie (nb embeddés, nb doublons, nb déplacés, secondes).
+    """
+    hashes = [_chunk_hash(t) for t, _, _ in batch]
+    ids = []
+    for h in hashes:
+        ids.append(_doc_id(path, h, seen[h]))
+        seen[h] += 1
+    todo = [j for j in range(len(batch)) if ids[j] not in existing]
+    moved = [j for j in range(len(batch)) if ids[j] in existing and existing[ids[j]] != (start + j, *batch[j][1:])]
+    if moved:
+        _move([ids[j] for j in moved], [_chunk_payload(path, fname, start + j, hashes[j], *batch[j]) for j in moved])
+    if not todo:
+        return 0, 0, len(moved), 0.0
+    norms = {j: text_key(batch[j][0]) for j in todo} if settings.dedup else {}
+    dups = {}  # j -> id du canonique
+    with _index_lock:
+        local = {}  # canoniques de ce batch, pas encore enregistrés : clé du texte -> id
+        for j in norms:
+            canon = get_dedup().find(norms[j])
+            if canon is None:
+                canon = local.get(norms[j])
+            if canon is None:
+                local[norms[j]] = ids[j]
+            else:
+                dups[j] = canon
+    new = [j for j in todo if j not in dups]
+    t0 = time.perf_counter()
+    vectors = _embed([batch[j][0] for j in new]) if new else None
+    embed_s = time.perf_counter() - t0
+    with _index_lock:
+        if new:
+            _store().upsert(
+                [ids[j] for j in new],
+                vectors,
+                [_chunk_payload(path, fname, start + j, hashes[j], *batch[j]) for j in new],
+            )
+            get_lexical().add((ids[j], path, batch[j][0]) for j in new)
+        if norms:
+            get_dedup().add_canonical((ids[j], norms[j]) for j in new)
+            get_dedup().add_aliases(
+                {"id": ids[j], "canon": canon, "source": path, "filename": fname,
+                 "chunk_index": start + j, "chunk_hash": hashes[j], "page_start": batch[j][1],
+                 "page_end": batch[j][2], "norm": norms[j], "text": batch[j][0]} for j, canon in dups.items())
+    # les réponses en cache qui citaient un canonique qui gagne une source sont périmées
+    invalidate_points(list(set(dups.values())))
+    return len(new), len(dups), len(moved), embed_s
+
+def add_path(path: str, on_progress=None):
+    """
+    Indexe (ou ré-indexe) un fichier de façon incrémentale et en flux :
+    le texte est lu et découpé au fil de l'eau, puis embeddé/indexé par
+    batches de `ingest_batch_size` chunks (mémoire constante). Seuls les
+    chunks nouveaux ou modifiés sont embeddés ; les chunks orphelins d'une
+    version précédente sont supprimés en un seul appel à la fin.
+    `on_progress(done, total)` est appelé après chaque batch (total estimé
+    d'après la taille du fichier tant que la lecture n'est pas finie).
+    En mode client, le chemin doit être lisible par le service (même machine,
+    même répertoire de travail : il sert d'identifiant de source).
+    """
+    with tracing.span("add_path") as sp:
+        n_chunks, n_chars = _add_path(path, on_progress)
+        sp.set(chunks=n_chunks, embedded=_ingest_stats.get(path, {}).get("embedded"))
+    return n_chunks, n_chars
+
+def _add_path(path: str, on_progress=None):
+    if settings.retrieval_url:
+        out = _remote("add", {"path": path})
+        if on_progress:
+            on_progress(out["chunks"], out["chunks"])
+        return out["chunks"], out["chars"]
+    with _index_lock:
+        existing = _indexed_chunks(path)
+    fname = os.path.basename(path)
+    file_size = max(os.path.getsize(path), 1)
+    n_chars = 0
+
+    def _segments():
+        nonlocal n_chars
+        for page, seg in iter_pages(path, pdf_workers=settings.pdf_workers,
+                                    pdf_pages_per_task=settings.pdf_pages_per_task):
+            n_chars += len(seg)
+            yield page, seg
+
+    n_chunks = embedded = duplicates = moved = 0
+    embed_s = 0.0
+    batch, seen = [], Counter()
+    for ch in chunk_stream_pages(_segments(), settings.chunk_size, settings.chunk_overlap):
+        batch.append(ch)
+        if len(batch) >= settings.ingest_batch_size:
+            n, d, m, dt = _upsert_batch(path, fname, n_chunks, batch, existing, seen)
+            embedded, duplicates, moved, embed_s = embedded + n, duplicates + d, moved + m, embed_s + dt
+            n_chunks += len(batch)
+            batch = []
+            if on_progress:
+                on_progress(n_chunks, max(n_chunks, int(n_chunks * file_size / max(n_chars, 1))))
+    if batch:
+        n, d, m, dt = _upsert_batch(path, fname, n_chunks, batch, existing, seen)
+        embedded, duplicates, moved, embed_s = embedded + n, duplicates + d, moved + m, embed_s + dt
+        n_chunks += len(batch)
+
+    keep = {_doc_id(path, h, i) for h, count in seen.items() for i in range(count)}
+    orphans = [pid for pid in existing if pid not in keep]
+    if orphans:
+        with _index_lock:
+            _forget(orphans)
+            _store().delete_ids(orphans)
+            get_lexical().remove(orphans)
+        invalidate_points(orphans)
+    if embedded or duplicates or moved or orphans:
+        _bump_version()
+    if on_progress:
+        on_progress(n_chunks, n_chunks)
+    with _index_lock:
+        index_points = _store().count()
+        totals = get_dedup().stats()
+    _ingest_stats[path] = {
+        "chunks": n_chunks,
+        "embedded": embedded,
+        "duplicates": duplicates,
+        "unchanged": n_chunks - embedded - duplicates,  # déplacés compris
+        "moved": moved,
+        "deleted": len(orphans),
+        "chunks_per_s": (embedded / embed_s) if embed_s else 0.0,
+        "dedup_ratio": duplicates / n_chunks if n_chunks else 0.0,
+        "index_points": index_points,
+        "index_dedup_ratio": totals["dedup_ratio"],
+    }
+    return n_chunks, n_chars
+
+def delete_by_source(source_path: str):
+    if settings.retrieval_url:
+        return _remote("delete", {"source": source_path})["ok"]
+    with _index_lock:
+        indexed = _indexed_chunks(source_path)
+        invalidate_points(indexed)
+        _forget(list(indexed))
+        _store().delete_source(source_path)
+        get_lexical().remove_source(source_path)
+    _bump_version()
+    _ingest_stats.pop(source_path, None)
     return True
 
+def _to_hit(pid, payload, score, retrieval: str) -> dict:
+    pl = payload or {}
+    return {
+        "id": pid,
+        "text": pl.get("text", ""),
+        "meta": {
+            "source": pl.get("source"),
+            "filename": pl.get("filename"),
+            "chunk_index": pl.get("chunk_index", 0),
+            "page_start": pl.get("page_start"),
+            "page_end": pl.get("page_end"),
+            "score": score,
+            "retrieval": retrieval,
+        }
+    }
+
+def _payloads(ids) -> dict:
+    if not ids:
+        return {}
+    return _store().payloads(ids, _HIT_FIELDS)
+
+def _cited(pl: dict) -> dict:
+    return {"source": pl.get("source"), "filename": pl.get("filename"), "chunk_index": pl.get("chunk_index", 0),
+            "page_start": pl.get("page_start"), "page_end": pl.get("page_end")}
+
+def _expand_sources(hits: list, aliases: dict) -> None:
+    """meta["sources"] : toutes les sources d'un passage (le chunk indexé puis ses doublons)."""
+    for h in hits:
+        h["meta"]["sources"] = [_cited(h["meta"])] + [_cited(a) for a in aliases.get(h["id"], [])]
+
+def get_vectors(ids) -> dict:
+    """Vecteurs indexés (id -> np.ndarray float32), pour le reranking MMR."""
+    if not ids:
+        return {}
+    if settings.retrieval_url:
+        vecs = _remote("vectors", {"ids": list(ids)})["vectors"]
+        return {int(pid): np.asarray(v, dtype=np.float32) for pid, v in vecs.items()}
+    with _index_lock:
+        return _store().vectors(ids)
+
 def query(q: str, k: int):
-    qvec = _embed([q])[0]
-    _ensure_collection(len(qvec))
-    client = get_qdrant()
-    res = client.search(
-        collection_name=_COLLECTION,
-        query_vector=qvec,
-        limit=k,
-        with_payload=True,
-    )
-    hits = []
-    for r in res:
-        pl = r.payload or {}
-        hits.append({
-            "id": r.id,
-            "text": pl.get("text", ""),
-            "meta": {
-                "source": pl.get("source"),
-                "filename": pl.get("filename"),
-                "chunk_index": pl.get("chunk_index", 0),
-                "score": r.score,
-            }
-        })
-    return hits
\ No newline at end of file
+    """
+    Recherche hybride : BM25 + dense, fusionnées par Reciprocal Rank Fusion.
+    Si le score lexical est décisif (référence exacte), la question n'est
+    même pas embeddée. Résultats mis en cache par (question, k, version de l'index).
+    En mode client, la recherche (et son cache) est faite par le service.
+    """
+    with tracing.span("query", k=k) as sp:
+        if settings.retrieval_url:
+            return _remote("query", {"q": q, "k": k})["hits"]
+        key = (normalize_question(q), k, _index_version)
+        hits = _results_cache.get(key)
+        sp.set(cached=hits is not None)
+        if hits is None:
+            hits = _search(q, k)
+            _results_cache.put(key, hits)
+        return copy.deepcopy(hits)
+
+def query_many(questions, k: int) -> list:
+    """
+    Même résultat que [query(q, k) for q in questions], en un seul appel
+    d'embedding (questions hors cache) et une seule recherche vectorielle
+    par lot. Pour les évaluations et les traitements en masse.
+    """
+    questions = list(questions)
+    with tracing.span("query_many", k=k, n=len(questions)):
+        if settings.retrieval_url:
+            return _remote("batch_query", {"questions": questions, "k": k})["hits"]
+        keys = [(normalize_question(q), k, _index_version) for q in questions]
+        out = [_results_cache.get(key) for key in keys]
+        todo = [i for i, hits in enumerate(out) if hits is None]
+        if todo:
+            found = _search_many([questions[i] for i in todo], k, embed_queries)
+            for i, hits in zip(todo, found):
+                _results_cache.put(keys[i], hits)
+                out[i] = hits
+        return copy.deepcopy(out)
+
+def _search(q: str, k: int):
+    # embed_query : cache + micro-batching du service pour les questions unitaires
+    return _search_many([q], k, lambda qs: [embed_query(qs[0])])[0]
+
+def _search_many(questions: list, k: int, embed) -> list:
+    n_cand = max(k, settings.hybrid_candidates)
+    with tracing.span("lexical", n=len(questions)):
+        lexes = [get_lexical().search(q, n_cand) if settings.hybrid_search else [] for q in questions]
+    ranked = [(lex[:k], "lexical") if is_decisive(q, lex, settings.lexical_decisive_ratio, min_results=k)
+              else None for q, lex in zip(questions, lexes)]
+    dense = [i for i, r in enumerate(ranked) if r is None]
+    if dense:
+        # une référence citée et décisive dispense d'embedder la question ; sinon fusion avec le dense
+        qvecs = embed([questions[i] for i in dense])
+        with tracing.span("vector_search", n=len(dense)), _index_lock:
+            # seuls les ids servent à la fusion : le texte n'est lu que pour le top-k final
+            results = _store().search_batch(qvecs, n_cand if any(lexes[i] for i in dense) else k)
+        for i, res in zip(dense, results):
+            if lexes[i]:
+                ranked[i] = (rrf([[pid for pid, _ in res], [pid for pid, _ in lexes[i]]], k=settings.rrf_k)[:k],
+                             "hybrid")
+            else:
+                ranked[i] = (res[:k], "dense")
+    with _index_lock:
+        payloads = _payloads({pid for top, _ in ranked for pid, _ in top})
+        aliases = get_dedup().aliases(list(payloads))
+    out = [[_to_hit(pid, payloads[pid], score, kind) for pid, score in top if pid in payloads]
+           for top, kind in ranked]
+    for hits in out:
+        _expand_sources(hits, aliases)
+    return out
+
+def close() -> None:
+    """
+    Ferme l'index du process (client Qdrant ou mmap, BM25, doublons) et le
+    cache de réponses qui cite ses points ; rouverts au prochain accès avec
+    les réglages courants.
+    """
+    global _lexical, _dedup
+    close_answer_cache()
+    with _index_lock:
+        resources.reset(resources.QDRANT)
+        resources.reset(resources.NPSTORE)
+        if _lexical is not None:
+            _lexical.close()
+            _lexical = None
+        if _dedup is not None:
+            _dedup.close()
+            _dedup = None
+    _bump_version()
+
+def main(argv=None) -> int:
+    import argparse, sys
+    parser = argparse.ArgumentParser(prog="python -m src.vectorstore",
+                                     description="Migration de la collection vers le profil configuré, "
+                                                 "ou ré-embedding de tout l'index (EMBED_DIM, modèle).")
+    parser.add_argument("command", choices=["migrate", "reembed"])
+    parser.add_argument("--force", action="store_true", help="reconstruire même sans écart de profil")
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    if args.command == "reembed":
+        out = reembed(on_progress=lambda done, total: print(f"\r{done}/{total} chunks", end="", file=sys.stderr,
+                                                            flush=True))
+        print(f"\r{out['points']} chunks ré-embeddés (dimension {out['dim']}) en {time.perf_counter() - t0:.1f}s")
+        return 0
+    out = migrate_collection(force=args.force)
+    if not out["changes"] and not args.force:
+        print("Collection déjà conforme au profil.")
+        return 0
+    for change in out["changes"]:
+        print(f"- {change}")
+    print(f"{out['points']} points recopiés en {time.perf_counter() - t0:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
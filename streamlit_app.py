@@ -1,10 +1,18 @@
 import streamlit as st
+from src import resources
+from src.config import settings
 from src.security import gated_access
 
 st.set_page_config(page_title="Legal RAG PoC", page_icon="⚖️", layout="wide")
+# modèle d'embeddings et client Qdrant chargés en tâche de fond pendant que l'utilisateur se connecte
+if settings.warmup_on_boot:
+    resources.warm_up()
 gated_access()
 st.title("⚖️ Legal RAG – PoC")
 st.caption("Chat interne sécurisé basé sur vos documents anonymisés.")
 
 st.page_link("pages/1_Chat.py", label="💬 Interface Chatbot", icon="💬")
-st.page_link("pages/2_Gestion_des_documents.py", label="🗂️ Gestion des documents", icon="🗂️")
\ No newline at end of file
+st.page_link("pages/2_Gestion_des_documents.py", label="🗂️ Gestion des documents", icon="🗂️")
+
+with st.sidebar:
+    resources.render_readiness()
@@ -2,4 +2,27 @@
 import sys, os
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
-    sys.path.insert(0, ROOT)
\ No newline at end of file
+    sys.path.insert(0, ROOT)
+
+import pytest
+
+@pytest.fixture
+def tmp_index(tmp_path, monkeypatch):
+    """
+    Index propre au test (Qdrant embarqué ou mmap, BM25, doublons, ACP, cache
+    de réponses) sous tmp_path/index : ni ./data ni un serveur QDRANT_URL ne
+    sont touchés. Les réglages lus à l'ouverture (vector_backend, chunk_size...)
+    se changent par monkeypatch avant le premier accès à l'index.
+    """
+    from src import vectorstore
+    from src.config import settings
+    root = tmp_path / "index"
+    for name, rel in (("chroma_dir", "qdrant"), ("npstore_dir", "npstore"), ("lexical_index_path", "bm25.sqlite"),
+                      ("dedup_index_path", "dedup.sqlite"), ("embed_pca_path", "embed_pca.npz"),
+                      ("answer_cache_path", "answer_cache.sqlite")):
+        monkeypatch.setattr(settings, name, str(root / rel))
+    monkeypatch.setattr(settings, "qdrant_url", None)
+    monkeypatch.setattr(settings, "retrieval_url", None)
+    vectorstore.close()
+    yield root
+    vectorstore.close()
@@ -0,0 +1,65 @@
+import numpy as np
+from src import rag, vectorstore
+from src.answer_cache import AnswerCache
+
+HITS = [{"id": 11, "text": "Le préavis est de trois mois.", "meta": {"filename": "a.txt", "chunk_index": 0}},
+        {"id": (1 << 64) - 1, "text": "Clause de mobilité.", "meta": {"filename": "b.txt", "chunk_index": 2}}]
+
+def test_exact_semantic_and_invalidation(tmp_path):
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), max_bytes=1 << 20, threshold=0.9)
+    ids = [h["id"] for h in HITS]
+    cache.put("openai", "m", "Durée du préavis ?", ids, [1.0, 0.0], "Trois mois.")
+
+    assert cache.get_exact("openai", "m", "durée du  préavis ?", list(reversed(ids))) == "Trois mois."
+    assert cache.get_exact("openai", "autre", "durée du préavis ?", ids) is None
+    assert cache.get_similar("openai", "m", [0.99, 0.05], ids) == "Trois mois."   # paraphrase
+    assert cache.get_similar("openai", "m", [0.0, 1.0], ids) is None              # autre question
+    assert cache.get_similar("openai", "m", [1.0, 0.0], ids[:1]) is None          # autres passages
+
+    assert cache.invalidate([(1 << 64) - 1]) == 1
+    assert cache.get_exact("openai", "m", "Durée du préavis ?", ids) is None
+    # persistance entre redémarrages
+    cache.put("openai", "m", "q", ids, [1.0, 0.0], "r")
+    assert AnswerCache(str(tmp_path / "ans.sqlite"), 1 << 20, 0.9).get_exact("openai", "m", "q", ids) == "r"
+
+def test_size_eviction(tmp_path):
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), max_bytes=200, threshold=0.9)
+    for i in range(10):
+        cache.put("openai", "m", f"q{i}", [i], np.ones(4), "x" * 50)
+    assert cache.stats()["stored_bytes"] <= 200
+    assert cache.get_exact("openai", "m", "q9", [9]) == "x" * 50
+
+def test_grounded_answer_uses_cache(tmp_path, monkeypatch):
+    """Une paraphrase sur les mêmes passages ne rappelle pas le LLM"""
+    calls = []
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), 1 << 20, 0.9)
+    vectors = {"Quelle est la durée du préavis ?": [1.0, 0.0], "Combien de temps dure le préavis ?": [0.98, 0.1]}
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag, "_question_vector", lambda q, embed=False: vectors[q])
+    monkeypatch.setattr(rag, "_openai_text", lambda q, hits: calls.append(q) or "Trois mois [1].")
+
+    first = rag.grounded_answer("Quelle est la durée du préavis ?", HITS)
+    assert first.startswith("Trois mois [1].") and "**Sources**" in first
+    assert rag.grounded_answer("Combien de temps dure le préavis ?", HITS) == first
+    assert calls == ["Quelle est la durée du préavis ?"]
+
+def test_fallback_answers_are_not_cached(tmp_path, monkeypatch):
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), 1 << 20, 0.9)
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag, "_question_vector", lambda q, embed=False: [1.0, 0.0])
+    monkeypatch.setattr(rag, "_openai_text", lambda q, hits: (_ for _ in ()).throw(RuntimeError("503")))
+    rag.grounded_answer("Durée ?", HITS)
+    assert cache.stats()["entries"] == 0
+
+def test_new_question_is_not_embedded_before_the_llm(tmp_path, monkeypatch):
+    """Question jamais embeddée (voie lexicale) : pas de recherche sémantique, embedding après la réponse"""
+    events = []
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), 1 << 20, 0.9)
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(vectorstore, "embed_query", lambda q: events.append("embed") or np.ones(4))
+    monkeypatch.setattr(rag, "_openai_text", lambda q, hits: events.append("llm") or "Trois mois [1].")
+    rag.grounded_answer(f"Article Z1-{tmp_path.name} ?", HITS)
+    assert events == ["llm", "embed"] and cache.stats()["entries"] == 1
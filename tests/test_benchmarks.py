@@ -0,0 +1,41 @@
+import json
+
+from benchmarks.corpus import generate_corpus, generate_questions
+from benchmarks.run import compare, main
+
+def test_corpus_is_deterministic(tmp_path):
+    a = generate_corpus(str(tmp_path / "a"), n_docs=3, doc_kb=2, seed=7)
+    b = generate_corpus(str(tmp_path / "b"), n_docs=3, doc_kb=2, seed=7)
+    assert [p.rsplit(".", 1)[1] for p in a] == ["txt", "csv", "html"]
+    assert [open(p, encoding="utf-8").read() for p in a] == [open(p, encoding="utf-8").read() for p in b]
+    questions = generate_questions(6, a, seed=7)
+    assert questions == generate_questions(6, b, seed=7)
+    ref = questions[0].split("article ")[1].rstrip(" ?")
+    assert any(ref in open(p, encoding="utf-8").read() for p in a)
+
+def test_compare_flags_regressions_only_past_tolerance():
+    ref = {"query": {"throughput": 100.0, "p95_ms": 10.0, "peak_mb": 4.0, "unit": "questions/s"}}
+    ok = {"query": {"throughput": 90.0, "p95_ms": 11.0, "peak_mb": 4.5, "unit": "questions/s"}}
+    bad = {"query": {"throughput": 60.0, "p95_ms": 20.0, "peak_mb": 9.0, "unit": "questions/s"}}
+    assert compare(ok, ref, 0.25) == []
+    assert len(compare(bad, ref, 0.25)) == 3
+    assert compare({"nouvelle": bad["query"]}, ref, 0.25) == []
+
+def test_benchmark_run_writes_results_and_checks_baseline(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("LLM_PROVIDER", "dummy")  # main() force le mode hors ligne ; restauré après le test
+    monkeypatch.setenv("RAG_EMBEDDINGS", "dummy")
+    args = ["--docs", "3", "--doc-kb", "4", "--queries", "6", "--workdir", str(tmp_path / "w"),
+            "--out", str(tmp_path / "out.json"), "--baseline", str(tmp_path / "baseline.json")]
+    assert main(args + ["--require-baseline"]) == 2  # aucune référence : signalé, jamais silencieux
+    assert "RÉGRESSIONS NON VÉRIFIÉES" in capsys.readouterr().err
+    assert main(args + ["--save-baseline"]) == 0
+    results = json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))
+    assert set(results["stages"]) == {"read_any", "clean_text", "chunk", "add_path", "query", "grounded_answer"}
+    assert all(r["ops"] > 0 and r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"] for r in results["stages"].values())
+
+    # référence irréaliste : toute exécution régresse
+    baseline = json.loads((tmp_path / "baseline.json").read_text(encoding="utf-8"))
+    for r in baseline["stages"].values():
+        r["throughput"] *= 1000
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline), encoding="utf-8")
+    assert main(args) == 1
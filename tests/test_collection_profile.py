@@ -0,0 +1,55 @@
+from src import vectorstore
+from src.config import settings
+
+def _count(name):
+    return vectorstore.get_qdrant().count(name, exact=True).count
+
+def test_migration_rebuilds_under_new_profile(tmp_path, monkeypatch, tmp_index):
+    """Changer le profil de stockage puis migrer : mêmes points, nouveau profil, recherche intacte"""
+    doc = tmp_path / "bail.txt"
+    doc.write_text("Le bail commercial est conclu pour une durée de neuf ans.", encoding="utf-8")
+    path = str(doc)
+    vectorstore.add_path(path)
+    vectorstore.migrate_collection()   # on part d'une collection conforme
+    before = _count(vectorstore._COLLECTION)
+
+    flipped = not settings.qdrant_on_disk
+    monkeypatch.setattr(settings, "qdrant_on_disk", flipped)
+    expected = [f"on_disk: {not flipped} -> {flipped}"]
+    assert vectorstore.profile_drift() == expected
+    out = vectorstore.migrate_collection()
+    assert out["changes"] == expected and out["points"] == before
+    assert vectorstore.profile_drift() == []
+    info = vectorstore.get_qdrant().get_collection(vectorstore._COLLECTION)
+    assert bool(info.config.params.vectors.on_disk) is flipped
+    assert not vectorstore.get_qdrant().collection_exists(vectorstore._MIGRATION)
+
+    hits = vectorstore.query("durée du bail commercial", 3)
+    assert any(h["meta"]["source"] == path for h in hits)
+
+def test_interrupted_migration_resumes(tmp_path, tmp_index):
+    """Collection supprimée après la copie temporaire : la migration suivante la restaure"""
+    doc = tmp_path / "statuts.txt"
+    doc.write_text("Les statuts de la société fixent le capital social.", encoding="utf-8")
+    path = str(doc)
+    client = vectorstore.get_qdrant()
+    vectorstore.add_path(path)
+    before = _count(vectorstore._COLLECTION)
+    dim = client.get_collection(vectorstore._COLLECTION).config.params.vectors.size
+    vectorstore._create_collection(vectorstore._MIGRATION, dim)
+    vectorstore._copy_points(vectorstore._COLLECTION, vectorstore._MIGRATION)
+    client.delete_collection(vectorstore._COLLECTION)
+
+    out = vectorstore.migrate_collection()
+    assert out["points"] == before
+    assert _count(vectorstore._COLLECTION) == before
+    assert not client.collection_exists(vectorstore._MIGRATION)
+
+def test_hits_carry_only_needed_payload(tmp_path, tmp_index):
+    doc = tmp_path / "cession.txt"
+    doc.write_text("La cession de parts sociales requiert l'agrément des associés.", encoding="utf-8")
+    path = str(doc)
+    vectorstore.add_path(path)
+    [pid] = vectorstore._indexed_chunks(path)
+    # pas de page hors PDF
+    assert set(vectorstore._payloads([pid])[pid]) == set(vectorstore._HIT_FIELDS) - {"page_start", "page_end"}
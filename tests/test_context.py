@@ -0,0 +1,36 @@
+from src.context import pack_context
+from src.preprocessing import chunk
+
+def _words(text):
+    return len(text.split())
+
+def _hits(path, text, size, overlap, scores):
+    return [{"id": i, "text": t, "meta": {"source": path, "filename": path, "chunk_index": i, "score": s}}
+            for i, (t, s) in enumerate(zip(chunk(text, size, overlap), scores))]
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    """Deux chunks voisins d'un même fichier = un passage, sans le texte répété"""
+    words = [f"m{i}" for i in range(24)]
+    hits = _hits("a.txt", " ".join(words), 10, 3, [0.9, 0.8, 0.7, 0.6, 0.5])
+    assert len(hits) == 4
+    ctx = pack_context(hits, budget=1000, max_overlap=3, count=_words)
+    assert len(ctx.passages) == 1
+    assert ctx.passages[0].text == " ".join(words)
+    assert ctx.passages[0].label == "a.txt · chunks 0-3"
+    assert ctx.tokens_in == 33 and ctx.tokens_out == 24 and ctx.tokens_saved == 9
+
+def test_budget_packs_by_score_with_stable_numbering():
+    hits = [
+        {"id": 1, "text": "un " * 50, "meta": {"source": "a", "filename": "a", "chunk_index": 0, "score": 0.2}},
+        {"id": 2, "text": "deux " * 30, "meta": {"source": "b", "filename": "b", "chunk_index": 5, "score": 0.9}},
+        {"id": 3, "text": "trois " * 10, "meta": {"source": "c", "filename": "c", "chunk_index": 1, "score": 0.5}},
+    ]
+    ctx = pack_context(hits, budget=45, max_overlap=3, count=_words)
+    assert [(p.num, p.filename) for p in ctx.passages] == [(1, "b"), (2, "c")]
+    assert ctx.prompt().startswith("[1] deux") and "\n\n[2] trois" in ctx.prompt()
+    assert ctx.tokens_out <= 45
+
+def test_oversized_first_passage_is_truncated():
+    hits = [{"id": 1, "text": "mot " * 100, "meta": {"source": "a", "filename": "a", "chunk_index": 0, "score": 1}}]
+    ctx = pack_context(hits, budget=20, max_overlap=0, count=_words)
+    assert 0 < ctx.tokens_out <= 20
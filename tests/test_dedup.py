@@ -0,0 +1,102 @@
+import random, sqlite3
+
+from src import vectorstore
+from src.dedup import DedupIndex, text_key
+from src.rag import grounded_answer
+
+CLAUSE = ("Les parties s'engagent à garder strictement confidentielles les informations échangées "
+          "pendant toute la durée du contrat et cinq ans après son terme ; tout litige relatif à "
+          "son interprétation relève de la compétence exclusive du tribunal de commerce de Paris.")
+
+def _words(n, seed):
+    rng = random.Random(seed)
+    return [f"{rng.choice(['clause', 'partie', 'contrat', 'durée', 'signature'])}{rng.randint(0, 99)}"
+            for _ in range(n)]
+
+def _key(words):
+    return text_key(" ".join(words))
+
+def test_only_identical_normalized_text_is_a_duplicate(tmp_path):
+    """Un seul mot différent (Paris / Lyon) : pas un doublon ; casse et ponctuation ignorées"""
+    words = _words(800, 0)
+    edited = list(words)
+    edited[400] = "Lyon"
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    index.add_canonical([(1, _key(words)), ((1 << 63) + 2, _key(_words(800, 1)))])
+    assert index.find(_key(edited)) is None
+    assert index.find(_key([" ".join(words).upper() + " !"])) == 1
+    assert index.find(_key(_words(800, 1))) == (1 << 63) + 2
+    assert index.find(_key(_words(800, 2))) is None
+    index.close()
+
+def test_opens_index_with_former_simhash_columns(tmp_path):
+    """Base créée avec les colonnes SimHash : allégée à l'ouverture, canoniques et alias conservés"""
+    path = str(tmp_path / "dedup.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE canon (id INTEGER PRIMARY KEY, simhash INTEGER NOT NULL, b0 INTEGER NOT NULL,
+                            b1 INTEGER NOT NULL, b2 INTEGER NOT NULL, b3 INTEGER NOT NULL, norm TEXT);
+        CREATE INDEX canon_b0 ON canon(b0);
+        CREATE TABLE alias (id INTEGER PRIMARY KEY, canon INTEGER NOT NULL, simhash INTEGER NOT NULL,
+                            source TEXT NOT NULL, filename TEXT, chunk_index INTEGER NOT NULL, chunk_hash TEXT,
+                            page_start INTEGER, page_end INTEGER);
+    """)
+    conn.execute("INSERT INTO canon VALUES (1, 7, 0, 0, 0, 7, ?)", (text_key(CLAUSE),))
+    conn.execute("INSERT INTO alias VALUES (2, 1, 7, 'b.txt', 'b.txt', 0, 'h', NULL, NULL)")
+    conn.commit()
+    conn.close()
+    index = DedupIndex(path)
+    assert index.find(text_key(CLAUSE)) == 1
+    index.add_canonical([(3, text_key("autre clause"))])
+    assert [r["source"] for r in index.aliases([1])[1]] == ["b.txt"]
+    assert index.stats()["canonical"] == 2
+    index.close()
+
+def test_duplicate_chunk_stored_once_and_cited_everywhere(tmp_path, tmp_index):
+    """Clause commune : un seul point indexé, citée pour les deux contrats ; survit à la suppression du premier"""
+    a, b = tmp_path / "contrat_a.txt", tmp_path / "contrat_b.txt"
+    a.write_text(CLAUSE, encoding="utf-8")
+    b.write_text(CLAUSE.upper().replace(";", "."), encoding="utf-8")
+    vectorstore.add_path(str(a))
+    vectorstore.add_path(str(b))
+    stats = vectorstore.last_ingest(str(b))
+    assert (stats["duplicates"], stats["embedded"], stats["dedup_ratio"]) == (1, 0, 1.0)
+    assert stats["index_points"] == 1 and stats["index_dedup_ratio"] == 0.5
+
+    hit = vectorstore.query("tribunal de commerce de Paris", 3)[0]
+    assert [s["filename"] for s in hit["meta"]["sources"]] == ["contrat_a.txt", "contrat_b.txt"]
+    assert "aussi dans : contrat_b.txt" in grounded_answer("Quel tribunal ?", [hit])
+
+    # ré-ingestion : le doublon est reconnu inchangé, rien n'est ré-embeddé
+    vectorstore.add_path(str(b))
+    assert vectorstore.last_ingest(str(b))["unchanged"] == 1
+
+    vectorstore.delete_by_source(str(a))
+    hits = vectorstore.query("tribunal de commerce de Paris", 3)
+    assert [h["meta"]["source"] for h in hits] == [str(b)]
+    assert len(hits[0]["meta"]["sources"]) == 1
+
+def test_promoted_alias_keeps_its_own_text(tmp_path, tmp_index):
+    """Suppression du canonique : l'alias promu est indexé avec son texte à lui, ré-embeddé"""
+    a, b = tmp_path / "contrat_a.txt", tmp_path / "contrat_b.txt"
+    a.write_text(CLAUSE, encoding="utf-8")
+    b.write_text(CLAUSE.upper(), encoding="utf-8")
+    vectorstore.add_path(str(a))
+    vectorstore.add_path(str(b))
+    assert vectorstore.last_ingest(str(b))["duplicates"] == 1
+    vectorstore.delete_by_source(str(a))
+    [pid] = vectorstore._indexed_chunks(str(b))
+    assert vectorstore._payloads([pid])[pid]["text"] == CLAUSE.upper()
+    vectorstore.add_path(str(b))
+    assert vectorstore.last_ingest(str(b))["unchanged"] == 1
+
+def test_near_duplicate_with_other_terms_is_indexed(tmp_path, tmp_index):
+    """Même clause, autre tribunal : indexée à part, chaque contrat garde son texte"""
+    a, b = tmp_path / "contrat_a.txt", tmp_path / "contrat_b.txt"
+    a.write_text(CLAUSE, encoding="utf-8")
+    b.write_text(CLAUSE.replace("Paris", "Lyon"), encoding="utf-8")
+    vectorstore.add_path(str(a))
+    vectorstore.add_path(str(b))
+    assert vectorstore.last_ingest(str(b))["duplicates"] == 0
+    hits = vectorstore.query("tribunal de commerce de Lyon", 3)
+    assert str(b) in {h["meta"]["source"] for h in hits}
@@ -0,0 +1,50 @@
+import numpy as np
+from src.embed_cache import EmbeddingCache, cached_embedder
+
+def _counting_embed(calls):
+    def _embed(texts):
+        calls.append(list(texts))
+        return np.array([np.full(8, len(t), dtype=np.float32) for t in texts])
+    return _embed
+
+def test_cache_hits_on_reingest(tmp_path):
+    """Un second passage sur les mêmes chunks ne rappelle pas le provider"""
+    calls = []
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_bytes=1 << 20)
+    embed = cached_embedder(_counting_embed(calls), "local", "m", cache)
+
+    first = embed(["article L1237-19", "clause de confidentialité"])
+    second = embed(["clause de confidentialité", "article L1237-19", "nouveau"])
+
+    assert calls == [["article L1237-19", "clause de confidentialité"], ["nouveau"]]
+    assert (second[0] == first[1]).all() and (second[1] == first[0]).all()
+    st = cache.stats()
+    assert st["hits"] == 2 and st["misses"] == 3
+    assert st["bytes_saved"] > 0
+
+def test_cache_is_keyed_by_model_and_persistent(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    calls = []
+    embed = cached_embedder(_counting_embed(calls), "local", "m1", EmbeddingCache(path, 1 << 20))
+    embed(["texte"])
+    # autre modèle -> miss ; même modèle après "redémarrage" -> hit
+    cached_embedder(_counting_embed(calls), "local", "m2", EmbeddingCache(path, 1 << 20))(["texte"])
+    cached_embedder(_counting_embed(calls), "local", "m1", EmbeddingCache(path, 1 << 20))(["texte"])
+    assert len(calls) == 2
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_bytes=8 * 4 * 3)
+    embed = cached_embedder(_counting_embed([]), "local", "m", cache)
+    for t in ["a", "bb", "ccc", "dddd", "eeeee"]:
+        embed([t])
+    assert cache.stats()["stored_bytes"] <= cache.max_bytes
+    assert cache.stats()["entries"] < 5
+
+def test_replaced_entries_do_not_inflate_size(tmp_path):
+    """Réécrire une clé existante ne compte que l'écart de taille (pas d'éviction prématurée)"""
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_bytes=100)
+    vec = np.ones(8, dtype=np.float32)  # 32 octets
+    for _ in range(5):
+        cache.put_many("local", "m", {b"h1": vec, b"h2": vec})
+    assert cache.stats()["stored_bytes"] == 64
+    assert set(cache.get_many("local", "m", [b"h1", b"h2"])) == {b"h1", b"h2"}
@@ -0,0 +1,68 @@
+import pytest
+from src import embeddings
+
+def test_token_batches_respect_budget_and_order():
+    texts = ["a " * 10, "b " * 10, "c " * 25, "d " * 5]
+    batches = list(embeddings._token_batches(texts, lambda t: len(t.split()), max_tokens=20, max_items=10))
+    assert batches == [[0, 1], [2], [3]]
+    assert [i for b in batches for i in b] == list(range(len(texts)))
+
+class _Resp:
+    def __init__(self, status, body=None):
+        self.status_code, self._body, self.headers = status, body or {}, {"Retry-After": "0"}
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+    def json(self):
+        return self._body
+
+class _FlakySession:
+    def __init__(self, statuses):
+        self.statuses, self.calls, self.retry_after = list(statuses), 0, "0"
+    def post(self, *a, **kw):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        resp = _Resp(status, {"data": []} if status == 200 else None)
+        resp.headers["Retry-After"] = self.retry_after
+        return resp
+
+def test_post_retries_on_rate_limit_then_succeeds():
+    session = _FlakySession([429, 503, 200])
+    assert embeddings._post_with_retry(session, "u", {}, {}, retries=3, timeout=1) == {"data": []}
+    assert session.calls == 3
+
+def test_post_gives_up_after_max_retries():
+    session = _FlakySession([500, 500])
+    with pytest.raises(RuntimeError):
+        embeddings._post_with_retry(session, "u", {}, {}, retries=1, timeout=1)
+
+def test_post_fails_fast_on_long_retry_after(monkeypatch):
+    """Retry-After: 3600 au-delà de max_backoff : échec immédiat, sans dormir"""
+    monkeypatch.setattr("time.sleep", lambda s: pytest.fail(f"sleep({s})"))
+    session = _FlakySession([429, 200])
+    session.retry_after = "3600"
+    with pytest.raises(RuntimeError):
+        embeddings._post_with_retry(session, "u", {}, {}, retries=3, timeout=1, max_backoff=30)
+    assert session.calls == 1
+
+class _FakeST:
+    """Imite SentenceTransformer.encode : vecteur = [longueur, 1]"""
+    def __init__(self):
+        self.seen = []
+    def get_sentence_embedding_dimension(self):
+        return 2
+    def encode(self, texts, batch_size, convert_to_numpy, normalize_embeddings, show_progress_bar):
+        self.seen.append(list(texts))
+        import numpy as np
+        arr = np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+        return arr / np.linalg.norm(arr, axis=1, keepdims=True)
+
+def test_local_embedder_sorts_by_length_and_restores_order():
+    from src.config import settings
+    model = _FakeST()
+    embed = embeddings._local_embedder(model, settings)
+    texts = ["ab", "abcdef", "a", "abcd"]
+    out = embed(texts)
+    assert model.seen == [["abcdef", "abcd", "ab", "a"]]
+    assert out.dtype.name == "float32" and out.shape == (4, 2)
+    assert list(out[:, 0].argsort()) == [2, 0, 3, 1]
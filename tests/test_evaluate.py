@@ -0,0 +1,69 @@
+import json
+
+from src import vectorstore
+from src.answer_cache import get_answer_cache
+from src.config import settings
+from src.evaluate import EvalCase, evaluate, isolated_index, load_cases, main, score
+
+def _hit(source):
+    return {"text": "", "meta": {"source": f"/docs/{source}", "filename": source}}
+
+def test_recall_and_mrr():
+    cases = [EvalCase("q1", {"a.txt"}), EvalCase("q2", {"b.txt", "c.txt"})]
+    hits = [[_hit("x.txt"), _hit("a.txt")], [_hit("c.txt"), _hit("y.txt"), _hit("b.txt")]]
+    assert score(cases, hits, 3) == {"recall": 1.0, "mrr": (1 / 2 + 1) / 2}
+    assert score(cases, hits, 1) == {"recall": 0.25, "mrr": 0.5}
+
+def test_deduplicated_hit_counts_every_cited_source():
+    hit = _hit("a.txt")
+    hit["meta"]["sources"] = [dict(hit["meta"]), {"source": "/docs/b.txt", "filename": "b.txt"}]
+    assert score([EvalCase("q", {"b.txt"}), EvalCase("q", {"a.txt", "b.txt"})], [[hit], [hit]], 1) == \
+        {"recall": 1.0, "mrr": 1.0}
+
+def test_query_many_matches_query(tmp_path, tmp_index):
+    """Un lot de questions = les mêmes hits que question par question"""
+    doc = tmp_path / "baux.txt"
+    doc.write_text("Article Q5555-1 : le bail commercial dure neuf ans. "
+                   "Le locataire peut donner congé à chaque période triennale.", encoding="utf-8")
+    path = str(doc)
+    questions = ["article Q5555-1", "congé triennal du locataire", "durée du bail commercial"]
+    vectorstore.add_path(path)
+    batch = vectorstore.query_many(questions, 3)
+    vectorstore.clear_query_caches()
+    assert batch == [vectorstore.query(q, 3) for q in questions]
+    assert batch[0][0]["meta"]["source"] == path
+
+def test_evaluate_chunk_grid_on_isolated_index(tmp_path, capsys):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "travail.txt").write_text("Article T1000-1 : la période d'essai est de deux mois.", encoding="utf-8")
+    (corpus / "bail.txt").write_text("Article B2000-2 : le dépôt de garantie vaut un mois de loyer.", encoding="utf-8")
+    questions = tmp_path / "eval.csv"
+    questions.write_text("question;source\narticle T1000-1;travail.txt\narticle B2000-2;bail.txt|autre.txt\n",
+                         encoding="utf-8")
+    assert [c.sources for c in load_cases(str(questions))] == [{"travail.txt"}, {"bail.txt", "autre.txt"}]
+
+    before = vectorstore.get_lexical().search("T1000-1", 3)
+    rows = evaluate(load_cases(str(questions)), [1, 2], corpus=str(corpus), chunk_sizes=[200, 400],
+                    chunk_overlaps=[20], workdir=str(tmp_path / "work"))
+    assert [(r["chunk_size"], r["k"]) for r in rows] == [(200, 1), (200, 2), (400, 1), (400, 2)]
+    assert all(r["recall_at_k"] == 0.75 and r["mrr"] == 1.0 and r["chunks"] == 2 for r in rows)
+    # l'index de l'application n'a pas été touché
+    assert vectorstore.get_lexical().search("T1000-1", 3) == before == []
+
+    out = tmp_path / "report.json"
+    assert main([str(questions), "-k", "2", "--corpus", str(corpus), "--workdir", str(tmp_path / "w2"),
+                 "--json", str(out)]) == 0
+    assert json.loads(out.read_text(encoding="utf-8"))["runs"][0]["recall_at_k"] == 0.75
+    assert "recall@k" in capsys.readouterr().out
+
+def test_isolated_index_never_reaches_production_stores(tmp_path, monkeypatch):
+    """QDRANT_URL et cache de réponses de l'application : remplacés le temps de l'évaluation"""
+    monkeypatch.setattr(settings, "qdrant_url", "http://qdrant-prod:6333")
+    monkeypatch.setattr(settings, "answer_cache_path", str(tmp_path / "prod_answers.sqlite"))
+    with isolated_index(str(tmp_path / "index")):
+        assert settings.qdrant_url is None
+        get_answer_cache()
+        assert (tmp_path / "index" / "answer_cache.sqlite").exists()
+    assert settings.qdrant_url == "http://qdrant-prod:6333"
+    assert not (tmp_path / "prod_answers.sqlite").exists()
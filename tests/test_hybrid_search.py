@@ -0,0 +1,65 @@
+from src.lexical import BM25Index, has_reference, rrf, is_decisive, tokenize
+from src import vectorstore
+
+def test_tokenize_keeps_legal_references():
+    assert tokenize("Selon l'Article L1237-19 du Code, préavis") == ["selon", "article", "l1237-19", "code", "preavis"]
+
+def test_bm25_ranks_exact_reference_first(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.sqlite"))
+    index.add([
+        (1, "a.txt", "La rupture conventionnelle collective est régie par l'article L1237-19."),
+        (2, "a.txt", "La rupture du contrat de travail à durée indéterminée."),
+        ((1 << 64) - 5, "b.txt", "Le préavis est de trois mois."),
+    ])
+    res = index.search("article L1237-19 rupture", 3)
+    assert res[0][0] == 1 and len(res) == 2
+    assert index.search("preavis", 1)[0][0] == (1 << 64) - 5
+
+    index.remove_source("a.txt")
+    assert len(index) == 1 and index.search("rupture", 3) == []
+    # persistance
+    assert len(BM25Index(str(tmp_path / "bm25.sqlite"))) == 1
+
+def test_rrf_and_decisive():
+    assert [pid for pid, _ in rrf([[1, 2, 3], [3, 1]])] == [1, 3, 2]
+    assert is_decisive("article L1237-19", [(1, 9.0), (2, 3.0)], 2.0)
+    assert not is_decisive("article L1237-19", [(1, 4.0), (2, 3.0)], 2.0)
+    assert not is_decisive("article L1237-19", [(1, 9.0), (2, 3.0)], 0)
+    # un seul résultat, trop peu de résultats ou pas de référence citée : fusion avec le dense
+    assert not is_decisive("article L1237-19", [(1, 9.0)], 2.0)
+    assert not is_decisive("article L1237-19", [(1, 9.0), (2, 3.0)], 2.0, min_results=3)
+    assert not is_decisive("télétravail", [(1, 9.0), (2, 3.0)], 2.0)
+
+def test_has_reference():
+    assert has_reference("que dit l'article L1237-19 ?")
+    assert has_reference("Article 12 du bail")
+    assert has_reference("pourvoi n° 20-12.345")
+    assert not has_reference("télétravail et travail à distance")
+    assert not has_reference("préavis de 3 mois")
+
+def test_query_takes_lexical_fast_path(tmp_path, monkeypatch, tmp_index):
+    """Une référence exacte décisive ne déclenche pas d'embedding de la question"""
+    doc = tmp_path / "code_travail.txt"
+    doc.write_text("Article Z9999-42 : la rupture conventionnelle collective.", encoding="utf-8")
+    path = str(doc)
+    vectorstore.add_path(path)
+    for i, text in enumerate(["Article Z1000-1 : le préavis.", "Article Z1000-2 : la période d'essai."]):
+        other = tmp_path / f"autre{i}.txt"
+        other.write_text(text, encoding="utf-8")
+        vectorstore.add_path(str(other))
+    monkeypatch.setattr(vectorstore, "_embed", lambda texts: (_ for _ in ()).throw(AssertionError("embed")))
+    hits = vectorstore.query("que dit l'article Z9999-42 ?", 3)
+    assert hits[0]["meta"]["source"] == path
+    assert hits[0]["meta"]["retrieval"] == "lexical"
+    vectorstore.delete_by_source(path)
+    assert vectorstore.get_lexical().search("Z9999-42", 3) == []
+
+def test_single_lexical_match_is_fused_with_dense(tmp_path, tmp_index):
+    """Sans référence citée, un unique résultat BM25 ne court-circuite pas la recherche sémantique"""
+    for name, text in (("a.txt", "Le télétravail est prévu par accord collectif."),
+                       ("b.txt", "Le travail à distance depuis le domicile du salarié.")):
+        (tmp_path / name).write_text(text, encoding="utf-8")
+        vectorstore.add_path(str(tmp_path / name))
+    hits = vectorstore.query("télétravail", 3)
+    assert len(hits) == 2
+    assert {h["meta"]["retrieval"] for h in hits} == {"hybrid"}
@@ -0,0 +1,78 @@
+from src import vectorstore
+from src.config import settings
+from src.preprocessing import chunk
+
+def _write(path, words):
+    path.write_text(" ".join(words), encoding="utf-8")
+
+def test_reindex_only_touches_changed_chunks(tmp_path, monkeypatch, tmp_index):
+    """Ré-ingérer un fichier modifié n'embedde que les chunks changés et purge les orphelins"""
+    monkeypatch.setattr(settings, "chunk_size", 5)
+    monkeypatch.setattr(settings, "chunk_overlap", 0)
+    doc = tmp_path / "contrat.txt"
+    words = [f"mot{i}" for i in range(15)]
+    _write(doc, words)
+    path = str(doc)
+    n = len(list(chunk(" ".join(words), 5, 0)))
+    assert vectorstore.add_path(path)[0] == n
+    assert vectorstore.last_ingest(path)["embedded"] == n
+
+    vectorstore.add_path(path)
+    stats = vectorstore.last_ingest(path)
+    assert (stats["chunks"], stats["embedded"], stats["unchanged"], stats["deleted"]) == (n, 0, n, 0)
+
+    # une clause modifiée : seul son chunk est ré-embeddé, l'ancien supprimé
+    edited = words[:7] + ["modifié"] + words[8:]
+    _write(doc, edited)
+    vectorstore.add_path(path)
+    stats = vectorstore.last_ingest(path)
+    assert stats["embedded"] == stats["deleted"] == 1
+    indexed = vectorstore._indexed_chunks(path)
+    assert sorted(place[0] for place in indexed.values()) == list(range(stats["chunks"]))
+    vectorstore.delete_by_source(path)
+    assert vectorstore._indexed_chunks(path) == {}
+
+def test_insertion_keeps_following_chunks(tmp_path, monkeypatch, tmp_index):
+    """Texte inséré en tête : les chunks suivants gardent leur point et leur vecteur, seul leur rang change"""
+    monkeypatch.setattr(settings, "chunk_size", 20)
+    monkeypatch.setattr(settings, "chunk_overlap", 5)
+    doc = tmp_path / "bail.txt"
+    words = [f"clause{i}" for i in range(400)]
+    _write(doc, words)
+    path = str(doc)
+    vectorstore.add_path(path)
+    before = vectorstore._indexed_chunks(path)
+    vectors = vectorstore.get_vectors(list(before))
+
+    _write(doc, words[:10] + ["avenant", "du", "bail", "signé"] + words[10:])
+    n = vectorstore.add_path(path)[0]
+    stats = vectorstore.last_ingest(path)
+    assert stats["embedded"] <= 3 and stats["moved"] >= n - 3
+    after = vectorstore._indexed_chunks(path)
+    assert sorted(place[0] for place in after.values()) == list(range(n))
+    kept = set(before) & set(after)
+    assert len(kept) >= n - 3
+    for pid in kept:
+        assert after[pid][0] >= before[pid][0]
+    assert all((vectorstore.get_vectors([pid])[pid] == vectors[pid]).all() for pid in kept)
+    hits = vectorstore.query(" ".join(words[300:305]), 1)
+    assert hits[0]["meta"]["chunk_index"] == after[hits[0]["id"]][0]
+
+def test_add_path_streams_in_fixed_batches(tmp_path, monkeypatch, tmp_index):
+    """Les chunks sont embeddés par batches de taille fixe, jamais tous d'un coup"""
+    monkeypatch.setattr(settings, "chunk_size", 4)
+    monkeypatch.setattr(settings, "chunk_overlap", 0)
+    monkeypatch.setattr(settings, "ingest_batch_size", 3)
+    sizes = []
+    real_embed = vectorstore._embed
+    monkeypatch.setattr(vectorstore, "_embed", lambda texts: sizes.append(len(texts)) or real_embed(texts))
+    doc = tmp_path / "jurisprudence.txt"
+    words = [f"mot{i}" for i in range(40)]
+    _write(doc, words)
+    path = str(doc)
+    n = len(list(chunk(" ".join(words), 4, 0)))
+    progress = []
+    assert vectorstore.add_path(path, on_progress=lambda d, t: progress.append((d, t)))[0] == n
+    assert sizes == [3] * (n // 3) + ([n % 3] if n % 3 else [])
+    assert progress[-1] == (n, n)
+    assert len(vectorstore._indexed_chunks(path)) == n
@@ -0,0 +1,66 @@
+import threading
+
+from src import vectorstore
+from src.ingest import IngestQueue, DONE, FAILED, iter_files, main
+from src.preprocessing import iter_pages, read_any
+
+def test_queue_ingests_files_in_parallel(tmp_path, tmp_index):
+    """La file indexe plusieurs fichiers en parallèle et isole les échecs"""
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"contrat_{i}.txt"
+        p.write_text(f"Le préavis du contrat {i} est de {i + 1} mois.", encoding="utf-8")
+        paths.append(str(p))
+    bad = tmp_path / "scan.xyz"
+    bad.write_text("?", encoding="utf-8")
+
+    queue = IngestQueue(workers=2)
+    for p in paths + [str(bad)]:
+        queue.submit(p)
+    queue.wait()
+    jobs = {j.path: j for j in queue.jobs()}
+    assert all(jobs[p].status == DONE and jobs[p].chunks == 1 for p in paths)
+    assert jobs[str(bad)].status == FAILED and jobs[str(bad)].error
+    assert queue.pending() == 0
+    queue.clear_finished()
+    assert queue.jobs() == []
+
+def test_cli_bulk_mode(tmp_path, capsys, tmp_index):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    p = docs / "sub" / "avenant.txt"
+    p.write_text("Avenant : la période d'essai est portée à 3 mois.", encoding="utf-8")
+    (docs / "notes.md").write_text("ignoré", encoding="utf-8")
+    assert main([str(docs), "--workers", "2"]) == 0
+    assert "1/1 fichiers indexés" in capsys.readouterr().out
+
+def test_uppercase_extensions_are_read(tmp_path):
+    """Fichier listé par iter_files (BAIL.TXT) : lisible par les lecteurs, comme bail.txt"""
+    p = tmp_path / "BAIL.TXT"
+    p.write_text("Le loyer est payable le premier du mois.", encoding="utf-8")
+    assert list(iter_files(str(tmp_path))) == [str(p)]
+    assert read_any(str(p)) == "Le loyer est payable le premier du mois."
+    assert " ".join(seg for _, seg in iter_pages(str(p))) == "Le loyer est payable le premier du mois."
+
+def test_resubmitted_running_file_is_requeued(tmp_path, monkeypatch):
+    """Fichier re-soumis pendant son indexation : ré-indexé une fois celle-ci terminée"""
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_add_path(path, on_progress=None):
+        calls.append(path)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+        return 1, 10
+
+    monkeypatch.setattr(vectorstore, "add_path", slow_add_path)
+    queue = IngestQueue(workers=2)
+    path = str(tmp_path / "contrat.txt")
+    queue.submit(path)
+    assert started.wait(5)
+    queue.submit(path)  # nouvelle version déposée pendant l'indexation
+    queue.submit(path)
+    release.set()
+    queue.wait()
+    assert calls == [path, path]
+    assert [j.status for j in queue.jobs()] == [DONE]
@@ -0,0 +1,89 @@
+import pytest, requests
+from src.llm_client import LLMClient, CircuitBreaker, CircuitOpenError, UpstreamError
+
+class _Resp:
+    def __init__(self, status):
+        self.status_code, self.headers = status, {"Retry-After": "0"}
+    def json(self):
+        return {"ok": True}
+    def raise_for_status(self):
+        raise requests.HTTPError(str(self.status_code))
+    def close(self):
+        pass
+
+class _Session:
+    def __init__(self, statuses):
+        self.statuses, self.calls = list(statuses), 0
+    def post(self, *a, **kw):
+        self.calls += 1
+        status = self.statuses.pop(0)
+        if status == "timeout":
+            raise requests.Timeout("read timeout")
+        return _Resp(status)
+
+def _client(statuses, failures=2, reset=60.0, retries=1):
+    return LLMClient(max_concurrency=2, connect_timeout=1, read_timeout=1, max_retries=retries,
+                     queue_timeout=1, breaker=CircuitBreaker(failures, reset), session=_Session(statuses))
+
+def test_retries_then_success():
+    client = _client([503, 200])
+    assert client.post_json("u", {}, {}) == {"ok": True}
+    assert client.stats()["retried"] == 1 and client.stats()["in_flight"] == 0
+
+def test_client_errors_are_not_retried_nor_trip_the_breaker():
+    client = _client([400, 400, 400], failures=1)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.post_json("u", {}, {})
+    assert client.session.calls == 2 and client.stats()["circuit"] == CircuitBreaker.CLOSED
+
+def test_breaker_opens_fails_fast_and_recovers():
+    client = _client(["timeout", "timeout", 500, 500, 200], failures=2, reset=0.0)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.post_json("u", {}, {})
+    assert client.stats()["circuit"] == CircuitBreaker.OPEN
+    # reset_after=0 : un appel d'essai passe et referme le disjoncteur
+    assert client.post_json("u", {}, {}) == {"ok": True}
+    assert client.stats()["circuit"] == CircuitBreaker.CLOSED
+
+def test_half_open_trial_closes_only_on_2xx():
+    """Essai en semi-ouvert : un 4xx ou une file pleine ne referment pas le disjoncteur"""
+    client = _client([500, 500, 400, 200], failures=1, reset=0.0)
+    with pytest.raises(UpstreamError):
+        client.post_json("u", {}, {})
+    with pytest.raises(requests.HTTPError):
+        client.post_json("u", {}, {})
+    assert client.stats()["circuit"] == CircuitBreaker.HALF_OPEN
+    for _ in range(2):
+        client._slots.acquire()
+    with pytest.raises(RuntimeError, match="simultanés"):
+        client.post_json("u", {}, {})
+    for _ in range(2):
+        client._slots.release()
+    assert client.stats()["circuit"] == CircuitBreaker.HALF_OPEN
+    assert client.post_json("u", {}, {}) == {"ok": True}
+    assert client.stats()["circuit"] == CircuitBreaker.CLOSED
+
+def test_open_circuit_short_circuits_without_network():
+    client = _client([500, 500], failures=1, reset=60.0, retries=1)
+    with pytest.raises(UpstreamError):
+        client.post_json("u", {}, {})
+    with pytest.raises(CircuitOpenError):
+        client.post_json("u", {}, {})
+    assert client.session.calls == 2 and client.stats()["short_circuited"] == 1
+
+def test_long_retry_after_fails_fast_and_slot_is_free_while_waiting(monkeypatch):
+    client = _client([], retries=2)
+    throttled = _Resp(429)
+    throttled.headers = {"Retry-After": "120"}
+    monkeypatch.setattr(client.session, "post", lambda *a, **kw: throttled)
+    with pytest.raises(UpstreamError):  # 120 s > max_backoff : pas d'attente, pas de retry
+        client.post_json("u", {}, {})
+    assert client.stats()["retried"] == 0
+
+    free = []
+    monkeypatch.setattr("src.llm_client.time.sleep", lambda s: free.append(client._slots._value))
+    client = _client([503, 200])
+    assert client.post_json("u", {}, {}) == {"ok": True}
+    assert free == [2]  # les 2 créneaux sont libres pendant le backoff
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src import resources, vectorstore
+from src.config import settings
+from src.npstore import NumpyStore
+
+def _corpus(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, dim)).astype(np.float32)
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_search_matches_exact_cosine(tmp_path, dtype):
+    """Le top-k mmap (float16/int8) retrouve les voisins exacts, en lot comme à l'unité"""
+    vecs = _corpus(3000)
+    store = NumpyStore(str(tmp_path), dtype)
+    ids = [(1 << 63) + i for i in range(len(vecs))]  # ids uint64 au-delà de l'int64 SQLite
+    store.upsert(ids, vecs, [{"source": "a", "chunk_index": i} for i in range(len(vecs))])
+    assert store.count() == 3000
+
+    queries = vecs[[7, 1500, 2999]] + 0.01
+    batch = store.search_batch(queries, 5)
+    assert [hits[0][0] for hits in batch] == [ids[7], ids[1500], ids[2999]]
+    assert [pid for pid, _ in store.search(queries[0], 5)] == [pid for pid, _ in batch[0]]
+    assert all(a[1] >= b[1] for hits in batch for a, b in zip(hits, hits[1:]))
+    assert store.payloads([ids[7]], ["chunk_index"]) == {ids[7]: {"chunk_index": 7}}
+
+def test_tombstones_overwrite_and_reopen(tmp_path):
+    """Suppressions masquées par tombstones, upsert sur place, état relu depuis le disque"""
+    vecs = _corpus(2000)
+    store = NumpyStore(str(tmp_path))
+    store.upsert(list(range(2000)), vecs, [{"source": "a" if i % 2 else "b"} for i in range(2000)])
+    assert store.delete_source("b") == 1000
+    assert store.search(vecs[4], 1)[0][0] != 4
+    store.upsert([5], vecs[[10]], [{"source": "a", "text": "remplacé"}])
+    assert store.search(vecs[10], 1)[0][0] == 5 and store.count() == 1000
+
+    reopened = NumpyStore(str(tmp_path))
+    assert reopened.count() == 1000 and reopened.dtype == np.float16
+    assert reopened.payloads([5]) == {5: {"source": "a", "text": "remplacé"}}
+    assert set(reopened.source_payloads("b")) == set()
+    # plus de la moitié supprimée : compactage automatique, résultats inchangés
+    reopened.delete_ids(range(1, 1400, 2))
+    assert reopened.count() == 300 and reopened._rows == 300
+    assert reopened.search(vecs[1999], 1)[0][0] == 1999
+    assert np.allclose(reopened.vectors([1999])[1999], vecs[1999] / np.linalg.norm(vecs[1999]), atol=1e-2)
+
+def test_vectorstore_on_numpy_backend(tmp_path, monkeypatch, tmp_index):
+    """add_path / query / delete_by_source passent par le backend numpy"""
+    monkeypatch.setattr(settings, "vector_backend", "numpy")
+    doc = tmp_path / "bail.txt"
+    doc.write_text("Article Z9876-1 : le préavis du locataire est de trois mois.", encoding="utf-8")
+    path = str(doc)
+    assert vectorstore.add_path(path)[0] == 1
+    store = resources.get(resources.NPSTORE)
+    assert store.count() == 1
+    hits = vectorstore.query("article Z9876-1", 3)
+    assert hits and hits[0]["meta"]["source"] == path
+    assert set(vectorstore.get_vectors([hits[0]["id"]])) == {hits[0]["id"]}
+    assert vectorstore.profile_drift() == []
+    vectorstore.delete_by_source(path)
+    assert store.count() == 0 and vectorstore.query("article Z9876-1", 3) == []
+
+def test_scan_covers_full_id_range(tmp_path):
+    """scan part du plus petit id SQLite (régression : borne hors de l'INTEGER 64 bits)"""
+    store = NumpyStore(str(tmp_path))
+    ids = [0, 5, (1 << 63) - 1, 1 << 63, (1 << 64) - 1]  # ids non signés : négatifs une fois en SQLite
+    store.upsert(ids, _corpus(len(ids)), [{"source": "a", "n": i} for i in range(len(ids))])
+    assert sorted(pid for pid, _ in store.scan(["n"])) == sorted(ids)
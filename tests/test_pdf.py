@@ -0,0 +1,47 @@
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from src import vectorstore
+from src.config import settings
+from src.context import pack_context
+from src.preprocessing import iter_pdf_pages, read_any
+
+def _make_pdf(path, pages):
+    """PDF d'une ligne de texte (Helvetica) par page."""
+    w = PdfWriter()
+    font = w._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"), NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")}))
+    for text in pages:
+        page = w.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1"))
+        page[NameObject("/Contents")] = w._add_object(content)
+    with open(path, "wb") as f:
+        w.write(f)
+    return str(path)
+
+def test_pages_extracted_in_parallel_keep_order(tmp_path):
+    """Pool de process, une page par tâche : pages restituées dans l'ordre, comme en local"""
+    texts = [f"Article {i} : page numero {i}" for i in range(1, 8)]
+    path = _make_pdf(tmp_path / "code.pdf", texts)
+    pooled = list(iter_pdf_pages(path, workers=2, pages_per_task=1))
+    assert pooled == list(iter_pdf_pages(path, workers=1)) == list(enumerate(texts, 1))
+    assert read_any(path) == "\n\n".join(texts)
+
+def test_chunks_carry_page_numbers(tmp_path, monkeypatch, tmp_index):
+    """page_start / page_end dans le payload, repris dans le libellé des sources"""
+    monkeypatch.setattr(settings, "chunk_size", 7)
+    monkeypatch.setattr(settings, "chunk_overlap", 0)
+    monkeypatch.setattr(settings, "pdf_workers", 1)
+    path = _make_pdf(tmp_path / "bail.pdf", ["Le preavis du locataire est de trois mois",
+                                               "sauf accord contraire entre les parties au bail"])
+    assert vectorstore.add_path(path)[0] == 3
+    ids = [pid for pid, _ in sorted(vectorstore._indexed_chunks(path).items(), key=lambda kv: kv[1])]
+    payloads = vectorstore._payloads(ids)
+    hits = [vectorstore._to_hit(pid, payloads[pid], 1.0, "dense") for pid in ids]
+    assert [(h["meta"]["page_start"], h["meta"]["page_end"]) for h in hits] == [(1, 1), (1, 2), (2, 2)]
+    labels = [p.label for p in pack_context(hits[1:2], 1000, 0).passages]
+    assert labels == ["bail.pdf · p. 1-2 · chunk 1"]
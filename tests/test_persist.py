@@ -0,0 +1,51 @@
+import json
+
+from src.persist import HistoryStore
+
+def test_append_and_lazy_load(tmp_path):
+    store = HistoryStore(str(tmp_path / "hist.sqlite"))
+    a = store.create_conversation("Bail")
+    b = store.create_conversation()
+    store.append_message(a["id"], "user", "Durée du bail ?")
+    mid = store.append_message(a["id"], "assistant", "Neuf ans.")
+
+    convs = {c["id"]: c for c in store.list_conversations()}
+    assert set(convs) == {a["id"], b["id"]}
+    assert "messages" not in convs[a["id"]] and convs[a["id"]]["n_messages"] == 2
+    msgs = store.get_messages(a["id"])
+    assert [m["content"] for m in msgs] == ["Durée du bail ?", "Neuf ans."]
+    assert msgs[-1]["id"] == mid
+
+    store.rename(b["id"], "Statuts")
+    store.delete(a["id"])
+    assert [c["title"] for c in store.list_conversations()] == ["Statuts"]
+    assert store.get_messages(a["id"]) == []
+    # persistance
+    assert len(HistoryStore(str(tmp_path / "hist.sqlite")).list_conversations()) == 1
+
+def test_json_history_is_migrated_once(tmp_path):
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text(json.dumps([
+        {"id": "c1", "title": "Préavis", "created_at": "2025-01-01T10:00:00",
+         "updated_at": "2025-01-02T10:00:00",
+         "messages": [{"role": "user", "content": "Préavis ?"},
+                      {"role": "assistant", "content": "Trois mois."}]},
+    ]), encoding="utf-8")
+    store = HistoryStore(str(tmp_path / "hist.sqlite"))
+    assert store.migrate_json(str(legacy)) == 1
+    assert not legacy.exists() and (tmp_path / "chat_history.json.migrated").exists()
+    assert store.migrate_json(str(legacy)) == 0
+    conv = store.get_conversation("c1")
+    assert (conv["title"], conv["n_messages"], conv["updated_at"]) == ("Préavis", 2, "2025-01-02T10:00:00")
+    assert [m["role"] for m in store.get_messages("c1")] == ["user", "assistant"]
+
+def test_paginated_listing_and_message_window(tmp_path):
+    store = HistoryStore(str(tmp_path / "hist.sqlite"))
+    ids = [store.create_conversation(f"c{i}")["id"] for i in range(5)]
+    for i in range(7):
+        store.append_message(ids[0], "user", f"m{i}")
+    assert store.count_conversations() == 5
+    pages = [store.list_conversations(limit=2, offset=o) for o in (0, 2, 4)]
+    assert [len(p) for p in pages] == [2, 2, 1]
+    assert {c["id"] for p in pages for c in p} == set(ids)
+    assert [m["content"] for m in store.get_messages(ids[0], limit=3)] == ["m4", "m5", "m6"]
@@ -0,0 +1,23 @@
+from src.preprocessing import chunk, chunk_stream, iter_text, read_any
+
+def test_chunk_stream_matches_chunk():
+    """Le découpage en flux donne exactement les mêmes chunks que `chunk`"""
+    words = [f"m{i}" for i in range(1234)]
+    segments = [" ".join(words[i:i + 37]) for i in range(0, len(words), 37)]
+    for size, overlap in [(800, 100), (10, 3), (5, 5)]:
+        assert list(chunk_stream(segments, size, overlap)) == list(chunk(" ".join(words), size, overlap))
+
+def test_iter_text_matches_read_any(tmp_path):
+    """Lecture incrémentale TXT/HTML/CSV : mêmes mots que la lecture complète"""
+    html = tmp_path / "arret.html"
+    html.write_text(
+        "<html><head><script>var x = 1;</script></head><body>"
+        + "".join(f"<p>Article L{i}-19 &amp; suivants</p>" for i in range(500))
+        + "</body></html>", encoding="utf-8")
+    txt = tmp_path / "arret.txt"
+    txt.write_text("préavis de trois mois\n\n\n\n" * 300, encoding="utf-8")
+    csv = tmp_path / "arrets.csv"
+    csv.write_text("id,juridiction\n" + "".join(f"{i},Cour de cassation\n" for i in range(300)), encoding="utf-8")
+    for path in (html, txt, csv):
+        streamed = " ".join(iter_text(str(path), block=256, csv_rows=50)).split()
+        assert streamed == read_any(str(path)).split()
@@ -0,0 +1,39 @@
+import time
+from src.query_cache import TTLCache, normalize_question
+from src import vectorstore
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # évince "b", le moins récemment utilisé
+    assert cache.get("b") is None and cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_normalize_question():
+    assert normalize_question("  Durée du\n PRÉAVIS ? ") == normalize_question("durée du préavis ?")
+
+def test_query_results_cached_until_index_changes(tmp_path, monkeypatch, tmp_index):
+    """Question répétée servie par le cache, invalidée dès que l'index est modifié"""
+    calls = []
+    real_search = vectorstore._search
+    monkeypatch.setattr(vectorstore, "_search", lambda q, k: calls.append(q) or real_search(q, k))
+    doc = tmp_path / "bail.txt"
+    doc.write_text("Le bail commercial est conclu pour neuf ans.", encoding="utf-8")
+    path = str(doc)
+    vectorstore.add_path(path)
+    v = vectorstore.index_version()
+    first = vectorstore.query("Durée du bail commercial ?", 3)
+    assert vectorstore.query("durée du  bail commercial ?", 3) == first
+    assert len(calls) == 1
+
+    vectorstore.add_path(path)  # rien n'a changé : pas de nouvelle version
+    assert vectorstore.index_version() == v
+    doc.write_text("Le bail commercial est conclu pour douze ans.", encoding="utf-8")
+    vectorstore.add_path(path)
+    assert vectorstore.index_version() == v + 1
+    vectorstore.query("Durée du bail commercial ?", 3)
+    assert len(calls) == 2
@@ -0,0 +1,73 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from src import embeddings, resources, vectorstore
+from src.config import settings
+from src.preprocessing import chunk
+from src.projection import PCAProjection
+
+def _hashed_embed(texts, dim=48):
+    """Embedder pleine largeur déterministe (un vecteur pseudo-aléatoire par texte)."""
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for i, t in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:4], "little")
+        out[i] = np.random.default_rng(seed).standard_normal(dim)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+def test_pca_projection_fit_apply_and_persist(tmp_path):
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((400, 6)) @ rng.standard_normal((6, 64)) + 0.01 * rng.standard_normal((400, 64))
+    proj = PCAProjection.fit(vecs, 8, "minilm")
+    out = proj.apply(vecs[:50])
+    assert out.shape == (50, 8) and out.dtype == np.float32
+    assert np.allclose(np.linalg.norm(out, axis=1), 1.0, atol=1e-5)
+    # données de rang 6 : les voisins se conservent en dimension 8
+    assert (np.argsort(-(out @ out[0]))[:1] == 0).all()
+
+    path = str(tmp_path / "pca.npz")
+    proj.save(path)
+    loaded = PCAProjection.load(path, "minilm")
+    assert np.allclose(loaded.apply(vecs[:5]), proj.apply(vecs[:5]))
+    assert PCAProjection.load(path, "autre-modele") is None
+    with pytest.raises(ValueError):
+        PCAProjection.fit(vecs[:4], 8)
+
+@pytest.mark.parametrize("backend", ["qdrant", "numpy"])
+def test_reembed_reduces_dimension(tmp_path, monkeypatch, tmp_index, backend):
+    """Ré-embedding en dimension réduite : index remplacé, payloads et recherche conservés"""
+    monkeypatch.setattr(settings, "vector_backend", backend)
+    doc = tmp_path / "bail.txt"
+    doc.write_text("Article Z9876-1 : le préavis du locataire est de trois mois.", encoding="utf-8")
+    vectorstore.add_path(str(doc))
+    monkeypatch.setattr(settings, "embed_dim", 64)
+    try:
+        assert vectorstore.reembed() == {"points": 1, "dim": 64}
+        [pid] = vectorstore._indexed_chunks(str(doc))
+        assert vectorstore.get_vectors([pid])[pid].shape == (64,)
+        hits = vectorstore.query("préavis du locataire", 3)
+        assert hits and hits[0]["meta"]["source"] == str(doc)
+    finally:
+        resources.reset(resources.EMBEDDER)  # reconstruit avec les réglages restaurés
+
+def test_reembed_fits_and_persists_pca(tmp_path, monkeypatch, tmp_index):
+    """Modèle sans réduction native : ACP ajustée sur l'index, enregistrée, appliquée aux questions"""
+    monkeypatch.setattr(embeddings, "pca_model", lambda: "fake")
+    monkeypatch.setattr(embeddings, "get_embedder",
+                        lambda reduce=True: embeddings._reduced(_hashed_embed, "fake", settings) if reduce
+                        else _hashed_embed)
+    for name, value in (("vector_backend", "numpy"), ("chunk_size", 5), ("chunk_overlap", 0),
+                        ("hybrid_search", False), ("embed_dim", 8)):
+        monkeypatch.setattr(settings, name, value)
+    doc = tmp_path / "code.txt"
+    words = [f"mot{i}" for i in range(200)]
+    doc.write_text(" ".join(words), encoding="utf-8")
+    try:
+        vectorstore.add_path(str(doc))
+        assert vectorstore.reembed()["dim"] == 8
+        assert PCAProjection.load(settings.embed_pca_path, "fake").dim == 8
+        hits = vectorstore.query(list(chunk(" ".join(words), 5, 0))[10], 1)
+        assert hits[0]["meta"]["chunk_index"] == 10
+    finally:
+        resources.reset(resources.EMBEDDER)
@@ -0,0 +1,42 @@
+import time
+import numpy as np
+from src import rerank
+from src.config import settings
+
+def _cands(n):
+    return [{"id": i, "text": f"passage {i}", "meta": {"filename": "a", "chunk_index": i, "score": 1 - i / 10}}
+            for i in range(n)]
+
+class _FakeCE:
+    def __init__(self, delay=0.0):
+        self.delay, self.pairs = delay, 0
+    def predict(self, pairs, batch_size, show_progress_bar):
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return [float(p[1].split()[-1]) for p in pairs]   # le dernier passage est le "meilleur"
+
+def test_mmr_prefers_diverse_passages():
+    q = np.array([1.0, 0.0])
+    docs = np.array([[1.0, 0.0], [0.99, 0.01], [0.7, 0.7]])
+    chosen, gains = rerank.mmr(q, docs, k=2, lam=0.3)
+    assert chosen == [0, 2]   # le quasi-doublon du premier est écarté
+
+def test_cross_rerank_reorders_and_caches(monkeypatch):
+    model = _FakeCE()
+    monkeypatch.setattr(rerank, "_cross_encoder", lambda: model)
+    monkeypatch.setattr(rerank.vectorstore, "query", lambda q, k: _cands(min(k, 5)))
+    monkeypatch.setattr(settings, "rerank_budget_ms", 10_000)
+    hits = rerank.retrieve("question unique cross", 3, mode="cross")
+    assert [h["id"] for h in hits] == [4, 3, 2]
+    assert hits[0]["meta"]["retrieval_score"] == 1 - 4 / 10
+    rerank.retrieve("question unique cross", 3, mode="cross")
+    assert model.pairs == 5   # second appel servi par le cache de scores
+
+def test_budget_exceeded_falls_back_to_vector_order(monkeypatch):
+    monkeypatch.setattr(rerank, "_cross_encoder", lambda: _FakeCE(delay=0.05))
+    monkeypatch.setattr(rerank.vectorstore, "query", lambda q, k: _cands(min(k, 40)))
+    monkeypatch.setattr(settings, "rerank_budget_ms", 20)
+    before = rerank.rerank_stats()["fallbacks"]
+    hits = rerank.retrieve("question lente", 3, mode="cross")
+    assert [h["id"] for h in hits] == [0, 1, 2]
+    assert rerank.rerank_stats()["fallbacks"] == before + 1
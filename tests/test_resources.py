@@ -0,0 +1,49 @@
+import threading, time
+
+import pytest
+
+from src import embeddings, resources
+
+def test_resource_is_built_once_under_concurrency():
+    calls = []
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+    res = resources.Resource("lent", factory)
+    assert res.state == resources.NOT_LOADED
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(res.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len({id(o) for o in out}) == 1
+    assert res.state == resources.READY and res.seconds >= 0.05
+
+def test_failure_is_loud_and_retried():
+    attempts = []
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("modèle introuvable")
+        return "ok"
+    res = resources.Resource("modèle", factory)
+    with pytest.raises(resources.ResourceError, match="modèle introuvable"):
+        res.get()
+    assert res.state == resources.FAILED and "OSError" in res.error
+    assert res.get() == "ok" and res.state == resources.READY
+
+def test_timed_accumulates_into_startup_report():
+    with resources.timed("étape de test"):
+        time.sleep(0.01)
+    assert resources.startup_report()["étape de test"] >= 0.01
+
+def test_embedder_misconfiguration_raises(monkeypatch):
+    monkeypatch.setenv("RAG_EMBEDDINGS", "inconnu")
+    with pytest.raises(ValueError):
+        embeddings.get_embedder()
+    monkeypatch.setenv("RAG_EMBEDDINGS", "openai")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        embeddings.get_embedder()
@@ -0,0 +1,94 @@
+import os, socket, subprocess, sys, threading, time
+
+import pytest
+import requests
+
+from src import resources, vectorstore
+from src.config import settings
+from src.server import MicroBatcher, make_server
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def test_micro_batcher_groups_concurrent_calls():
+    sizes = []
+    batcher = MicroBatcher(lambda items: sizes.append(len(items)) or [i * 2 for i in items],
+                           max_batch=16, max_wait_ms=50)
+    out = {}
+    threads = [threading.Thread(target=lambda i=i: out.__setitem__(i, batcher.submit(i))) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == {i: i * 2 for i in range(8)}
+    assert sum(sizes) == 8 and len(sizes) < 8
+
+def test_server_endpoints(tmp_path, tmp_index):
+    doc = tmp_path / "prud.txt"
+    doc.write_text("Le conseil de prud'hommes est saisi dans un délai de douze mois.", encoding="utf-8")
+    server = make_server("127.0.0.1", 0, max_batch=8, max_wait_ms=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        r = requests.post(f"{url}/add", json={"path": str(doc)}).json()
+        assert r["chunks"] == 1 and r["stats"]["embedded"] in (0, 1)
+        hits = requests.post(f"{url}/query", json={"q": "délai de saisine prud'hommes", "k": 3}).json()["hits"]
+        assert any(h["meta"]["source"] == str(doc) for h in hits)
+        batch = requests.post(f"{url}/batch_query",
+                              json={"questions": ["prud'hommes", "douze mois"], "k": 2}).json()
+        assert len(batch["hits"]) == 2
+        assert requests.post(f"{url}/query", json={}).status_code == 400
+        vec = requests.post(f"{url}/embed_query", json={"q": f"question inédite {time.time()}"}).json()["vector"]
+        assert len(vec) == 384
+        assert requests.get(f"{url}/stats").json()["micro_batching"]["items"] >= 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        vectorstore.set_query_embedder(None)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_vectorstore_client_mode(tmp_path, monkeypatch):
+    """Un service séparé (son propre index) sert add/query/delete au vectorstore en mode client"""
+    port = _free_port()
+    env = dict(os.environ, RAG_EMBEDDINGS="dummy", CHROMA_DIR=str(tmp_path / "qdrant"),
+               LEXICAL_INDEX_PATH=str(tmp_path / "bm25.sqlite"), DEDUP_INDEX_PATH=str(tmp_path / "dedup.sqlite"),
+               EMBED_CACHE_MAX_MB="0", ANSWER_CACHE_MAX_MB="0", WARMUP_ON_BOOT="0")
+    env.pop("RETRIEVAL_URL", None)
+    proc = subprocess.Popen([sys.executable, "-m", "src.server", "--port", str(port)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            try:
+                requests.get(f"{url}/health", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        monkeypatch.setattr(settings, "retrieval_url", url)
+        doc = tmp_path / "bail.txt"
+        doc.write_text("Article Y1234-5 : le dépôt de garantie est restitué sous deux mois.", encoding="utf-8")
+        assert vectorstore.add_path(str(doc))[0] == 1
+        assert vectorstore.last_ingest(str(doc))["chunks"] == 1
+        hits = vectorstore.query("article Y1234-5", 2)
+        assert hits[0]["meta"]["source"] == str(doc)
+        assert vectorstore.embed_query("dépôt de garantie").shape == (384,)
+        assert set(vectorstore.get_vectors([hits[0]["id"]])) == {hits[0]["id"]}
+        assert vectorstore.delete_by_source(str(doc))
+        assert vectorstore.query("article Y1234-5", 2) == []
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def test_remote_gateway_error_is_a_resource_error(monkeypatch):
+    """5xx sans JSON (proxy devant le service) : ResourceError lisible, pas ValueError"""
+    resp = requests.Response()
+    resp.status_code, resp._content = 502, b"<html><body>Bad Gateway</body></html>"
+    session = requests.Session()
+    monkeypatch.setattr(session, "post", lambda *a, **kw: resp)
+    monkeypatch.setattr(vectorstore._remote_local, "session", session, raising=False)
+    monkeypatch.setattr(settings, "retrieval_url", "http://127.0.0.1:1")
+    with pytest.raises(resources.ResourceError, match="502"):
+        vectorstore.query("préavis", 3)
@@ -0,0 +1,57 @@
+import time
+
+from src import rag, tracing
+from src.answer_cache import AnswerCache
+from src.config import settings
+
+HITS = [{"id": 7, "text": "Le préavis est de trois mois.", "meta": {"filename": "a.txt", "chunk_index": 0}}]
+
+class _SSE:
+    def __init__(self, lines):
+        self.lines = lines
+    def iter_lines(self, decode_unicode=True):
+        return iter(self.lines)
+
+def test_sse_parser():
+    resp = _SSE(["event: content_block_delta", 'data: {"delta": {"text": "Trois"}}', "", "data: [DONE]", 'data: {"x": 1}'])
+    assert list(rag._sse_data(resp)) == [{"delta": {"text": "Trois"}}]
+
+def test_stream_yields_deltas_then_sources_and_caches(tmp_path, monkeypatch):
+    cache = AnswerCache(str(tmp_path / "ans.sqlite"), 1 << 20, 0.9)
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(rag, "_question_vector", lambda q, embed=False: [1.0, 0.0])
+    monkeypatch.setattr(rag, "_openai_stream", lambda q, hits: iter(["Trois ", "mois [1]."]))
+
+    deltas = list(rag.grounded_answer_stream("Durée du préavis ?", HITS))
+    assert deltas[:2] == ["Trois ", "mois [1]."] and deltas[2].startswith("\n\n**Sources**")
+    # la réponse complète est en cache, servie d'un bloc au tour suivant
+    assert list(rag.grounded_answer_stream("Durée du préavis ?", HITS)) == ["".join(deltas)]
+
+def test_stream_falls_back_offline_before_first_token(monkeypatch):
+    def _broken(q, hits):
+        raise RuntimeError("timeout")
+        yield
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "anthropic")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(rag, "_anthropic_stream", _broken)
+    assert "".join(rag.grounded_answer_stream("Durée ?", HITS)) == rag._dummy_answer("Durée ?", HITS)
+
+def test_stream_packing_error_falls_back(monkeypatch):
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(rag, "_pack", lambda hits: (_ for _ in ()).throw(ValueError("budget")))
+    assert "".join(rag.grounded_answer_stream("Durée ?", HITS)) == rag._dummy_answer("Durée ?", HITS)
+
+def test_stream_span_excludes_consumer_time(monkeypatch):
+    """Le span llm mesure la génération, pas la vitesse à laquelle l'appelant lit les tokens"""
+    monkeypatch.setattr(settings, "tracing", True)
+    monkeypatch.setattr(settings, "trace_log_path", "")
+    monkeypatch.setattr(rag, "_pick_provider", lambda: "openai")
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(rag, "_openai_stream", lambda q, hits: iter(["Trois ", "mois [1]."]))
+    with tracing.turn() as t:
+        for _ in rag.grounded_answer_stream("Durée ?", HITS):
+            time.sleep(0.05)
+    llm = [s for s in t.breakdown() if s["name"] == "llm"]
+    assert len(llm) == 1 and llm[0]["ms"] < 50 and t.seconds >= 0.15
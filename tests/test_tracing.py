@@ -0,0 +1,73 @@
+import json, socket
+
+import requests
+
+from src import tracing, vectorstore
+from src.config import settings
+
+def test_spans_nest_in_turn_and_feed_histograms(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "tracing", True)
+    monkeypatch.setattr(settings, "trace_log_path", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(settings, "trace_flush_s", 0)
+    tracing.reset()
+    with tracing.turn() as t:
+        with tracing.span("retrieve_test"):
+            with tracing.span("embed_test", n=3):
+                pass
+        with tracing.span("llm_test") as sp:
+            sp.set(tokens_context=120, tokens_answer=30)
+    assert [(s["name"], s["depth"]) for s in t.breakdown()] == [("retrieve_test", 0), ("embed_test", 1), ("llm_test", 0)]
+    assert "  - embed_test" in t.markdown() and "context 120" in t.markdown()
+
+    text = tracing.prometheus_text()
+    assert 'rag_stage_seconds_bucket{stage="embed_test",le="+Inf"} 1' in text
+    assert 'rag_stage_seconds_count{stage="llm_test"} 1' in text
+    assert 'rag_tokens_total{stage="llm_test",kind="context"} 120' in text
+
+    records = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert {r["type"] for r in records} == {"histograms", "turn"}
+    assert records[-1]["type"] == "turn" and len(records[-1]["spans"]) == 3
+
+def test_disabled_tracing_is_a_shared_noop(monkeypatch):
+    monkeypatch.setattr(settings, "tracing", False)
+    tracing.reset()
+    assert tracing.span("a") is tracing.span("b", k=1)
+    with tracing.turn() as t, tracing.span("query") as sp:
+        sp.set(tokens_answer=3)
+    assert t is None and tracing.snapshot()["stages"] == {}
+
+def test_query_breakdown_and_metrics_endpoint(tmp_path, monkeypatch, tmp_index):
+    monkeypatch.setattr(settings, "tracing", True)
+    monkeypatch.setattr(settings, "trace_log_path", "")
+    monkeypatch.setattr(settings, "hybrid_search", False)  # force l'embedding + la recherche vectorielle
+    doc = tmp_path / "prescription.txt"
+    doc.write_text("La prescription de l'action en paiement du salaire est de trois ans.", encoding="utf-8")
+    path = str(doc)
+    vectorstore.add_path(path)
+    with tracing.turn() as t:
+        vectorstore.query(f"prescription du salaire {tmp_path.name}", 3)
+    names = [s["name"] for s in t.breakdown()]
+    assert names[0] == "query" and {"lexical", "embed", "vector_search"} <= set(names)
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = tracing.start_metrics_server(port)
+    try:
+        body = requests.get(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5).text
+        assert 'rag_stage_seconds_count{stage="add_path"}' in body
+    finally:
+        server.shutdown()
+        server.server_close()
+        tracing._metrics_server = None
+
+def test_trace_log_rotates_by_size(tmp_path, monkeypatch):
+    """Le journal est renommé en .1 au-delà de TRACE_LOG_MAX_MB : taille bornée"""
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "trace_log_path", str(path))
+    monkeypatch.setattr(settings, "trace_log_max_mb", 1 / 1024)  # 1 Ko
+    for i in range(200):
+        tracing._write({"type": "turn", "i": i})
+    assert path.stat().st_size < 1100 and (tmp_path / "traces.jsonl.1").stat().st_size < 1100
+    assert not (tmp_path / "traces.jsonl.2").exists()
+    assert '"i": 199' in path.read_text(encoding="utf-8")